@@ -0,0 +1,108 @@
+"""
+Benchmark de inicialização: mede o tempo de importação de minio_extraction com
+`python -X importtime` e falha se passar do orçamento ou se alguma dependência
+pesada for carregada já na importação.
+
+Uso:
+    python benchmarks/import_time.py [--module minio_extraction] [--budget-ms 150] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '150'))
+
+# Módulos que não podem ser carregados só por importar minio_extraction
+HEAVY_MODULES = ['fitz', 'pymupdf', 'pytesseract', 'PIL', 'elasticsearch', 'boto3', 'botocore', 'pyodbc']
+
+
+def measure(module: str, runs: int = 5) -> dict:
+    """
+    Importa `module` em processos novos e devolve a melhor medição
+
+    Returns:
+        dict: cumulativo (ms), maiores contribuições e módulos pesados carregados
+    """
+    env = dict(os.environ)
+    # A importação não pode depender da configuração do SQL Server
+    env.pop('SQL_SERVER_CNXN_STR', None)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(REPO_DIR), env.get('PYTHONPATH')]))
+
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            erro = '\n'.join(proc.stderr.strip().splitlines()[-5:])
+            raise RuntimeError(f"Falha ao importar {module}:\n{erro}")
+        resultado = _parse_importtime(proc.stderr, module)
+        if best is None or resultado['cumulative_ms'] < best['cumulative_ms']:
+            best = resultado
+    return best
+
+
+def _parse_importtime(stderr: str, module: str) -> dict:
+    # Linhas no formato "import time: self [us] | cumulative | imported package",
+    # em pós-ordem: os imports feitos por `module` aparecem antes dele
+    entradas = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entradas.append((name.strip(), int(self_us), int(cumulative_us), len(name) - len(name.lstrip())))
+
+    fim = next(i for i, entrada in enumerate(entradas) if entrada[0] == module and entrada[3] == 1)
+    nivel_raiz = entradas[fim][3]
+    inicio = fim
+    while inicio > 0 and entradas[inicio - 1][3] > nivel_raiz:
+        inicio -= 1
+    subarvore = entradas[inicio:fim + 1]
+
+    carregados = {name for name, *_ in subarvore}
+    return {
+        'module': module,
+        'cumulative_ms': entradas[fim][2] / 1000,
+        'top_self_ms': [
+            {'module': name, 'self_ms': self_us / 1000}
+            for name, self_us, _, _ in sorted(subarvore, key=lambda e: e[1], reverse=True)[:10]
+        ],
+        'heavy_modules_loaded': sorted(
+            heavy for heavy in HEAVY_MODULES
+            if any(name == heavy or name.startswith(heavy + '.') for name in carregados)
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Orçamento de tempo de importação")
+    parser.add_argument('--module', default='minio_extraction')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    resultado = measure(args.module, args.runs)
+    resultado['budget_ms'] = args.budget_ms
+    resultado['ok'] = resultado['cumulative_ms'] <= args.budget_ms and not resultado['heavy_modules_loaded']
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    else:
+        print(f"{args.module}: {resultado['cumulative_ms']:.1f} ms (orçamento {args.budget_ms:.0f} ms)")
+        for item in resultado['top_self_ms']:
+            print(f"  {item['self_ms']:8.2f} ms  {item['module']}")
+        if resultado['heavy_modules_loaded']:
+            print(f"Dependências pesadas carregadas na importação: {', '.join(resultado['heavy_modules_loaded'])}")
+        print('OK' if resultado['ok'] else 'FALHOU')
+    return 0 if resultado['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Servidores locais que fazem o papel dos serviços externos nos benchmarks.
+
+Todos rodam em uma thread, escutam em 127.0.0.1 numa porta livre e são usados
+como context manager:
+
+    with StubElasticsearch() as es:
+        client = es_indexer.get_es_client([es.url])
+
+    with StubS3({('bucket', 'chave.pdf'): b'...'}) as s3:
+        downloader = MinIODownloader(s3.url, 'x', 'x')
+
+    with StubSMTP() as smtp:
+        mailer = Mailer(smtp.host, smtp.port, starttls=False)
+
+LocalDatabase faz o papel do SQL Server com um SQLite semeado com documentos.
+"""
+import hashlib
+import json
+import socketserver
+import sqlite3
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+
+class _StubServer:
+    server_class = ThreadingHTTPServer
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._server = self.server_class(('127.0.0.1', 0), self.handler_class)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class _ESHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        # O cliente oficial (8.x) recusa respostas sem este cabeçalho
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_HEAD(self):
+        self._reply(200, {})
+
+    def do_GET(self):
+        self._reply(200, {
+            'name': 'stub', 'cluster_name': 'stub',
+            'version': {'number': '8.11.0'}, 'tagline': 'You Know, for Search',
+        })
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self.path.split('?')[0].endswith('/_bulk'):
+            self._reply(200, {'acknowledged': True})
+            return
+        self._reply(200, self.server.stub.handle_bulk(body))
+
+    # O cliente 8.x envia o _bulk com PUT
+    do_PUT = do_POST
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+
+class StubElasticsearch(_StubServer):
+    """
+    Elasticsearch mínimo: aceita _bulk (index/create/delete) e guarda os documentos
+    em memória. reject_next(n) faz os próximos n itens voltarem com 429.
+    """
+    handler_class = _ESHandler
+
+    def __init__(self):
+        super().__init__()
+        self.indices = {}
+        self.bulk_requests = 0
+        self.rejected = 0
+        self._reject = 0
+
+    def reject_next(self, n):
+        with self.lock:
+            self._reject += n
+
+    def count(self, index):
+        with self.lock:
+            return len(self.indices.get(index, {}))
+
+    def handle_bulk(self, body):
+        linhas = [json.loads(linha) for linha in body.splitlines() if linha.strip()]
+        items = []
+        with self.lock:
+            self.bulk_requests += 1
+            i = 0
+            while i < len(linhas):
+                (op, meta), = linhas[i].items()
+                i += 1
+                source = None
+                if op != 'delete':
+                    source = linhas[i]
+                    i += 1
+                resultado = {'_index': meta.get('_index'), '_id': meta.get('_id')}
+                if self._reject > 0:
+                    self._reject -= 1
+                    self.rejected += 1
+                    resultado.update(status=429, error={
+                        'type': 'es_rejected_execution_exception', 'reason': 'stub: fila cheia',
+                    })
+                else:
+                    docs = self.indices.setdefault(meta.get('_index'), {})
+                    if op == 'delete':
+                        docs.pop(meta.get('_id'), None)
+                        resultado['status'] = 200
+                    else:
+                        resultado['status'] = 200 if meta.get('_id') in docs else 201
+                        docs[meta.get('_id')] = source
+                items.append({op: resultado})
+        return {
+            'took': 1,
+            'errors': any(item[op]['status'] >= 300 for item in items for op in item),
+            'items': items,
+        }
+
+
+class _S3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalho e corpo saem em escritas separadas: sem isso o Nagle + ACK
+    # atrasado somam ~40 ms por resposta
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _target(self):
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        return unquote(bucket), unquote(key), query
+
+    def _reply(self, status, body=b'', headers=None, send_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def _not_found(self, send_body=True):
+        body = b'<Error><Code>NoSuchKey</Code><Message>stub</Message></Error>'
+        self._reply(404, body, {'Content-Type': 'application/xml'}, send_body)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._target()
+        stub = self.server.stub
+        obj = stub.get(bucket, key, 'head_object')
+        if obj is None:
+            self._not_found(send_body=False)
+            return
+        etag = stub.etag(obj)
+        if self.headers.get('If-None-Match') == etag:
+            self._reply(304, headers={'ETag': etag}, send_body=False)
+            return
+        # HEAD: Content-Length é o tamanho do objeto, sem corpo
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(obj)))
+        self.send_header('Last-Modified', formatdate(usegmt=True))
+        self.end_headers()
+
+    def do_GET(self):
+        bucket, key, query = self._target()
+        stub = self.server.stub
+        if not key:
+            if query.get('list-type') == '2':
+                self._reply(200, stub.list_objects(bucket, query), {'Content-Type': 'application/xml'})
+            else:
+                self._reply(400)
+            return
+        obj = stub.get(bucket, key, 'get_object')
+        if obj is None:
+            self._not_found()
+            return
+        headers = {'ETag': stub.etag(obj), 'Content-Type': 'application/octet-stream'}
+        faixa = self.headers.get('Range')
+        if faixa and faixa.startswith('bytes='):
+            inicio, _, fim = faixa[len('bytes='):].partition('-')
+            inicio, fim = int(inicio), min(int(fim or len(obj) - 1), len(obj) - 1)
+            headers['Content-Range'] = f"bytes {inicio}-{fim}/{len(obj)}"
+            self._reply(206, obj[inicio:fim + 1], headers)
+            return
+        self._reply(200, obj, headers)
+
+
+class StubS3(_StubServer):
+    """
+    S3 mínimo (endereçamento por path): head_object (com If-None-Match),
+    get_object/download_file (com Range) e list_objects_v2 paginado. Não confere
+    assinatura. `requests` conta as chamadas por operação.
+    """
+    handler_class = _S3Handler
+
+    def __init__(self, objects=None, page_size=1000):
+        super().__init__()
+        self.objects = dict(objects or {})  # (bucket, chave) -> bytes
+        self.page_size = page_size
+        self.requests = {}
+
+    def put(self, bucket, key, body):
+        with self.lock:
+            self.objects[(bucket, key)] = body
+
+    def get(self, bucket, key, operation):
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            return self.objects.get((bucket, key))
+
+    @staticmethod
+    def etag(body):
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    def list_objects(self, bucket, query):
+        prefix = query.get('prefix', '')
+        max_keys = min(int(query.get('max-keys') or self.page_size), self.page_size)
+        depois = query.get('continuation-token') or query.get('start-after') or ''
+        with self.lock:
+            self.requests['list_objects_v2'] = self.requests.get('list_objects_v2', 0) + 1
+            chaves = sorted(
+                (key, body) for (b, key), body in self.objects.items()
+                if b == bucket and key.startswith(prefix) and key > depois
+            )
+        pagina, truncado = chaves[:max_keys], len(chaves) > max_keys
+        itens = ''.join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{len(body)}</Size>"
+            f"<ETag>{escape(self.etag(body))}</ETag><StorageClass>STANDARD</StorageClass></Contents>"
+            for key, body in pagina
+        )
+        continuacao = (
+            f"<NextContinuationToken>{escape(pagina[-1][0])}</NextContinuationToken>" if truncado else ''
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{len(pagina)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncado else 'false'}</IsTruncated>{continuacao}{itens}"
+            '</ListBucketResult>'
+        ).encode('utf-8')
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, linha):
+        self.wfile.write(linha.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self._reply('220 stub ESMTP')
+        dados = None
+        for linha in self.rfile:
+            if dados is not None:
+                if linha.rstrip(b'\r\n') == b'.':
+                    self.server.stub.deliver(b''.join(dados))
+                    dados = None
+                    self._reply('250 OK')
+                else:
+                    dados.append(linha[1:] if linha.startswith(b'..') else linha)
+                continue
+            comando = linha.split(b' ', 1)[0].strip().upper()
+            if comando == b'EHLO':
+                self.wfile.write(b'250-stub\r\n250-AUTH PLAIN LOGIN\r\n250 SIZE 52428800\r\n')
+            elif comando == b'AUTH':
+                self._reply('235 Authentication successful')
+            elif comando == b'DATA':
+                dados = []
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+            elif comando == b'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self._reply('250 OK')
+
+
+class StubSMTP(_StubServer):
+    """
+    Servidor SMTP mínimo: aceita qualquer login e mensagem e só conta as
+    mensagens e os bytes recebidos (sem STARTTLS)
+    """
+    server_class = socketserver.ThreadingTCPServer
+    handler_class = _SMTPHandler
+
+    def __init__(self):
+        super().__init__()
+        self.messages = 0
+        self.bytes = 0
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def deliver(self, data):
+        with self.lock:
+            self.messages += 1
+            self.bytes += len(data)
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, query, params=()):
+        # O SQLite não conhece o nome de três partes nem as dicas de tabela do SQL Server
+        query = query.replace('MPES.dbo.', '').replace('WITH (NOLOCK)', '')
+        self._cursor.execute(query, params)
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+class LocalDatabase:
+    """
+    SQLite em memória com as tabelas documentos/arquivos, usado no lugar da
+    conexão pyodbc (cursor() como context manager, execute/fetch*)
+
+    seed(n) cria os documentos 1..n: os pares têm arquivo renderizado, os
+    ímpares só o externo e um a cada dez nenhum arquivo.
+    """
+
+    def __init__(self):
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE documentos (
+                Id INTEGER PRIMARY KEY, id_arquivo_renderizado INTEGER, id_arquivo_externo INTEGER,
+                id_tipo_documento INTEGER, ativo INTEGER, cancelado INTEGER
+            );
+            CREATE TABLE arquivos (id INTEGER PRIMARY KEY, path TEXT);
+        """)
+
+    def seed(self, n, tipo_documento=59):
+        documentos, arquivos = [], []
+        for i in range(1, n + 1):
+            renderizado = externo = None
+            if i % 10:
+                if i % 2 == 0:
+                    renderizado = 2 * i
+                    arquivos.append((renderizado, f"{i:032x}|documento.renderizado|application/pdf|.pdf"))
+                externo = 2 * i + 1
+                arquivos.append((externo, f"{i:032x}|documento.externo|application/pdf|.pdf"))
+            documentos.append((i, renderizado, externo, tipo_documento, 1, 0))
+        with self._conn:
+            self._conn.executemany("INSERT INTO documentos VALUES (?, ?, ?, ?, ?, ?)", documentos)
+            self._conn.executemany("INSERT INTO arquivos VALUES (?, ?)", arquivos)
+        return self
+
+    def cursor(self):
+        return _Cursor(self._conn)
+
+    def close(self):
+        self._conn.close()
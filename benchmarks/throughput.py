@@ -0,0 +1,365 @@
+"""
+Benchmarks de vazão dos caminhos principais, sem acesso a serviços externos: o
+MinIO, o SMTP e o SQL Server são substituídos pelos servidores locais de
+stubs.py e os dados são sintéticos (semente fixa), então os números são
+comparáveis entre execuções e versões.
+
+Cada benchmark roda `--repeat` vezes e fica a melhor medição. O resultado sai em
+JSON; com `--baseline`, compara com um resultado anterior e falha se algum
+benchmark ficar mais lento que a tolerância.
+
+Uso:
+    python benchmarks/throughput.py [--only fill_document,send_email] [--scale 1]
+        [--repeat 3] [--output resultado.json] [--baseline anterior.json] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stubs import LocalDatabase, StubS3, StubSMTP  # noqa: E402
+
+DEFAULT_TOLERANCE = float(os.getenv('BENCHMARK_TOLERANCE', '0.2'))
+
+SEED = 20240601
+
+# nome -> (unidade, função). A função recebe (escala, diretório temporário) e
+# devolve (operações, segundos, extras)
+BENCHMARKS = {}
+
+
+def benchmark(name, unit):
+    def registrar(fn):
+        BENCHMARKS[name] = (unit, fn)
+        return fn
+    return registrar
+
+
+def _quiet():
+    # minio_extraction configura o logging em INFO ao ser importado, e
+    # send_email imprime uma linha por mensagem: nada disso entra na medição
+    logging.getLogger().setLevel(logging.WARNING)
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _downloader(url, max_workers=1):
+    from minio_extraction import MinIODownloader
+
+    return MinIODownloader(url, 'benchmark', 'benchmark', max_workers=max_workers)
+
+
+def _synthetic_frame(rows):
+    import pandas as pd
+
+    from report_data import FIELDS, INDICATORS
+
+    rng = random.Random(SEED)
+    dados = {coluna: [f"{coluna} {i}" for i in range(rows)] for coluna in FIELDS.values()}
+    dados['id_documento'] = list(range(1, rows + 1))
+    for coluna in INDICATORS:
+        # Parte dos indicadores vazia, como na planilha
+        dados[coluna] = [f"{coluna}: {rng.randint(0, 100)}%" if rng.random() < 0.7 else None for _ in range(rows)]
+    dados['E-mail'] = [f"pessoa{i % 40}@example.com" for i in range(rows)]
+    return pd.DataFrame(dados)
+
+
+def _synthetic_template(path):
+    import docx
+
+    from report_data import INDICATORS
+
+    documento = docx.Document()
+    documento.sections[0].header.paragraphs[0].text = 'Ação COD_ACAO'
+    documento.add_heading('Relatório id_documento', 1)
+    paragrafo = documento.add_paragraph('Responsável: ')
+    # Placeholder quebrado entre runs, como acontece nos modelos editados no Word
+    paragrafo.add_run('Respons')
+    paragrafo.add_run('avel_').bold = True
+    documento.add_paragraph('Promotoria: NOME_PJ_CONCATENADO - SEI proced_SEI')
+    for placeholder in ('TEMA_ind', 'DIRETRIZ_CONSOLIDADA', 'RESULTADOS_ESPERADOS'):
+        documento.add_paragraph(placeholder)
+    tabela = documento.add_table(rows=len(INDICATORS), cols=2)
+    for n, coluna in enumerate(INDICATORS, start=1):
+        tabela.cell(n - 1, 0).text = f'Indicador {n}: {coluna}'
+        tabela.cell(n - 1, 1).text = f'Insira aqui o resultado do indicador {n}'
+    for i in range(40):
+        documento.add_paragraph(f'Texto fixo do modelo, parágrafo {i}, sem placeholders.')
+    documento.save(path)
+
+
+@benchmark('fill_document', 'rows')
+def bench_fill_document(scale, workdir):
+    from main import fill_document
+    from report_data import iter_records
+
+    rows = max(1, int(200 * scale))
+    template = os.path.join(workdir, 'modelo.docx')
+    _synthetic_template(template)
+    registros = [data for data, _ in iter_records(_synthetic_frame(rows))]
+
+    # A primeira chamada compila o modelo (reaproveitado nas seguintes)
+    inicio = time.perf_counter()
+    fill_document(template, registros[0], os.path.join(workdir, 'primeiro.docx'))
+    primeira = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for i, data in enumerate(registros):
+        fill_document(template, data, os.path.join(workdir, f'relatorio_{i}.docx'))
+    return rows, time.perf_counter() - inicio, {'first_call_ms': round(primeira * 1000, 2)}
+
+
+@benchmark('send_email', 'messages')
+def bench_send_email(scale, workdir):
+    from mailer import Mailer
+    from main import send_email
+
+    messages = max(1, int(200 * scale))
+    anexo = os.path.join(workdir, 'anexo.docx')
+    with open(anexo, 'wb') as f:
+        f.write(random.Random(SEED).randbytes(50 * 1024))
+
+    with StubSMTP() as smtp, Mailer(smtp.host, smtp.port, username='benchmark@example.com',
+                                    password='benchmark', starttls=False) as mailer, _quiet():
+        inicio = time.perf_counter()
+        for i in range(messages):
+            send_email(f'pessoa{i}@example.com', f'Relatório {i}', 'Segue o relatório.', anexo, mailer=mailer)
+        duracao = time.perf_counter() - inicio
+    if smtp.messages != messages:
+        raise RuntimeError(f"O servidor recebeu {smtp.messages} de {messages} mensagens")
+    return messages, duracao, {'bytes_per_message': smtp.bytes // messages}
+
+
+@benchmark('parse_path', 'paths')
+def bench_parse_path(scale, workdir):
+    tipos = ['documento.renderizado', 'documento.externo', 'mni.documento.original', 'autos.movimento']
+    rng = random.Random(SEED)
+    paths = [
+        f"{rng.getrandbits(128):032x}|{tipos[i % len(tipos)]}|application/pdf|{'.pdf' if i % 2 else 'pdf'}"
+        for i in range(1000)
+    ]
+    iteracoes = max(1, int(100 * scale))
+    downloader = _downloader('http://127.0.0.1:9')
+    with _quiet():
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            for path in paths:
+                downloader.parse_path(path)
+        duracao = time.perf_counter() - inicio
+    return iteracoes * len(paths), duracao, {}
+
+
+def _objects(count, size):
+    rng = random.Random(SEED)
+    corpo = rng.randbytes(size)
+    return {
+        ('gampes-documento-renderizado', f"{i:032x}.pdf"): corpo
+        for i in range(count)
+    }
+
+
+@benchmark('download_document', 'documents')
+def bench_download_document(scale, workdir):
+    count, size = max(1, int(200 * scale)), 64 * 1024
+    with StubS3(_objects(count, size)) as s3, _quiet():
+        downloader = _downloader(s3.url)
+        inicio = time.perf_counter()
+        for i in range(count):
+            if not downloader.download_document(
+                f"{i:032x}|documento.renderizado|application/pdf|.pdf", os.path.join(workdir, 'downloads')
+            ):
+                raise RuntimeError(f"Falha no download do objeto {i}")
+        duracao = time.perf_counter() - inicio
+    return count, duracao, {'mb_per_second': round(count * size / 1024 ** 2 / duracao, 2)}
+
+
+@benchmark('download_multiple_documents', 'documents')
+def bench_download_multiple_documents(scale, workdir):
+    count, size = max(1, int(400 * scale)), 64 * 1024
+    documentos = [
+        {'id': i, 'path': f"{i:032x}|documento.renderizado|application/pdf|.pdf"}
+        for i in range(count)
+    ]
+    with StubS3(_objects(count, size)) as s3, _quiet():
+        downloader = _downloader(s3.url, max_workers=8)
+        inicio = time.perf_counter()
+        resultados = downloader.download_multiple_documents(documentos, os.path.join(workdir, 'downloads'))
+        duracao = time.perf_counter() - inicio
+    falhas = sum(1 for r in resultados if not r.ok)
+    if falhas:
+        raise RuntimeError(f"{falhas} downloads falharam")
+    return count, duracao, {'max_workers': 8, 'mb_per_second': round(count * size / 1024 ** 2 / duracao, 2)}
+
+
+@benchmark('find_object_in_bucket', 'lookups')
+def bench_find_object_in_bucket(scale, workdir):
+    bucket = 'gampes-documento-renderizado'
+    rng = random.Random(SEED)
+    uuids = [f"{rng.getrandbits(128):032x}" for _ in range(max(1, int(2000 * scale)))]
+    sufixos = ['.pdf', '_v2.pdf', '.docx', '']
+    # Objetos com o uuid como prefixo e variações de extensão (o que a busca resolve)
+    objetos = {(bucket, uuid + sufixos[i % len(sufixos)]): b'x' for i, uuid in enumerate(uuids)}
+    consultas = rng.sample(uuids, max(1, len(uuids) // 10))
+    with StubS3(objetos) as s3, _quiet():
+        downloader = _downloader(s3.url)
+        inicio = time.perf_counter()
+        for uuid in consultas:
+            if downloader.find_object_in_bucket(bucket, uuid) is None:
+                raise RuntimeError(f"Objeto não encontrado para {uuid}")
+        duracao = time.perf_counter() - inicio
+    return len(consultas), duracao, {'bucket_objects': len(objetos)}
+
+
+@benchmark('get_minio_file_path', 'lookups')
+def bench_get_minio_file_path(scale, workdir):
+    from minio_extraction import get_minio_file_path
+
+    documentos = max(1, int(20000 * scale))
+    db = LocalDatabase().seed(documentos)
+    rng = random.Random(SEED)
+    consultas = [str(rng.randint(1, documentos)) for _ in range(max(1, int(2000 * scale)))]
+    try:
+        inicio = time.perf_counter()
+        for id_documento in consultas:
+            get_minio_file_path(id_documento, db)
+        duracao = time.perf_counter() - inicio
+    finally:
+        db.close()
+    return len(consultas), duracao, {'seeded_documents': documentos}
+
+
+@benchmark('get_minio_file_paths', 'documents')
+def bench_get_minio_file_paths(scale, workdir):
+    from minio_extraction import get_minio_file_paths
+
+    documentos = max(1, int(20000 * scale))
+    db = LocalDatabase().seed(documentos)
+    try:
+        inicio = time.perf_counter()
+        caminhos = get_minio_file_paths(range(1, documentos + 1), db)
+        duracao = time.perf_counter() - inicio
+    finally:
+        db.close()
+    return len(caminhos), duracao, {'seeded_documents': documentos}
+
+
+def run(names, scale=1.0, repeat=3) -> dict:
+    """
+    Roda os benchmarks escolhidos
+
+    Returns:
+        dict: Resultado por benchmark (melhor de `repeat` execuções)
+    """
+    resultados = {}
+    for name in names:
+        unit, fn = BENCHMARKS[name]
+        melhor = None
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory(prefix=f'bench_{name}_') as workdir:
+                ops, segundos, extras = fn(scale, workdir)
+            if melhor is None or segundos / ops < melhor[1] / melhor[0]:
+                melhor = (ops, segundos, extras)
+        ops, segundos, extras = melhor
+        resultados[name] = {
+            'unit': unit,
+            'ops': ops,
+            'seconds': round(segundos, 4),
+            'per_second': round(ops / segundos, 2),
+            **extras,
+        }
+        print(f"{name:<28} {ops / segundos:12.1f} {unit}/s", file=sys.stderr)
+    return resultados
+
+
+def compare(baseline: dict, results: dict, tolerance: float) -> list:
+    """
+    Returns:
+        list: Benchmarks mais lentos que `baseline` além da tolerância, com as duas vazões
+    """
+    regressoes = []
+    for name, atual in results.items():
+        anterior = baseline.get('results', {}).get(name)
+        if not anterior:
+            continue
+        if atual['per_second'] < anterior['per_second'] * (1 - tolerance):
+            regressoes.append({
+                'benchmark': name,
+                'baseline_per_second': anterior['per_second'],
+                'per_second': atual['per_second'],
+                'change': round(atual['per_second'] / anterior['per_second'] - 1, 3),
+            })
+    return regressoes
+
+
+def _git_commit():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de vazão (offline)")
+    parser.add_argument('--only', help=f"Lista separada por vírgulas ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplicador do volume de cada benchmark")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Grava o JSON neste arquivo (padrão: saída padrão)")
+    parser.add_argument('--baseline', help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Queda de vazão aceita em relação ao baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(',')] if args.only else list(BENCHMARKS)
+    desconhecidos = [n for n in names if n not in BENCHMARKS]
+    if desconhecidos:
+        parser.error(f"Benchmarks desconhecidos: {', '.join(desconhecidos)}")
+
+    relatorio = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'results': run(names, args.scale, args.repeat),
+    }
+
+    codigo = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            relatorio['regressions'] = compare(json.load(f), relatorio['results'], args.tolerance)
+        for regressao in relatorio['regressions']:
+            print(
+                f"Regressão em {regressao['benchmark']}: {regressao['per_second']:.1f}/s "
+                f"(antes {regressao['baseline_per_second']:.1f}/s, {regressao['change']:+.0%})",
+                file=sys.stderr
+            )
+        codigo = 1 if relatorio['regressions'] else 0
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(saida + '\n')
+    else:
+        print(saida)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
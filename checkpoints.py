@@ -0,0 +1,211 @@
+"""
+Registro local (SQLite) do que já foi feito em cada etapa, para retomar execuções.
+
+Cada documento (ou relatório) tem um estado por etapa: 'ok' ou 'erro', com um
+detalhe (caminho resolvido, arquivo gerado ou mensagem de erro). Ao rodar de
+novo, quem consulta o registro pula o que já está 'ok' e refaz só o que é novo
+ou falhou. Também guarda marcas d'água (maior id já enumerado) por nome, para
+que a enumeração recomece de onde parou.
+
+Desativado por padrão: main.py e o notebook só usam quando CHECKPOINT_PATH
+está definido.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', 'checkpoints.sqlite3')
+
+STAGES = ('resolved', 'downloaded', 'extracted', 'indexed', 'rendered', 'emailed')
+
+# Chaves por consulta no IN (...) (limite de variáveis do SQLite)
+_LOTE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS etapas (
+    etapa TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detalhe TEXT,
+    tentativas INTEGER NOT NULL DEFAULT 1,
+    atualizado_em TEXT,
+    PRIMARY KEY (etapa, chave)
+);
+CREATE TABLE IF NOT EXISTS marcas (
+    nome TEXT PRIMARY KEY,
+    ultimo_id INTEGER,
+    atualizado_em TEXT
+);
+"""
+
+
+class CheckpointStore:
+    def __init__(self, db_path=DEFAULT_CHECKPOINT_PATH):
+        """
+        Abre (ou cria) o registro de etapas
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite
+        """
+        self.db_path = str(db_path)
+        # A mesma conexão é usada pelas threads de download/envio
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def mark_done(self, stage: str, key, detail: Optional[str] = None):
+        self._mark(stage, key, 'ok', detail)
+
+    def mark_failed(self, stage: str, key, error: Optional[str] = None):
+        self._mark(stage, key, 'erro', error)
+
+    def mark_done_many(self, stage: str, items: Iterable[Tuple[object, Optional[str]]]):
+        """
+        Marca várias chaves como concluídas em uma única transação
+
+        Args:
+            items (Iterable): Tuplas (chave, detalhe)
+        """
+        self._mark_many(stage, ((key, 'ok', detail) for key, detail in items))
+
+    def _mark(self, stage, key, status, detail):
+        self._mark_many(stage, [(key, status, detail)])
+
+    def _mark_many(self, stage, registros):
+        if stage not in STAGES:
+            raise ValueError(f"Etapa desconhecida: {stage}")
+        agora = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO etapas (etapa, chave, status, detalhe, atualizado_em) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (etapa, chave) DO UPDATE SET
+                    status = excluded.status, detalhe = excluded.detalhe,
+                    tentativas = tentativas + 1, atualizado_em = excluded.atualizado_em
+                """,
+                [(stage, str(key), status, detail, agora) for key, status, detail in registros]
+            )
+
+    def get(self, stage: str, key) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Returns:
+            tuple: (status, detalhe) da chave na etapa, ou None se nunca registrada
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, detalhe FROM etapas WHERE etapa = ? AND chave = ?",
+                (stage, str(key))
+            ).fetchone()
+
+    def is_done(self, stage: str, key) -> bool:
+        registro = self.get(stage, key)
+        return registro is not None and registro[0] == 'ok'
+
+    def done(self, stage: str, keys: Iterable) -> Dict[str, Optional[str]]:
+        """
+        Consulta várias chaves de uma vez
+
+        Returns:
+            dict: chave (str) -> detalhe, só das chaves concluídas na etapa
+        """
+        chaves = list(dict.fromkeys(str(key) for key in keys))
+        concluidas = {}
+        with self._lock:
+            for i in range(0, len(chaves), _LOTE):
+                lote = chaves[i:i + _LOTE]
+                placeholders = ", ".join("?" for _ in lote)
+                concluidas.update(self._conn.execute(
+                    f"SELECT chave, detalhe FROM etapas WHERE etapa = ? AND status = 'ok' AND chave IN ({placeholders})",
+                    [stage, *lote]
+                ).fetchall())
+        return concluidas
+
+    def pending(self, stage: str, keys: Iterable, chunk_size: int = _LOTE,
+                key: Optional[Callable] = None, on_skip: Optional[Callable] = None) -> Iterator:
+        """
+        Filtra as chaves que ainda não foram concluídas na etapa (novas ou com
+        erro), mantendo a ordem e consumindo `keys` aos poucos
+
+        Args:
+            key (callable): Extrai a chave de cada item (padrão: o próprio item)
+            on_skip (callable): Chamada com cada item pulado
+        """
+        lote = []
+        for item in keys:
+            lote.append(item)
+            if len(lote) >= chunk_size:
+                yield from self._pending_chunk(stage, lote, key, on_skip)
+                lote = []
+        if lote:
+            yield from self._pending_chunk(stage, lote, key, on_skip)
+
+    def _pending_chunk(self, stage, lote, key=None, on_skip=None):
+        chaves = [str(key(item) if key else item) for item in lote]
+        concluidas = self.done(stage, chaves)
+        for item, chave in zip(lote, chaves):
+            if chave not in concluidas:
+                yield item
+            elif on_skip is not None:
+                on_skip(item)
+
+    def failed(self, stage: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Returns:
+            list: (chave, erro) das chaves com erro na etapa
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chave, detalhe FROM etapas WHERE etapa = ? AND status = 'erro' ORDER BY chave",
+                (stage,)
+            ).fetchall()
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            dict: etapa -> {status: quantidade}
+        """
+        resultado = {}
+        with self._lock:
+            for etapa, status, quantidade in self._conn.execute(
+                "SELECT etapa, status, COUNT(*) FROM etapas GROUP BY etapa, status"
+            ):
+                resultado.setdefault(etapa, {})[status] = quantidade
+        return resultado
+
+    def get_watermark(self, name: str) -> int:
+        """
+        Maior id já processado na enumeração `name` (0 se nunca registrado)
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT ultimo_id FROM marcas WHERE nome = ?", (name,)).fetchone()
+        return row[0] if row and row[0] is not None else 0
+
+    def set_watermark(self, name: str, last_id: int):
+        """
+        Avança a marca d'água (nunca retrocede)
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO marcas (nome, ultimo_id, atualizado_em) VALUES (?, ?, ?)
+                ON CONFLICT (nome) DO UPDATE SET
+                    ultimo_id = MAX(ultimo_id, excluded.ultimo_id), atualizado_em = excluded.atualizado_em
+                """,
+                (name, int(last_id), datetime.now().isoformat(timespec='seconds'))
+            )
@@ -0,0 +1,293 @@
+"""
+Indexação no Elasticsearch do texto extraído dos documentos.
+
+Consome um gerador de DocumentText (ver text_extraction.py) e envia um registro
+por documento para AppConfig.ES_INDEX_TEXT e um por página para
+AppConfig.ES_INDEX_PAGE. Os `_id` são derivados do id do documento (e do número
+da página), então reindexar o mesmo documento sobrescreve em vez de duplicar.
+
+Com um CheckpointStore, cada documento é registrado na etapa 'indexed' quando
+todas as suas ações voltam do Elasticsearch, e os já indexados são pulados.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from minio_extraction import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Limites de cada requisição _bulk: o que for atingido primeiro fecha o lote
+BULK_CHUNK_SIZE = 500
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# Documentos consultados por vez no registro de etapas: cada um carrega o texto
+# de todas as páginas, então só alguns ficam retidos esperando a consulta
+_PENDING_CHUNK = 8
+
+_FIM = object()
+
+
+@dataclass
+class IndexStats:
+    documents: int = 0
+    pages: int = 0
+    indexed: int = 0
+    failed: int = 0
+    skipped: int = 0  # já indexados em execuções anteriores (checkpoints)
+    duration: float = 0.0
+    errors: List[dict] = field(default_factory=list)
+
+    @property
+    def actions_per_second(self) -> float:
+        return (self.indexed + self.failed) / self.duration if self.duration else 0.0
+
+
+def get_es_client(hosts=None, **kwargs):
+    """
+    Cria o cliente Elasticsearch a partir do AppConfig
+
+    Args:
+        hosts (list): Hosts (padrão: AppConfig.ELASTICSEARCH_HOSTS)
+        **kwargs: Repassados ao construtor do Elasticsearch
+    """
+    from elasticsearch import Elasticsearch
+
+    if AppConfig.ELASTICSEARCH_USER and 'basic_auth' not in kwargs:
+        kwargs['basic_auth'] = (AppConfig.ELASTICSEARCH_USER, AppConfig.ELASTICSEARCH_PWD)
+    return Elasticsearch(hosts or AppConfig.ELASTICSEARCH_HOSTS, **kwargs)
+
+
+def iter_actions(documents: Iterable, stats: Optional[IndexStats] = None) -> Iterator[dict]:
+    """
+    Converte DocumentText em ações do _bulk (documento + páginas)
+
+    Documentos com erro de extração são ignorados.
+    """
+    for doc in documents:
+        if not doc.ok:
+            continue
+        if stats is not None:
+            stats.documents += 1
+            stats.pages += len(doc.pages)
+        yield {
+            '_op_type': 'index',
+            '_index': AppConfig.ES_INDEX_TEXT,
+            '_id': doc.document_id,
+            '_source': {
+                'id_documento': doc.document_id,
+                'caminho': doc.path,
+                'texto': doc.text,
+                'num_paginas': len(doc.pages),
+                'paginas_ocr': doc.ocr_pages,
+            },
+        }
+        for page in doc.pages:
+            yield {
+                '_op_type': 'index',
+                '_index': AppConfig.ES_INDEX_PAGE,
+                '_id': f"{doc.document_id}-{page.page_number}",
+                '_source': {
+                    'id_documento': doc.document_id,
+                    'pagina': page.page_number,
+                    'texto': page.text,
+                    'ocr': page.ocr,
+                },
+            }
+
+
+def index_documents(
+    documents: Iterable,
+    client=None,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+    thread_count: int = 1,
+    queue_size: int = 4,
+    max_retries: int = 5,
+    initial_backoff: float = 2,
+    max_backoff: float = 60,
+    checkpoints=None
+) -> IndexStats:
+    """
+    Indexa documentos e páginas com streaming bulk
+
+    O gerador `documents` só é consumido à medida que os lotes são enviados: com
+    thread_count > 1, no máximo `queue_size` lotes ficam aguardando as threads de
+    envio, então uma extração mais rápida que o Elasticsearch fica bloqueada em vez
+    de acumular memória. Itens rejeitados com 429 são reenviados com backoff
+    exponencial (initial_backoff, dobrando até max_backoff) até max_retries vezes.
+
+    Args:
+        documents (Iterable): DocumentText (ex.: saída de text_extraction.extract_texts)
+        client: Cliente Elasticsearch (padrão: get_es_client())
+        chunk_size (int): Máximo de ações por requisição _bulk
+        max_chunk_bytes (int): Máximo de bytes por requisição _bulk
+        thread_count (int): Requisições _bulk simultâneas
+        queue_size (int): Lotes prontos aguardando envio (com thread_count > 1)
+        max_retries (int): Tentativas para itens rejeitados com 429
+        initial_backoff (float): Espera inicial, em segundos, antes de reenviar
+        max_backoff (float): Espera máxima entre tentativas
+        checkpoints (CheckpointStore): Registro de etapas (opcional); documentos
+            já concluídos na etapa 'indexed' são pulados, e cada documento é
+            registrado (ok, ou erro se alguma ação falhar)
+
+    Returns:
+        IndexStats: Totais de documentos, páginas, ações indexadas e falhas
+    """
+    client = client or get_es_client()
+    stats = IndexStats()
+    inicio = time.perf_counter()
+    progress = None
+    if checkpoints is not None:
+        progress = _IndexProgress(checkpoints)
+        documents = progress.track(checkpoints.pending(
+            'indexed', (doc for doc in documents if doc.ok), chunk_size=_PENDING_CHUNK,
+            key=lambda doc: doc.document_id, on_skip=lambda doc: _count_skipped(stats)
+        ))
+    actions = iter_actions(documents, stats)
+    bulk_kwargs = dict(
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        max_backoff=max_backoff,
+    )
+
+    if thread_count <= 1:
+        _send(client, actions, stats, threading.Lock(), chunk_size, max_chunk_bytes, bulk_kwargs, progress)
+    else:
+        lotes = queue.Queue(maxsize=queue_size)
+        lock = threading.Lock()
+        falhas = []
+
+        def enviar():
+            while True:
+                lote = lotes.get()
+                if lote is _FIM:
+                    return
+                try:
+                    # O lote já respeita os limites; streaming_bulk só cuida dos reenvios
+                    _send(client, lote, stats, lock, len(lote), max_chunk_bytes, bulk_kwargs, progress)
+                except Exception as e:
+                    logger.error(f"Erro ao enviar lote ao Elasticsearch: {e}")
+                    with lock:
+                        stats.failed += len(lote)
+                        falhas.append(e)
+                    if progress is not None:
+                        for action in lote:
+                            progress.result(action['_id'], False)
+
+        threads = [
+            threading.Thread(target=enviar, name=f'es-bulk-{i}', daemon=True)
+            for i in range(thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for lote in _batches(actions, chunk_size, max_chunk_bytes):
+                lotes.put(lote)
+        finally:
+            for _ in threads:
+                lotes.put(_FIM)
+            for thread in threads:
+                thread.join()
+        if falhas:
+            raise falhas[0]
+
+    stats.duration = time.perf_counter() - inicio
+    logger.info(
+        f"Indexação concluída: {stats.documents} documentos, {stats.pages} páginas, "
+        f"{stats.indexed} ações ok, {stats.failed} com falha "
+        f"({stats.actions_per_second:.0f} ações/s)"
+        + (f"; {stats.skipped} documentos já indexados" if stats.skipped else "")
+    )
+    return stats
+
+
+def _count_skipped(stats):
+    stats.skipped += 1
+
+
+class _IndexProgress:
+    """
+    Ações ainda sem resposta de cada documento: quando a última volta, o
+    documento é registrado na etapa 'indexed'
+    """
+
+    def __init__(self, checkpoints):
+        self.checkpoints = checkpoints
+        self._lock = threading.Lock()
+        self._restantes: Dict[str, int] = {}
+        self._falhas: Dict[str, int] = {}
+        # _id da ação -> documentos (o mesmo _id pode existir nos dois índices)
+        self._acoes: Dict[str, deque] = {}
+
+    def track(self, documents):
+        # Registra as ações de cada documento antes de elas serem geradas
+        for doc in documents:
+            ids = [doc.document_id] + [f"{doc.document_id}-{page.page_number}" for page in doc.pages]
+            with self._lock:
+                self._restantes[doc.document_id] = self._restantes.get(doc.document_id, 0) + len(ids)
+                for action_id in ids:
+                    self._acoes.setdefault(action_id, deque()).append(doc.document_id)
+            yield doc
+
+    def result(self, action_id, ok):
+        with self._lock:
+            documentos = self._acoes.get(action_id)
+            if not documentos:
+                return
+            document_id = documentos.popleft()
+            if not documentos:
+                del self._acoes[action_id]
+            if not ok:
+                self._falhas[document_id] = self._falhas.get(document_id, 0) + 1
+            self._restantes[document_id] -= 1
+            if self._restantes[document_id]:
+                return
+            del self._restantes[document_id]
+            falhas = self._falhas.pop(document_id, 0)
+        if falhas:
+            self.checkpoints.mark_failed('indexed', document_id, f"{falhas} ações com falha")
+        else:
+            self.checkpoints.mark_done('indexed', document_id)
+
+
+def _send(client, actions, stats, lock, chunk_size, max_chunk_bytes, bulk_kwargs, progress=None):
+    from elasticsearch.helpers import streaming_bulk
+
+    for ok, item in streaming_bulk(
+        client,
+        actions,
+        chunk_size=chunk_size,
+        max_chunk_bytes=max_chunk_bytes,
+        raise_on_error=False,
+        **bulk_kwargs
+    ):
+        with lock:
+            if ok:
+                stats.indexed += 1
+            else:
+                stats.failed += 1
+                if len(stats.errors) < 100:
+                    stats.errors.append(item)
+        if progress is not None:
+            (resposta,) = item.values()
+            progress.result(resposta.get('_id'), ok)
+
+
+def _batches(actions, chunk_size, max_chunk_bytes):
+    # Agrupa as ações pelos mesmos critérios do streaming_bulk (quantidade e bytes)
+    lote, tamanho = [], 0
+    for action in actions:
+        tamanho_acao = len(json.dumps(action.get('_source', {}), ensure_ascii=False).encode('utf-8')) + 100
+        if lote and (len(lote) >= chunk_size or tamanho + tamanho_acao > max_chunk_bytes):
+            yield lote
+            lote, tamanho = [], 0
+        lote.append(action)
+        tamanho += tamanho_acao
+    if lote:
+        yield lote
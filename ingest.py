@@ -0,0 +1,331 @@
+"""
+Leitura das linhas de ações/indicadores para o main.py.
+
+A planilha é lida com o openpyxl em modo somente leitura, linha a linha, e pode
+ser consumida em blocos (iter_sheet_chunks) para que a geração dos relatórios
+comece antes de o arquivo inteiro ser processado. Depois da primeira leitura,
+uma cópia em Parquet fica em INGEST_SNAPSHOT_DIR, identificada pelo hash do
+conteúdo: enquanto a planilha não mudar, as execuções seguintes leem a cópia
+em vez do .xlsx.
+
+O tipo de cada coluna vem de um esquema declarado (COLUMN_TYPES), e não dos
+valores lidos: cada bloco é convertido assim que sai da planilha, sem uma passada
+prévia pelo arquivo, e todos os blocos e a cópia em Parquet têm os mesmos tipos
+(ex.: um id com uma célula vazia continua inteiro em todos os blocos, e não int em
+uns e float em outros). As colunas fora do esquema são lidas como texto, que é
+como acabam nos relatórios de qualquer forma.
+
+As mesmas linhas também podem vir direto do SQL Server (iter_query_chunks), em
+lotes lidos com fetchmany, sem passar pela exportação para Excel.
+"""
+import hashlib
+import json
+import logging
+import os
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv('INGEST_SNAPSHOT_DIR', '.ingest_cache')
+CHUNK_SIZE = 500
+
+# Textos que o pd.read_excel trata como célula vazia
+_NA_STRINGS = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+
+# Tipo de cada coluna ('int', 'float' ou 'str'), o mesmo em todos os blocos.
+# 'int' aceita células vazias (Int64 do pandas); colunas que não estão aqui são texto
+COLUMN_TYPES = {
+    'id_documento': 'int',
+}
+
+# Tabela/visão com uma linha por ação, nas mesmas colunas da planilha
+REPORT_SOURCE_VIEW = os.getenv('REPORT_SOURCE_VIEW', 'MPES.dbo.vw_papj_acoes')
+REPORT_QUERY = os.getenv('REPORT_SOURCE_QUERY') or f"""
+    SELECT
+        id_documento, COD_ACAO, Responsavel, [E-mail], NOME_PJ_CONCATENADO,
+        proced_SEI, TEMA, DIRETRIZ_CONSOLIDADA, RESULTADOS_ESPERADOS,
+        IND_01, IND_02, IND_03, IND_04, IND_05, IND_06, IND_07, IND_08
+    FROM {REPORT_SOURCE_VIEW} WITH (NOLOCK)
+    ORDER BY id_documento
+"""
+
+
+def read_sheet(path, sheet_name=None, snapshot_dir=SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Lê a planilha inteira, usando a cópia em Parquet quando ela estiver atualizada
+
+    Args:
+        path (str): Arquivo .xlsx
+        sheet_name (str): Aba (padrão: a primeira)
+        snapshot_dir (str): Pasta das cópias em Parquet (None desativa)
+
+    Returns:
+        DataFrame: Mesmo formato de pd.read_excel(path)
+    """
+    return _concat(iter_sheet_chunks(path, sheet_name=sheet_name, snapshot_dir=snapshot_dir))
+
+
+def iter_sheet_chunks(path, chunk_size=CHUNK_SIZE, sheet_name=None, snapshot_dir=SNAPSHOT_DIR) -> Iterator[pd.DataFrame]:
+    """
+    Lê a planilha em blocos de até `chunk_size` linhas
+
+    Com a cópia em Parquet atualizada, os blocos vêm dela. Caso contrário, vêm do
+    .xlsx à medida que as linhas são lidas, e a cópia é gravada ao final (se o
+    gerador for consumido até o fim).
+
+    Yields:
+        DataFrame: Blocos com o índice contínuo (0, 1, 2, ...)
+    """
+    snapshot = _snapshot_path(path, sheet_name, snapshot_dir) if snapshot_dir else None
+    if snapshot is not None and snapshot.exists():
+        lidos = 0
+        try:
+            for chunk in _iter_snapshot(snapshot, chunk_size):
+                lidos += 1
+                yield chunk
+            return
+        except Exception as e:
+            if lidos:
+                raise
+            logger.warning(f"Cópia {snapshot} ilegível, relendo a planilha: {e}")
+
+    blocos = [] if snapshot is not None else None
+    for chunk in _iter_xlsx(path, chunk_size, sheet_name):
+        if blocos is not None:
+            blocos.append(chunk)
+        yield chunk
+
+    if blocos is not None:
+        try:
+            _write_snapshot(_concat(blocos), snapshot)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar a cópia {snapshot}: {e}")
+
+
+def iter_query_chunks(query=None, params=(), db_conn=None, chunk_size=CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Lê as linhas das ações direto do SQL Server, em blocos
+
+    O cursor é lido com fetchmany, então só um bloco fica em memória por vez,
+    qualquer que seja o tamanho da campanha. Os blocos têm as colunas retornadas
+    pela consulta, com os mesmos nomes e tipos (COLUMN_TYPES) da planilha, e não
+    tipos adivinhados bloco a bloco (uma coluna com NULL em só alguns lotes
+    continua com o mesmo tipo em todos).
+
+    Args:
+        query (str): Consulta (padrão: REPORT_QUERY, ou REPORT_SOURCE_QUERY do ambiente)
+        params (tuple): Parâmetros da consulta
+        db_conn (pyodbc.Connection): Conexão (padrão: uma nova, fechada ao final)
+        chunk_size (int): Linhas por bloco
+
+    Yields:
+        DataFrame: Blocos com o índice contínuo (0, 1, 2, ...)
+    """
+    from minio_extraction import get_db_connection
+
+    propria = db_conn is None
+    if propria:
+        db_conn = get_db_connection()
+    try:
+        with db_conn.cursor() as cursor:
+            cursor.execute(query or REPORT_QUERY, params)
+            columns = [col[0] for col in cursor.description]
+            inicio = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                valores = zip(*([_sql_value(value) for value in row] for row in rows))
+                yield _typed_frame(columns, list(valores), inicio)
+                inicio += len(rows)
+        logger.info(f"{inicio} linhas lidas do SQL Server")
+    finally:
+        if propria:
+            db_conn.close()
+
+
+def _iter_xlsx(path, chunk_size, sheet_name):
+    rows = _iter_xlsx_rows(path, sheet_name)
+    columns = next(rows, None)
+    if columns is None:
+        return
+
+    bloco, inicio = [], 0
+    for row in rows:
+        bloco.append(row)
+        if len(bloco) >= chunk_size:
+            yield _typed_frame(columns, list(zip(*bloco)), inicio)
+            inicio += len(bloco)
+            bloco = []
+    if bloco:
+        yield _typed_frame(columns, list(zip(*bloco)), inicio)
+
+
+def _iter_xlsx_rows(path, sheet_name):
+    # Primeiro os nomes das colunas, depois as linhas com os valores já
+    # normalizados (_cell_value), no mesmo tamanho do cabeçalho
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Colunas sem nome ganham o mesmo nome do pd.read_excel
+        columns = [f'Unnamed: {i}' if name is None else name for i, name in enumerate(header)]
+        yield columns
+
+        vazias = []
+        for row in rows:
+            row = tuple(_cell_value(value) for value in row[:len(columns)])
+            row += (None,) * (len(columns) - len(row))
+            # Linhas vazias no fim da aba são descartadas, como no pd.read_excel
+            if all(value is None for value in row):
+                vazias.append(row)
+                continue
+            yield from vazias
+            vazias = []
+            yield row
+    finally:
+        wb.close()
+
+
+def _cell_value(value):
+    # Como o pd.read_excel: textos de "vazio" viram None e números inteiros
+    # gravados como float viram int
+    if isinstance(value, str):
+        return None if value in _NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _typed_frame(columns, valores, inicio):
+    """
+    Monta um bloco com os tipos de COLUMN_TYPES
+
+    Args:
+        columns (list): Nomes das colunas (podem se repetir)
+        valores (list): Uma sequência de valores por coluna, na ordem de `columns`
+        inicio (int): Índice da primeira linha
+    """
+    index = pd.RangeIndex(inicio, inicio + len(valores[0]))
+    series = [_typed_series(v, COLUMN_TYPES.get(name, 'str'), index) for name, v in zip(columns, valores)]
+    df = pd.concat(series, axis=1)
+    df.columns = columns  # por posição: preserva nomes repetidos
+    return df
+
+
+def _typed_series(values, kind: str, index) -> pd.Series:
+    values = [None if _missing(v) else v for v in values]
+    if kind == 'int':
+        return pd.Series(pd.array(values, dtype='Int64'), index=index)
+    if kind == 'float':
+        return pd.Series([np.nan if v is None else float(v) for v in values], index=index, dtype='float64')
+    # Texto: os números e datas viram o mesmo texto que teriam no relatório
+    textos = [np.nan if v is None else (v if isinstance(v, str) else str(v)) for v in values]
+    return pd.Series(textos, index=index, dtype=object)
+
+
+def _missing(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value))
+
+
+def _sql_value(value):
+    # DECIMAL do SQL Server vira float e, sem casas decimais, int, como os números do Excel
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _concat(chunks) -> pd.DataFrame:
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks)
+
+
+def _iter_snapshot(snapshot, chunk_size):
+    import pyarrow.parquet as pq
+
+    inicio = 0
+    for batch in pq.ParquetFile(snapshot).iter_batches(batch_size=chunk_size):
+        # Os mesmos tipos dos blocos do .xlsx (textos vazios voltam como None,
+        # colunas de texto como o tipo de texto do pandas)
+        columns = batch.schema.names
+        chunk = _typed_frame(columns, [coluna.to_pylist() for coluna in batch.columns], inicio)
+        inicio += len(chunk)
+        yield chunk
+
+
+def _snapshot_path(path, sheet_name, snapshot_dir) -> Optional[Path]:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.debug("pyarrow não instalado: cópia em Parquet desativada")
+        return None
+
+    path = Path(path)
+    digest = _file_hash(path, Path(snapshot_dir))
+    aba = f"-{sheet_name}" if sheet_name is not None else ""
+    return Path(snapshot_dir) / f"{path.stem}{aba}-{digest[:16]}.parquet"
+
+
+def _file_hash(path: Path, snapshot_dir: Path) -> str:
+    # O hash do conteúdo é guardado junto com tamanho e mtime: se nenhum dos dois
+    # mudou, o arquivo não é lido de novo
+    stat = path.stat()
+    index_path = snapshot_dir / f"{path.stem}.json"
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            salvo = json.load(f)
+        if salvo['path'] == str(path.resolve()) and salvo['size'] == stat.st_size and salvo['mtime_ns'] == stat.st_mtime_ns:
+            return salvo['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    digest = sha.hexdigest()
+
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'path': str(path.resolve()), 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'sha256': digest,
+            }, f)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar {index_path}: {e}")
+    return digest
+
+
+def _write_snapshot(df: pd.DataFrame, snapshot: Path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    temp = snapshot.with_suffix('.tmp')
+    pq.write_table(table, temp)
+    os.replace(temp, snapshot)
+    # Cópias de versões anteriores da planilha não serão mais usadas
+    prefixo = snapshot.name[:-len('-0123456789abcdef.parquet')]
+    for antiga in snapshot.parent.glob(f"{prefixo}-{'?' * 16}.parquet"):
+        if antiga != snapshot:
+            antiga.unlink(missing_ok=True)
+    logger.info(f"Cópia da planilha gravada em {snapshot} ({len(df)} linhas)")
@@ -0,0 +1,376 @@
+"""
+Divisão de um backfill de documentos entre vários workers (máquinas) por faixas de id.
+
+O espaço de ids é dividido em faixas numa tabela compartilhada. Cada worker pega
+(claim) uma faixa livre, processa, renova o lease periodicamente (heartbeat)
+enquanto trabalha e marca a faixa como concluída no fim. Se um worker morrer, o
+lease expira e a faixa volta a ser pega por outro.
+
+Uma faixa em que o processamento falha volta a ficar livre só depois de uma
+espera crescente (LEASE_RETRY_SECONDS, dobrando a cada tentativa), e depois de
+LEASE_MAX_ATTEMPTS tentativas (contando leases expirados) fica como 'falhou',
+para que uma faixa com problema não prenda os workers.
+
+Aqui a tabela fica em SQLite, como substituto local da tabela no SQL Server: o
+claim é uma transação `BEGIN IMMEDIATE` (um worker por vez), o mesmo que um
+UPDATE com UPDLOCK/READPAST faria lá.
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_PATH = os.getenv('LEASE_PATH', 'leases.sqlite3')
+LEASE_SECONDS = int(os.getenv('LEASE_SECONDS', '300'))
+LEASE_MAX_ATTEMPTS = int(os.getenv('LEASE_MAX_ATTEMPTS', '5'))
+LEASE_RETRY_SECONDS = float(os.getenv('LEASE_RETRY_SECONDS', '30'))
+# Espera máxima entre duas tentativas da mesma faixa
+_MAX_RETRY_DELAY = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS faixas (
+    nome TEXT NOT NULL,
+    inicio INTEGER NOT NULL,
+    fim INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'livre',
+    dono TEXT,
+    expira_em REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    disponivel_em REAL,
+    atualizado_em REAL,
+    PRIMARY KEY (nome, inicio)
+);
+CREATE INDEX IF NOT EXISTS ix_faixas_status ON faixas (nome, status, inicio);
+"""
+
+
+@dataclass
+class Lease:
+    name: str
+    start: int  # primeiro id da faixa
+    end: int    # último id da faixa (inclusive)
+    worker_id: str
+    expires_at: float
+    # Sinalizado quando o heartbeat descobre que a faixa foi retomada por outro
+    # worker: quem processa deve parar assim que possível
+    lost: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class LeaseStore:
+    def __init__(self, db_path=DEFAULT_LEASE_PATH, lease_seconds=LEASE_SECONDS,
+                 max_attempts=LEASE_MAX_ATTEMPTS, retry_delay=LEASE_RETRY_SECONDS):
+        """
+        Abre (ou cria) a tabela de faixas
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite
+            lease_seconds (float): Validade de cada lease sem heartbeat
+            max_attempts (int): Tentativas por faixa antes de marcá-la como 'falhou'
+            retry_delay (float): Espera, em segundos, antes de uma faixa que falhou
+                voltar a ser pega (dobra a cada tentativa)
+        """
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # Transações explícitas (BEGIN IMMEDIATE); o timeout cobre a espera por
+        # outro processo que esteja com a escrita
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        colunas = {row[1] for row in self._conn.execute("PRAGMA table_info(faixas)")}
+        if 'disponivel_em' not in colunas:
+            # Tabela criada antes da espera entre tentativas
+            self._conn.execute("ALTER TABLE faixas ADD COLUMN disponivel_em REAL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                resultado = fn(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return resultado
+
+    def create_ranges(self, name: str, min_id: int, max_id: int, range_size: int) -> int:
+        """
+        Cobre [min_id, max_id] com faixas de `range_size` ids, alinhadas em
+        múltiplos de `range_size`. Faixas que já existem não são alteradas, então
+        vários workers podem chamar ao mesmo tempo, e chamar de novo com um
+        max_id maior só acrescenta as faixas novas (faixas já concluídas não são
+        reabertas).
+
+        Returns:
+            int: Faixas criadas agora
+        """
+        if range_size < 1:
+            raise ValueError("range_size deve ser maior que zero.")
+        agora = time.time()
+        primeira = min_id - min_id % range_size
+        faixas = [
+            (name, inicio, inicio + range_size - 1, agora)
+            for inicio in range(primeira, max_id + 1, range_size)
+        ]
+
+        def criar(conn):
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO faixas (nome, inicio, fim, atualizado_em) VALUES (?, ?, ?, ?)",
+                faixas
+            )
+            return conn.total_changes - antes
+
+        criadas = self._transaction(criar)
+        logger.info(f"{criadas} faixas criadas para {name} ({min_id}..{max_id}, {range_size} ids cada)")
+        return criadas
+
+    def claim(self, name: str, worker_id: str) -> Optional[Lease]:
+        """
+        Pega a próxima faixa livre (fora da espera entre tentativas), ou uma cujo
+        lease expirou. Faixas com lease expirado que já esgotaram as tentativas
+        são marcadas como 'falhou'.
+
+        Returns:
+            Lease: Faixa pega, ou None se não houver nenhuma disponível
+        """
+        def pegar(conn):
+            agora = time.time()
+            falhas = conn.execute(
+                """
+                UPDATE faixas SET status = 'falhou', dono = NULL, expira_em = NULL, atualizado_em = ?
+                WHERE nome = ? AND status = 'em_andamento' AND expira_em < ? AND tentativas >= ?
+                """,
+                (agora, name, agora, self.max_attempts)
+            ).rowcount
+            if falhas:
+                logger.error(f"{falhas} faixas de {name} marcadas como 'falhou' (lease expirado {self.max_attempts} vezes)")
+            row = conn.execute(
+                """
+                SELECT inicio, fim, status, dono FROM faixas
+                WHERE nome = ?
+                  AND ((status = 'livre' AND (disponivel_em IS NULL OR disponivel_em <= ?))
+                       OR (status = 'em_andamento' AND expira_em < ?))
+                ORDER BY inicio LIMIT 1
+                """,
+                (name, agora, agora)
+            ).fetchone()
+            if row is None:
+                return None
+            inicio, fim, status, dono_anterior = row
+            expira_em = agora + self.lease_seconds
+            conn.execute(
+                """
+                UPDATE faixas SET status = 'em_andamento', dono = ?, expira_em = ?,
+                    tentativas = tentativas + 1, atualizado_em = ?
+                WHERE nome = ? AND inicio = ?
+                """,
+                (worker_id, expira_em, agora, name, inicio)
+            )
+            if status == 'em_andamento':
+                logger.warning(f"Lease expirado de {dono_anterior} retomado: {name} {inicio}..{fim}")
+            return Lease(name, inicio, fim, worker_id, expira_em)
+
+        return self._transaction(pegar)
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """
+        Renova o lease
+
+        Returns:
+            bool: False se a faixa não pertence mais a este worker (expirou e foi
+            retomada); nesse caso `lease.lost` é sinalizado
+        """
+        agora = time.time()
+        expira_em = agora + self.lease_seconds
+
+        def renovar(conn):
+            return conn.execute(
+                """
+                UPDATE faixas SET expira_em = ?, atualizado_em = ?
+                WHERE nome = ? AND inicio = ? AND dono = ? AND status = 'em_andamento'
+                """,
+                (expira_em, agora, lease.name, lease.start, lease.worker_id)
+            ).rowcount
+
+        if self._transaction(renovar):
+            lease.expires_at = expira_em
+            return True
+        lease.lost.set()
+        return False
+
+    def complete(self, lease: Lease) -> bool:
+        """
+        Marca a faixa como concluída (só se ainda pertencer a este worker)
+        """
+        return self._finish(lease, 'concluida')
+
+    def release(self, lease: Lease) -> bool:
+        """
+        Devolve a faixa sem concluir, para que outro worker a pegue na hora
+        """
+        return self._finish(lease, 'livre')
+
+    def fail(self, lease: Lease) -> Optional[str]:
+        """
+        Devolve a faixa depois de um erro: ela volta a ficar livre só depois da
+        espera entre tentativas, ou fica como 'falhou' se esgotou as tentativas
+
+        Returns:
+            str: Novo status da faixa, ou None se ela não pertence mais a este worker
+        """
+        def devolver(conn):
+            row = conn.execute(
+                "SELECT tentativas FROM faixas WHERE nome = ? AND inicio = ? AND dono = ? AND status = 'em_andamento'",
+                (lease.name, lease.start, lease.worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            tentativas = row[0]
+            agora = time.time()
+            status = 'falhou' if tentativas >= self.max_attempts else 'livre'
+            espera = min(_MAX_RETRY_DELAY, self.retry_delay * 2 ** (tentativas - 1))
+            conn.execute(
+                """
+                UPDATE faixas SET status = ?, expira_em = NULL, disponivel_em = ?, atualizado_em = ?
+                WHERE nome = ? AND inicio = ?
+                """,
+                (status, agora + espera, agora, lease.name, lease.start)
+            )
+            return status
+
+        return self._transaction(devolver)
+
+    def next_available_at(self, name: str) -> Optional[float]:
+        """
+        Returns:
+            float: Momento (time.time) em que a próxima faixa pode voltar a ser
+            pega: o fim da espera de uma faixa que falhou ou o fim do lease de uma
+            faixa em andamento (se o worker dela morrer). None se não houver
+            nenhuma das duas
+        """
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT MIN(CASE WHEN status = 'livre' THEN disponivel_em ELSE expira_em END)
+                FROM faixas
+                WHERE nome = ? AND (status = 'em_andamento' OR (status = 'livre' AND disponivel_em > ?))
+                """,
+                (name, time.time())
+            ).fetchone()[0]
+
+    def _finish(self, lease, status):
+        def finalizar(conn):
+            return conn.execute(
+                """
+                UPDATE faixas SET status = ?, expira_em = NULL, disponivel_em = NULL, atualizado_em = ?
+                WHERE nome = ? AND inicio = ? AND dono = ? AND status = 'em_andamento'
+                """,
+                (status, time.time(), lease.name, lease.start, lease.worker_id)
+            ).rowcount
+
+        return bool(self._transaction(finalizar))
+
+    def progress(self, name: str) -> Dict[str, int]:
+        """
+        Returns:
+            dict: status -> quantidade de faixas
+        """
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM faixas WHERE nome = ? GROUP BY status", (name,)
+            ).fetchall())
+
+
+def run_worker(
+    store: LeaseStore,
+    name: str,
+    process_range: Callable[[Lease], None],
+    worker_id: Optional[str] = None,
+    heartbeat_interval: Optional[float] = None
+) -> int:
+    """
+    Pega e processa faixas até todas estarem concluídas (ou como 'falhou')
+
+    Enquanto `process_range(lease)` roda, uma thread renova o lease a cada
+    `heartbeat_interval` segundos (padrão: um terço da validade). Se o lease for
+    perdido, `lease.lost` é sinalizado e `process_range` deve parar; a faixa não
+    é marcada como concluída. Se `process_range` levantar uma exceção, a faixa é
+    devolvida com espera (LeaseStore.fail) e o worker segue para a próxima. Quando
+    só restam faixas em espera ou em andamento com outros workers, o worker
+    aguarda a primeira que pode voltar a ser pega (LeaseStore.next_available_at):
+    assim a faixa de um worker que morreu é retomada mesmo que os outros já
+    tenham terminado as suas.
+
+    Returns:
+        int: Faixas concluídas por este worker
+    """
+    worker_id = worker_id or default_worker_id()
+    heartbeat_interval = heartbeat_interval or store.lease_seconds / 3
+    concluidas = 0
+
+    while True:
+        lease = store.claim(name, worker_id)
+        if lease is None:
+            # Faixas em espera ou com outros workers: se um deles morrer, o lease
+            # expira e a faixa precisa de alguém para retomá-la
+            proxima = store.next_available_at(name)
+            if proxima is not None:
+                espera = max(0.0, proxima - time.time())
+                logger.info(f"Worker {worker_id}: aguardando {espera:.0f}s pela próxima faixa de {name}")
+                time.sleep(espera)
+                continue
+            logger.info(f"Worker {worker_id}: nenhuma faixa disponível em {name}; {concluidas} concluídas")
+            return concluidas
+
+        logger.info(f"Worker {worker_id}: faixa {lease.start}..{lease.end} de {name}")
+        parar = threading.Event()
+
+        def renovar():
+            while not parar.wait(heartbeat_interval):
+                try:
+                    if not store.heartbeat(lease):
+                        logger.warning(f"Worker {worker_id}: lease perdido na faixa {lease.start}..{lease.end}")
+                        return
+                except sqlite3.Error as e:
+                    logger.warning(f"Worker {worker_id}: falha no heartbeat: {e}")
+
+        heartbeat = threading.Thread(target=renovar, name=f'lease-{lease.start}', daemon=True)
+        heartbeat.start()
+        try:
+            process_range(lease)
+        except Exception as e:
+            logger.error(f"Worker {worker_id}: erro na faixa {lease.start}..{lease.end}: {e}")
+            parar.set()
+            heartbeat.join()
+            if store.fail(lease) == 'falhou':
+                logger.error(f"Worker {worker_id}: faixa {lease.start}..{lease.end} de {name} esgotou as tentativas")
+            continue
+        parar.set()
+        heartbeat.join()
+
+        if not lease.lost.is_set() and store.complete(lease):
+            concluidas += 1
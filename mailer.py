@@ -0,0 +1,231 @@
+"""
+Envio de e-mails com sessões SMTP reaproveitadas.
+
+Cada sessão faz a conexão, o STARTTLS e o login uma única vez e é usada para
+muitas mensagens; se o servidor derrubar a conexão, ela é refeita na hora e a
+mensagem é reenviada. Várias sessões podem enviar em paralelo, e um limite de
+mensagens por minuto (compartilhado entre elas) evita o bloqueio pelo provedor.
+"""
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Iterable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DOCX_MIME_TYPE = ('application', 'vnd.openxmlformats-officedocument.wordprocessingml.document')
+
+# Erros que indicam conexão perdida: a sessão é refeita e a mensagem reenviada
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def build_message(sender, recipient, subject, body, attachment_path=None, attachments=()):
+    """
+    Monta a mensagem com o corpo em texto e os relatórios .docx anexados
+
+    Args:
+        attachment_path (str): Arquivo anexado, lido do disco (ignorado se não existir)
+        attachments (Iterable): Tuplas (nome_do_arquivo, conteúdo em bytes), anexadas
+            direto da memória
+    """
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    if attachment_path and os.path.exists(attachment_path):
+        with open(attachment_path, 'rb') as attachment:
+            attachments = [(os.path.basename(attachment_path), attachment.read()), *attachments]
+
+    for filename, content in attachments:
+        part = MIMEBase(*DOCX_MIME_TYPE)
+        part.set_payload(content)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename={filename}')
+        msg.attach(part)
+    return msg
+
+
+class RateLimiter:
+    def __init__(self, per_minute: Optional[float]):
+        """
+        Espaça as chamadas de acquire() para no máximo `per_minute` por minuto
+        (None ou 0 desativa o limite)
+        """
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._next - agora
+            self._next = max(agora, self._next) + self.interval
+        if espera > 0:
+            time.sleep(espera)
+
+
+class _Session:
+    def __init__(self, mailer: 'Mailer', name: str):
+        self.mailer = mailer
+        self.name = name
+        self.server = None
+
+    def connect(self):
+        m = self.mailer
+        server = smtplib.SMTP(m.host, m.port, timeout=m.timeout)
+        try:
+            if m.starttls:
+                server.starttls()
+            if m.username:
+                server.login(m.username, m.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        logger.info(f"Sessão SMTP {self.name} conectada a {m.host}:{m.port}")
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+    def _discard(self):
+        try:
+            self.server.close()
+        except Exception:
+            pass
+        self.server = None
+
+    def send(self, msg):
+        for tentativa in range(2):
+            if self.server is None:
+                self.connect()
+            try:
+                self.server.send_message(msg)
+                return
+            except _RECONNECT_ERRORS as e:
+                self._discard()
+                if tentativa:
+                    raise
+                metrics.inc('papj_smtp_reconnects_total')
+                logger.warning(f"Sessão SMTP {self.name} caiu ({e}); reconectando")
+            except smtplib.SMTPResponseException as e:
+                # 421: o servidor vai fechar a conexão (ex.: limite por sessão)
+                if e.smtp_code != 421 or tentativa:
+                    raise
+                self.close()
+                metrics.inc('papj_smtp_reconnects_total')
+                logger.warning(f"Sessão SMTP {self.name} encerrada pelo servidor ({e.smtp_code}); reconectando")
+
+
+class Mailer:
+    def __init__(self, host='smtp.office365.com', port=587, username='', password='',
+                 sessions=1, messages_per_minute=None, starttls=True, timeout=60):
+        """
+        Args:
+            host (str): Servidor SMTP
+            port (int): Porta do servidor
+            username (str): Usuário (vazio: sem login)
+            password (str): Senha
+            sessions (int): Sessões SMTP simultâneas
+            messages_per_minute (float): Limite de mensagens por minuto, somando todas as sessões
+            starttls (bool): Usa STARTTLS após conectar
+            timeout (float): Timeout das operações de rede, em segundos
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sessions = max(1, sessions)
+        self.starttls = starttls
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(messages_per_minute)
+
+        # As sessões só conectam no primeiro envio
+        self._pool = queue.Queue()
+        self._all = [_Session(self, str(i)) for i in range(self.sessions)]
+        for session in self._all:
+            self._pool.put(session)
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Cria o Mailer a partir das variáveis SMTP_SERVER, SMTP_PORT, SMTP_USER,
+        SMTP_PASSWORD, SMTP_SESSIONS, SMTP_MESSAGES_PER_MINUTE e SMTP_STARTTLS
+        """
+        config = dict(
+            host=os.getenv('SMTP_SERVER', 'smtp.office365.com'),
+            port=int(os.getenv('SMTP_PORT', '587')),
+            username=os.getenv('SMTP_USER', ''),
+            password=os.getenv('SMTP_PASSWORD', ''),
+            sessions=int(os.getenv('SMTP_SESSIONS', '1')),
+            messages_per_minute=float(os.getenv('SMTP_MESSAGES_PER_MINUTE', '0')) or None,
+            starttls=os.getenv('SMTP_STARTTLS', '1') not in ('0', 'false', 'False'),
+        )
+        config.update(overrides)
+        return cls(**config)
+
+    @property
+    def sender(self):
+        return os.getenv('SMTP_FROM') or self.username
+
+    def send(self, msg):
+        """
+        Envia uma mensagem por uma das sessões livres (bloqueia se todas estiverem
+        em uso). Pode ser chamado de várias threads.
+        """
+        # Espera (limite por minuto e sessão livre) medida à parte do envio
+        with metrics.timer('papj_smtp_wait_seconds'):
+            self.rate_limiter.acquire()
+            session = self._pool.get()
+        try:
+            with metrics.timer('papj_smtp_send_seconds'):
+                session.send(msg)
+        finally:
+            self._pool.put(session)
+
+    def send_many(self, messages: Iterable) -> List[Tuple[bool, Optional[str]]]:
+        """
+        Envia várias mensagens usando todas as sessões em paralelo
+
+        Returns:
+            list: (enviado, erro) por mensagem, na ordem recebida
+        """
+        def enviar(msg):
+            try:
+                self.send(msg)
+                return True, None
+            except Exception as e:
+                logger.error(f"Falha ao enviar e-mail para {msg['To']}: {e}")
+                return False, str(e)
+
+        with ThreadPoolExecutor(max_workers=self.sessions, thread_name_prefix='smtp') as executor:
+            return list(executor.map(enviar, messages))
+
+    def close(self):
+        for session in self._all:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,112 +1,122 @@
-import pandas as pd
-import docx
-from docx import Document
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 import os
+import pandas as pd
 from datetime import datetime
-from email.mime.text import MIMEText
 
-# Read the Excel file
-df = pd.read_excel('base_acao_exemplo.xlsx')
+import metrics
+from checkpoints import CheckpointStore
+from ingest import iter_query_chunks, iter_sheet_chunks
+from mailer import Mailer, build_message
+from report_data import iter_records
+from report_pipeline import DIGEST_MAX_BYTES, ReportJob, run_pipeline
+from report_template import load_template
 
 # Function to replace placeholders in the document
 def fill_document(template_path, data, output_path):
-    doc = Document(template_path)
-    
-    # Replace placeholders in the document
-    for paragraph in doc.paragraphs:
-        for key, value in data.items():
-            placeholder = f'{key}'
-            if placeholder in paragraph.text:
-                paragraph.text = paragraph.text.replace(placeholder, str(value))
-    
-    doc.save(output_path)
+    # The template is parsed once and reused while the file is unchanged;
+    # placeholders are replaced in paragraphs, tables, headers and footers
+    with metrics.timer('papj_render_seconds'):
+        template = load_template(template_path, data.keys())
+        template.render_to(output_path, data)
 
 # Function to send email with attachment
-def send_email(recipient_email, subject, body, attachment_path):
-    # Email configuration
-    smtp_server = 'smtp.office365.com'
-    smtp_port = 587
-    sender_email = ''
-    sender_password = ''  # Consider using environment variables for security
-    
-    # Create message
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = recipient_email
-    msg['Subject'] = subject
-    
-    # Add the email body
-    msg.attach(MIMEText(body, 'plain', 'utf-8'))  # Added UTF-8 encoding
+def send_email(recipient_email, subject, body, attachment_path, mailer=None):
+    # Email configuration comes from the SMTP_* environment variables (see mailer.py).
+    # Pass a Mailer to reuse its authenticated session across messages; without
+    # one, a single-use session is opened for this message
+    own_mailer = mailer is None
+    if own_mailer:
+        mailer = Mailer.from_env()
     
-    # Attach the file
-    if os.path.exists(attachment_path):  # Check if file exists
-        with open(attachment_path, 'rb') as attachment:
-            part = MIMEBase('application', 'vnd.openxmlformats-officedocument.wordprocessingml.document')  # Specific MIME type for .docx
-            part.set_payload(attachment.read())
-        
-        encoders.encode_base64(part)
-        
-        part.add_header(
-            'Content-Disposition',
-            f'attachment; filename={os.path.basename(attachment_path)}'  # Removed extra space
-        )
-        
-        msg.attach(part)
+    # Create message with the report attached (see mailer.build_message)
+    msg = build_message(mailer.sender, recipient_email, subject, body, attachment_path)
     
     # Send email
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:  # Using context manager
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)  # Using send_message instead of sendmail
+        mailer.send(msg)  # Reconnects transparently if the session dropped
         print(f"Email sent successfully to {recipient_email}")
     except Exception as e:
         print(f"Failed to send email to {recipient_email}: {e}")
+    finally:
+        if own_mailer:
+            mailer.close()
+
+def main():
+    if os.getenv('REPORT_SOURCE') == 'sql':
+        # Same rows straight from SQL Server (REPORT_SOURCE_VIEW / REPORT_SOURCE_QUERY)
+        chunks = iter_query_chunks()
+    else:
+        # Read the Excel file in chunks, so the first reports go out while the rest
+        # of the sheet is still being parsed (see ingest.py; unchanged files are
+        # read from the Parquet snapshot)
+        chunks = iter_sheet_chunks('base_acao_exemplo.xlsx')
+
+    # With CHECKPOINT_PATH set, reports already sent by a previous (interrupted)
+    # run are skipped; see checkpoints.py
+    checkpoints = CheckpointStore(os.environ['CHECKPOINT_PATH']) if os.getenv('CHECKPOINT_PATH') else None
+
+    # One SMTP session for the whole run
+    try:
+        with Mailer.from_env() as mailer:
+            stats = run_reports(chunks, mailer, checkpoints)
+    finally:
+        if checkpoints is not None:
+            checkpoints.close()
+
+    print(stats.summary())
+    print("All reports generated and emails sent.")
 
-# Main processing loop
-for index, row in df.iterrows():
-    # Prepare data dictionary for this row, substituindo valores vazios ou NaN por ""
-    data = {
-        'id_documento': "" if pd.isna(row['id_documento']) else row['id_documento'],
-        'COD_ACAO': "" if pd.isna(row['COD_ACAO']) else row['COD_ACAO'],
-        'Responsavel_': "" if pd.isna(row['Responsavel']) else row['Responsavel'],
-        'NOME_PJ_CONCATENADO': "" if pd.isna(row['NOME_PJ_CONCATENADO']) else row['NOME_PJ_CONCATENADO'],
-        'proced_SEI': "" if pd.isna(row['proced_SEI']) else row['proced_SEI'],
-        'TEMA_ind': "" if pd.isna(row['TEMA']) else row['TEMA'],
-        'DIRETRIZ_CONSOLIDADA': "" if pd.isna(row['DIRETRIZ_CONSOLIDADA']) else row['DIRETRIZ_CONSOLIDADA'],
-        'RESULTADOS_ESPERADOS': "" if pd.isna(row['RESULTADOS_ESPERADOS']) else row['RESULTADOS_ESPERADOS'],
-        'Indicador 1: IND_01': "" if pd.isna(row['IND_01']) else row['IND_01'],
-        'Indicador 2: IND_02': "" if pd.isna(row['IND_02']) else row['IND_02'],
-        'Indicador 3: IND_03': "" if pd.isna(row['IND_03']) else row['IND_03'],
-        'Indicador 4: IND_04': "" if pd.isna(row['IND_04']) else row['IND_04'],
-        'Indicador 5: IND_05': "" if pd.isna(row['IND_05']) else row['IND_05'],
-        'Indicador 6: IND_06': "" if pd.isna(row['IND_06']) else row['IND_06'],
-        'Indicador 7: IND_07': "" if pd.isna(row['IND_07']) else row['IND_07'],
-        'Indicador 8: IND_08': "" if pd.isna(row['IND_08']) else row['IND_08'],
-        'Insira aqui o resultado do indicador 1': "" if pd.isna(row['IND_01']) else 'Insira aqui o resultado do indicador 1',
-        'Insira aqui o resultado do indicador 2': "" if pd.isna(row['IND_02']) else 'Insira aqui o resultado do indicador 2',
-        'Insira aqui o resultado do indicador 3': "" if pd.isna(row['IND_03']) else 'Insira aqui o resultado do indicador 3',
-        'Insira aqui o resultado do indicador 4': "" if pd.isna(row['IND_04']) else 'Insira aqui o resultado do indicador 4',
-        'Insira aqui o resultado do indicador 5': "" if pd.isna(row['IND_05']) else 'Insira aqui o resultado do indicador 5',
-        'Insira aqui o resultado do indicador 6': "" if pd.isna(row['IND_06']) else 'Insira aqui o resultado do indicador 6',
-        'Insira aqui o resultado do indicador 7': "" if pd.isna(row['IND_07']) else 'Insira aqui o resultado do indicador 7',
-        'Insira aqui o resultado do indicador 8': "" if pd.isna(row['IND_08']) else 'Insira aqui o resultado do indicador 8'
-    }
-    # Generate output filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_filename = f'relatorio_{row["id_documento"]}_{timestamp}.docx'
+    # Per-stage timings and counters (METRICS_TEXTFILE / METRICS_JSON_DIR; see metrics.py)
+    metrics.export(run='relatorios')
+
+
+def run_reports(frames, mailer, checkpoints=None):
+    # Documents are rendered in a process pool while the mailer threads send the
+    # ones already done; see report_pipeline.py. Accepts a DataFrame or an
+    # iterable of DataFrame chunks. Reports are attached straight from memory;
+    # set REPORT_ARCHIVE_DIR to also keep a copy of each one on disk
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+
+    # Digest mode (REPORT_DIGEST=1): one message per recipient with all of their
+    # reports, split when the attachments exceed REPORT_DIGEST_MAX_BYTES
+    digest = os.getenv('REPORT_DIGEST', '0') not in ('0', 'false', 'False', '')
+    if digest:
+        # Rows of the same recipient must be consecutive, so the whole input is needed
+        df = pd.concat(list(frames), ignore_index=True)
+        df = df.iloc[df['E-mail'].astype(str).str.strip().str.lower().argsort(kind='stable')]
+        frames = [df]
+
+    jobs = (job for df in frames for job in iter_report_jobs(df))
+    return run_pipeline(jobs, 'modelo_relatorio.docx', mailer, checkpoints=checkpoints,
+                        archive_dir=os.getenv('REPORT_ARCHIVE_DIR'),
+                        digest=digest_message if digest else None,
+                        max_attachment_bytes=int(os.getenv('REPORT_DIGEST_MAX_BYTES', str(DIGEST_MAX_BYTES))))
+
+
+def digest_message(jobs):
+    # Subject and body for a message carrying several reports of one recipient
+    acoes = ', '.join(str(job.data['COD_ACAO']) for job in jobs)
+    email_subject = f'Relatórios PAPJ - {len(jobs)} ações'
+    email_body = f'Prezado(a) {jobs[0].data["Responsavel_"]},\n\nSeguem em anexo os relatórios preenchidos para as ações {acoes}.\n\nAtenciosamente,\nSistema Automático'
+    return email_subject, email_body
+
+
+def iter_report_jobs(df):
+    # Placeholder values are prepared column-wise from the mapping in report_data.py
+    for data, row in iter_records(df):
+        # Generate output (attachment) filename
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_filename = f'relatorio_{row["id_documento"]}_{timestamp}.docx'
     
-    # Fill document with data
-    fill_document('modelo_relatorio.docx', data, output_filename)
+        # Send email
+        email_subject = f'Relatório {row["COD_ACAO"]} - {row["NOME_PJ_CONCATENADO"]}'
+        email_body = f'Prezado(a) {row["Responsavel"]},\n\nSegue em anexo o relatório preenchido para a ação {row["COD_ACAO"]}.\n\nAtenciosamente,\nSistema Automático'
     
-    # Send email
-    email_subject = f'Relatório {row["COD_ACAO"]} - {row["NOME_PJ_CONCATENADO"]}'
-    email_body = f'Prezado(a) {row["Responsavel"]},\n\nSegue em anexo o relatório preenchido para a ação {row["COD_ACAO"]}.\n\nAtenciosamente,\nSistema Automático'
+        # One checkpoint per document, action and recipient
+        key = f'{row["id_documento"]}|{row["COD_ACAO"]}|{row["E-mail"]}'
     
-    send_email(row['E-mail'], email_subject, email_body, output_filename)
+        yield ReportJob(data, output_filename, row['E-mail'], email_subject, email_body, key)
+
 
-print("All reports generated and emails sent.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Métricas de tempo e volume por etapa (consulta de paths, busca de objetos,
+downloads, renderização, envio SMTP).
+
+Contadores e histogramas ficam em memória no processo e são exportados no fim
+da execução como arquivo texto do Prometheus (para o textfile collector do
+node_exporter) e/ou como um resumo JSON da execução:
+
+    with metrics.timer('papj_render_seconds'):
+        ...
+    metrics.inc('papj_download_bytes_total', result.bytes)
+    metrics.export()
+
+Desativado por padrão: é ligado por METRICS_ENABLED=1 ou quando METRICS_TEXTFILE
+ou METRICS_JSON_DIR está definido. Desligado, cada chamada só testa um booleano
+(timer devolve um context manager vazio compartilhado).
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE')
+METRICS_JSON_DIR = os.getenv('METRICS_JSON_DIR')
+
+# Limites (em segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Limites (em bytes) dos histogramas de tamanho: 1 KB a 1 GB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))
+
+_NULL_TIMER = nullcontext()
+
+
+def _env_enabled():
+    return (
+        os.getenv('METRICS_ENABLED', '0') not in ('0', 'false', 'False', '')
+        or bool(METRICS_TEXTFILE) or bool(METRICS_JSON_DIR)
+    )
+
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # o último é o +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        i = 0
+        for limite in self.bounds:
+            if value <= limite:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Interpolação linear dentro do bucket, como o histogram_quantile do Prometheus
+        if not self.count:
+            return None
+        alvo = q * self.count
+        acumulado = 0
+        for i, n in enumerate(self.counts):
+            if acumulado + n >= alvo and n:
+                inferior = self.bounds[i - 1] if i else 0.0
+                superior = self.bounds[i] if i < len(self.bounds) else self.max
+                inferior, superior = max(inferior, self.min), min(superior, self.max)
+                return inferior + (superior - inferior) * (alvo - acumulado) / n
+            acumulado += n
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0, 'sum': 0.0}
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6),
+            'min': round(self.min, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+        }
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'inicio')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        labels = self.labels
+        if exc_type is not None:
+            labels = {**labels, 'status': 'erro'}
+        self.registry.observe(self.name, time.perf_counter() - self.inicio, **labels)
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        """
+        Contadores e histogramas com rótulos, seguros para várias threads
+
+        Args:
+            enabled (bool): Desligado, todas as chamadas são ignoradas
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._counters: Dict[Tuple[str, tuple], float] = {}
+            self._histograms: Dict[Tuple[str, tuple], _Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Soma `value` ao contador `name` (nomes terminados em _total, por convenção)
+        """
+        if not self.enabled:
+            return
+        chave = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[chave] = self._counters.get(chave, 0) + value
+
+    def observe(self, name: str, value: float, buckets=None, **labels):
+        """
+        Registra `value` no histograma `name` (limites padrão: LATENCY_BUCKETS,
+        ou SIZE_BUCKETS para nomes terminados em _bytes)
+        """
+        if not self.enabled:
+            return
+        chave = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histograma = self._histograms.get(chave)
+            if histograma is None:
+                if buckets is None:
+                    buckets = SIZE_BUCKETS if name.endswith('_bytes') else LATENCY_BUCKETS
+                histograma = self._histograms[chave] = _Histogram(buckets)
+            histograma.observe(value)
+
+    def timer(self, name: str, **labels):
+        """
+        Context manager que registra a duração do bloco (em segundos) no
+        histograma `name`; se o bloco levantar uma exceção, com status="erro"
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: Resumo da execução (contadores e histogramas com média, p50, p95...)
+        """
+        agora = datetime.now()
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'finished_at': agora.isoformat(timespec='seconds'),
+                'duration_seconds': round((agora - self.started_at).total_seconds(), 3),
+                'counters': {
+                    _series(name, labels): value for (name, labels), value in sorted(self._counters.items())
+                },
+                'histograms': {
+                    _series(name, labels): h.summary() for (name, labels), h in sorted(self._histograms.items())
+                },
+            }
+
+    def prometheus_text(self) -> str:
+        """
+        Returns:
+            str: Métricas no formato texto do Prometheus
+        """
+        linhas = []
+        tipos = set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in tipos:
+                    tipos.add(name)
+                    linhas.append(f"# TYPE {name} counter")
+                linhas.append(f"{_series(name, labels)} {_number(value)}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in tipos:
+                    tipos.add(name)
+                    linhas.append(f"# TYPE {name} histogram")
+                acumulado = 0
+                for limite, n in zip(h.bounds, h.counts):
+                    acumulado += n
+                    linhas.append(f"{_series(name + '_bucket', labels + (('le', _number(limite)),))} {acumulado}")
+                linhas.append(f"{_series(name + '_bucket', labels + (('le', '+Inf'),))} {h.count}")
+                linhas.append(f"{_series(name + '_sum', labels)} {_number(h.sum)}")
+                linhas.append(f"{_series(name + '_count', labels)} {h.count}")
+        return '\n'.join(linhas) + '\n'
+
+    def write_textfile(self, path: str):
+        # Grava em um temporário e renomeia: o coletor nunca lê um arquivo pela metade
+        _write_atomic(path, self.prometheus_text())
+
+    def write_json(self, directory: str, **extra) -> str:
+        """
+        Grava o resumo da execução em `directory`/metrics_<início>.json
+
+        Args:
+            extra: Campos adicionais do resumo (ex.: run='relatorios')
+
+        Returns:
+            str: Caminho do arquivo gravado
+        """
+        resumo = {**extra, **self.snapshot()}
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics_{self.started_at.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json")
+        _write_atomic(path, json.dumps(resumo, indent=2, ensure_ascii=False) + '\n')
+        return path
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    rotulos = ','.join(f'{chave}="{_escape(valor)}"' for chave, valor in labels)
+    return f"{name}{{{rotulos}}}"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _write_atomic(path, content):
+    pasta = os.path.dirname(os.path.abspath(path))
+    os.makedirs(pasta, exist_ok=True)
+    temporario = f"{path}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temporario, path)
+
+
+# Registro do processo, usado pelas funções abaixo
+REGISTRY = MetricsRegistry(enabled=_env_enabled())
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+snapshot = REGISTRY.snapshot
+
+
+def enable(enabled: bool = True):
+    REGISTRY.enabled = enabled
+
+
+def export(textfile: Optional[str] = METRICS_TEXTFILE, json_dir: Optional[str] = METRICS_JSON_DIR, **extra):
+    """
+    Exporta as métricas da execução para os destinos configurados
+
+    Args:
+        textfile (str): Arquivo .prom para o textfile collector (padrão: METRICS_TEXTFILE)
+        json_dir (str): Pasta dos resumos JSON por execução (padrão: METRICS_JSON_DIR)
+        extra: Campos adicionais do resumo JSON
+    """
+    if not REGISTRY.enabled:
+        return
+    try:
+        if textfile:
+            REGISTRY.write_textfile(textfile)
+            logger.info(f"Métricas gravadas em {textfile}")
+        if json_dir:
+            path = REGISTRY.write_json(json_dir, **extra)
+            logger.info(f"Resumo de métricas gravado em {path}")
+    except OSError as e:
+        logger.error(f"Erro ao exportar métricas: {e}")
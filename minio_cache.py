@@ -0,0 +1,229 @@
+"""
+Cache local dos objetos baixados do MinIO.
+
+Cada objeto (bucket + chave) é armazenado uma única vez em `cache_dir/objetos`, e o
+manifesto (SQLite) guarda ETag, tamanho e mtime de cada cópia. Os arquivos pedidos em
+download_document são hard links para a cópia do cache, então vários documentos que
+apontam para o mesmo objeto não ocupam espaço duplicado.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR', '.minio_cache')
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifesto (
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    blob TEXT NOT NULL,
+    ultimo_acesso REAL NOT NULL,
+    PRIMARY KEY (bucket, object_key)
+);
+CREATE INDEX IF NOT EXISTS ix_manifesto_acesso ON manifesto (ultimo_acesso);
+"""
+
+
+@dataclass
+class CacheEntry:
+    bucket: str
+    object_key: str
+    etag: str
+    size: int
+    mtime: float
+    blob: str
+
+
+class DownloadCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        """
+        Abre (ou cria) o cache de downloads
+
+        Args:
+            cache_dir (str): Diretório do cache
+            max_bytes (int): Tamanho máximo do cache; os objetos acessados há mais
+                tempo são removidos quando o limite é ultrapassado
+        """
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(self.cache_dir, 'objetos')
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Entradas em uso (sendo gravadas ou disponibilizadas): não são removidas pelo evict
+        self._pinned = {}
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, 'manifesto.sqlite3'), check_same_thread=False
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, bucket_name: str, object_key: str) -> Optional[CacheEntry]:
+        """
+        Retorna a entrada do manifesto se a cópia local ainda for válida
+        (arquivo presente, com o mesmo tamanho e mtime registrados)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT bucket, object_key, etag, size, mtime, blob FROM manifesto "
+                "WHERE bucket = ? AND object_key = ?",
+                (bucket_name, object_key)
+            ).fetchone()
+        if not row:
+            return None
+
+        entry = CacheEntry(*row)
+        try:
+            stat = os.stat(entry.blob)
+        except FileNotFoundError:
+            self._forget(bucket_name, object_key)
+            return None
+        if stat.st_size != entry.size or stat.st_mtime != entry.mtime:
+            logger.warning(f"Cópia em cache alterada localmente, descartando: {bucket_name}/{object_key}")
+            self._forget(bucket_name, object_key)
+            return None
+        return entry
+
+    def temp_path(self, bucket_name: str, object_key: str) -> str:
+        """
+        Caminho temporário (no mesmo sistema de arquivos do cache) para um download em andamento
+        """
+        return f"{self._blob_path(bucket_name, object_key)}.{threading.get_ident()}.part"
+
+    def store(self, bucket_name: str, object_key: str, etag: str, temp_path: str, local_path: str) -> str:
+        """
+        Move um download concluído para o cache, registra no manifesto e
+        disponibiliza em local_path (ver materialize). Objetos maiores que
+        max_bytes não ficam no cache: o arquivo vai direto para local_path.
+
+        Returns:
+            str: local_path
+        """
+        if self.max_bytes and os.path.getsize(temp_path) > self.max_bytes:
+            logger.info(f"Objeto maior que o cache, não armazenado: {bucket_name}/{object_key}")
+            shutil.move(temp_path, local_path)
+            return local_path
+
+        blob = self._blob_path(bucket_name, object_key)
+        with self._pin(bucket_name, object_key):
+            os.replace(temp_path, blob)
+            stat = os.stat(blob)
+            entry = CacheEntry(bucket_name, object_key, etag, stat.st_size, stat.st_mtime, blob)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO manifesto "
+                    "(bucket, object_key, etag, size, mtime, blob, ultimo_acesso) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (bucket_name, object_key, etag, entry.size, entry.mtime, blob, time.time())
+                )
+            self.materialize(entry, local_path)
+        # Só depois do link, e sem remover a entrada recém-gravada
+        self.evict(keep=(bucket_name, object_key))
+        return local_path
+
+    def materialize(self, entry: CacheEntry, local_path: str) -> str:
+        """
+        Disponibiliza a cópia do cache em local_path (hard link, ou cópia se o
+        link não for possível) e atualiza o último acesso da entrada
+
+        Raises:
+            FileNotFoundError: A cópia foi removida do cache (evict) depois do get
+        """
+        with self._pin(entry.bucket, entry.object_key):
+            if os.path.exists(local_path):
+                if os.path.samefile(local_path, entry.blob):
+                    self._touch(entry)
+                    return local_path
+                os.remove(local_path)
+            try:
+                os.link(entry.blob, local_path)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(entry.blob, local_path)
+            self._touch(entry)
+        return local_path
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM manifesto").fetchone()[0]
+
+    def evict(self, keep=None):
+        """
+        Remove as entradas acessadas há mais tempo até o cache caber em max_bytes
+
+        Args:
+            keep (tuple): (bucket, chave) que não deve ser removida
+        """
+        if not self.max_bytes:
+            return
+        excesso = self.total_bytes() - self.max_bytes
+        if excesso <= 0:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket, object_key, size, blob FROM manifesto ORDER BY ultimo_acesso"
+            ).fetchall()
+        for bucket_name, object_key, size, blob in rows:
+            if excesso <= 0:
+                break
+            # Sob o lock: uma entrada fixada (_pin) depois da consulta não é removida
+            with self._lock:
+                if (bucket_name, object_key) in self._pinned or (bucket_name, object_key) == keep:
+                    continue
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM manifesto WHERE bucket = ? AND object_key = ?", (bucket_name, object_key)
+                    )
+                try:
+                    os.remove(blob)
+                except FileNotFoundError:
+                    pass
+            excesso -= size
+            logger.debug(f"Removido do cache: {bucket_name}/{object_key}")
+
+    @contextmanager
+    def _pin(self, bucket_name, object_key):
+        chave = (bucket_name, object_key)
+        with self._lock:
+            self._pinned[chave] = self._pinned.get(chave, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned[chave] -= 1
+                if not self._pinned[chave]:
+                    del self._pinned[chave]
+
+    def _blob_path(self, bucket_name, object_key):
+        nome = hashlib.sha1(f"{bucket_name}/{object_key}".encode('utf-8')).hexdigest()
+        return os.path.join(self.blob_dir, nome)
+
+    def _touch(self, entry):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE manifesto SET ultimo_acesso = ? WHERE bucket = ? AND object_key = ?",
+                (time.time(), entry.bucket, entry.object_key)
+            )
+
+    def _forget(self, bucket_name, object_key):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM manifesto WHERE bucket = ? AND object_key = ?", (bucket_name, object_key)
+            )
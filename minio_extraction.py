@@ -1,21 +1,55 @@
+import importlib
 import logging
 import os
 import platform
 import re
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path # Usar pathlib para manipulação de caminhos
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Iterable, Iterator, Tuple
 import tempfile # Para arquivos temporários
 
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch, ConnectionError as ESConnectionError
-from elasticsearch.helpers import bulk
-import pyodbc
+
+import metrics
+
+from minio_cache import DownloadCache
+from minio_index import ObjectKeyIndex, choose_key
+from minio_throttle import MinIOThrottle
+
+if TYPE_CHECKING:
+    import pyodbc
+
+# Dependências pesadas (PyMuPDF, Tesseract, Elasticsearch, boto3, pyodbc) só são
+# importadas no primeiro uso, para que importar o módulo (ex.: um cron que só
+# resolve paths) não pague o custo de todas elas. Continuam acessíveis como
+# atributos do módulo (minio_extraction.fitz etc.) via __getattr__.
+_LAZY_IMPORTS = {
+    'fitz': ('fitz', None),
+    'pytesseract': ('pytesseract', None),
+    'Image': ('PIL.Image', None),
+    'Elasticsearch': ('elasticsearch', 'Elasticsearch'),
+    'ESConnectionError': ('elasticsearch', 'ConnectionError'),
+    'bulk': ('elasticsearch.helpers', 'bulk'),
+    'pyodbc': ('pyodbc', None),
+    'boto3': ('boto3', None),
+    'ClientError': ('botocore.exceptions', 'ClientError'),
+    'NoCredentialsError': ('botocore.exceptions', 'NoCredentialsError'),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attr:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
 
 
 # Carrega as variáveis de ambiente do .env (se existir)
@@ -42,12 +76,29 @@ class AppConfig:
     MINIO_ENDPOINT: str = os.getenv('MINIO_ENDPOINT')
     MINIO_ACCESS_KEY: str = os.getenv('MINIO_ACCESS_KEY')
     MINIO_SECRET_KEY: str = os.getenv('MINIO_SECRET_KEY')
+    # Índice local de chaves do MinIO (ver minio_index.py); vazio desativa
+    MINIO_INDEX_PATH: Optional[str] = os.getenv('MINIO_INDEX_PATH')
+    # Cache local de downloads (ver minio_cache.py); vazio desativa
+    DOWNLOAD_CACHE_DIR: Optional[str] = os.getenv('DOWNLOAD_CACHE_DIR')
+    DOWNLOAD_CACHE_MAX_BYTES: int = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
 
     TESSERACT_TEST_IMAGE: str = os.getenv('TESSERACT_TEST_IMAGE', 'test.png') # Opcional
+    # Extração de texto (ver text_extraction.py)
+    OCR_DPI: int = int(os.getenv('OCR_DPI', '300'))
+    OCR_LANG: str = os.getenv('OCR_LANG', 'por')
+    # Teto de memória (MB) por processo de extração: acima dele o DPI do OCR é
+    # reduzido página a página, até OCR_MIN_DPI (0 desativa)
+    OCR_MAX_RSS_MB: int = int(os.getenv('OCR_MAX_RSS_MB', '0'))
+    OCR_MIN_DPI: int = int(os.getenv('OCR_MIN_DPI', '150'))
+    # Cache do texto extraído (ver text_cache.py); vazio desativa
+    TEXT_CACHE_PATH: Optional[str] = os.getenv('TEXT_CACHE_PATH')
+    TEXT_CACHE_MAX_BYTES: int = int(os.getenv('TEXT_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
 
     # Diretório base para saída temporária, se não usar tempfile para tudo
     # OUTPUT_BASE_DIR: Path = Path(os.getenv('OUTPUT_BASE_DIR', './ocr_output'))
 
+    _validated: bool = False
+
     @staticmethod
     def _validate_config():
         if not AppConfig.SQL_SERVER_CNXN_STR:
@@ -56,14 +107,28 @@ class AppConfig:
         logger.info('String de conexão SQL Server carregada.')
         logger.info('Hosts Elasticsearch: %s', AppConfig.ELASTICSEARCH_HOSTS)
         logger.info('Configuração MinIO: %s', {"endpoint": AppConfig.MINIO_ENDPOINT})
+        AppConfig._validated = True
+
+    @staticmethod
+    def ensure_valid():
+        """
+        Valida a configuração no primeiro uso (e não mais na importação do módulo)
+        """
+        if not AppConfig._validated:
+            AppConfig._validate_config()
 
 
-AppConfig._validate_config()
 # AppConfig.OUTPUT_BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 
 
-def get_db_connection(conn_str: str) -> pyodbc.Connection:
+def get_db_connection(conn_str: Optional[str] = None) -> "pyodbc.Connection":
+    # Sem string de conexão explícita, usa (e valida) a do AppConfig
+    if not conn_str:
+        AppConfig.ensure_valid()
+        conn_str = AppConfig.SQL_SERVER_CNXN_STR
+
+    import pyodbc
     try:
         return pyodbc.connect(conn_str)
     except pyodbc.Error as ex:
@@ -72,36 +137,186 @@ def get_db_connection(conn_str: str) -> pyodbc.Connection:
         raise # Re-levanta para ser tratado pelo chamador
 
 
-def get_minio_file_path(id_documento_mni: str, db_conn) -> str:
-    # Primeira query - busca pelo arquivo renderizado
-    query_renderizado = """
-        SELECT a.path as caminho_minio
+# Tamanho padrão dos lotes de ids enviados ao SQL Server. O driver aceita no
+# máximo 2100 parâmetros por comando, então mantemos uma boa margem.
+PATH_LOOKUP_CHUNK_SIZE = 500
+
+
+def iter_minio_file_paths(
+    ids_documentos: Iterable,
+    db_conn,
+    chunk_size: int = PATH_LOOKUP_CHUNK_SIZE
+) -> Iterator[Tuple[Any, Optional[str]]]:
+    """
+    Resolve em lote o caminho MinIO de vários documentos.
+
+    Os ids são agrupados em lotes de `chunk_size` e cada lote é resolvido com uma
+    única query: o arquivo renderizado tem prioridade e o arquivo externo é usado
+    como fallback (COALESCE no próprio SQL), evitando duas idas ao banco por documento.
+
+    Args:
+        ids_documentos (Iterable): Ids dos documentos (int ou str)
+        db_conn: Conexão ativa com o SQL Server
+        chunk_size (int): Quantidade de ids por query
+
+    Yields:
+        tuple: (id_documento, caminho_minio) na ordem recebida; caminho_minio é
+        None quando o documento não existe ou não tem arquivo associado
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size deve ser maior que zero.")
+
+    lote = []
+    for id_documento in ids_documentos:
+        lote.append(id_documento)
+        if len(lote) >= chunk_size:
+            yield from _resolve_minio_paths_chunk(lote, db_conn)
+            lote = []
+    if lote:
+        yield from _resolve_minio_paths_chunk(lote, db_conn)
+
+
+def _resolve_minio_paths_chunk(lote: List[Any], db_conn) -> Iterator[Tuple[Any, Optional[str]]]:
+    # Ids repetidos no lote viram um único parâmetro
+    unicos = list(dict.fromkeys(str(id_documento).strip() for id_documento in lote))
+    placeholders = ", ".join("?" for _ in unicos)
+    query = f"""
+        SELECT d.Id,
+               COALESCE(NULLIF(ar.path, ''), NULLIF(ae.path, '')) as caminho_minio
         FROM MPES.dbo.documentos d WITH (NOLOCK)
-        LEFT JOIN MPES.dbo.arquivos a WITH (NOLOCK) ON a.id = d.id_arquivo_renderizado
-        WHERE d.Id = ?
+        LEFT JOIN MPES.dbo.arquivos ar WITH (NOLOCK) ON ar.id = d.id_arquivo_renderizado
+        LEFT JOIN MPES.dbo.arquivos ae WITH (NOLOCK) ON ae.id = d.id_arquivo_externo
+        WHERE d.Id IN ({placeholders})
     """
-    
-    # Segunda query - busca pelo arquivo original (se a primeira não retornar nada)
-    query_original = """
-        SELECT a.path as caminho_minio
+
+    with metrics.timer('papj_path_lookup_seconds', query='lote'), db_conn.cursor() as cursor:
+        cursor.execute(query, unicos)
+        caminhos = {str(row[0]): row[1] for row in cursor.fetchall()}
+    metrics.inc('papj_path_lookup_documents_total', len(unicos), query='lote')
+
+    for id_documento in lote:
+        yield id_documento, caminhos.get(str(id_documento).strip())
+
+
+def get_minio_file_paths(
+    ids_documentos: Iterable,
+    db_conn,
+    chunk_size: int = PATH_LOOKUP_CHUNK_SIZE
+) -> Dict[Any, Optional[str]]:
+    """
+    Versão em dicionário de `iter_minio_file_paths`.
+
+    Returns:
+        dict: Mapeamento id_documento -> caminho_minio (ou None)
+    """
+    return dict(iter_minio_file_paths(ids_documentos, db_conn, chunk_size))
+
+
+def get_minio_file_path(id_documento_mni: str, db_conn) -> str:
+    # Busca o arquivo renderizado e, se não houver, o arquivo original,
+    # tudo em uma única query (ver iter_minio_file_paths)
+    return get_minio_file_paths([id_documento_mni], db_conn).get(id_documento_mni)
+
+
+# Documentos por página na enumeração por tipo
+ENUMERATION_PAGE_SIZE = 1000
+
+
+def iter_document_pages(
+    tipo_documento: int,
+    db_conn,
+    page_size: int = ENUMERATION_PAGE_SIZE,
+    after_id: int = 0,
+    until_id: Optional[int] = None
+) -> Iterator[List[Tuple[int, Optional[str]]]]:
+    """
+    Enumera os documentos ativos de um tipo, com o caminho MinIO, página a página.
+
+    A paginação é por chave (`d.Id > ? ORDER BY d.Id`): cada página é uma busca no
+    índice a partir do último id, sem OFFSET e sem carregar o resultado inteiro.
+    O arquivo renderizado e o externo vêm de dois ramos de um UNION ALL (cada um
+    um join por igualdade, em vez do `OR` no ON), com o renderizado tendo prioridade.
+
+    Args:
+        tipo_documento (int): ID do tipo de documento
+        db_conn: Conexão ativa com o SQL Server
+        page_size (int): Documentos por página
+        after_id (int): Começa depois deste id (para retomar uma enumeração)
+        until_id (int): Para neste id, inclusive (para enumerar só uma faixa)
+
+    Yields:
+        list: Página com (id_documento, caminho_minio) em ordem crescente de id;
+        caminho_minio é None quando o documento não tem arquivo associado
+    """
+    if page_size < 1:
+        raise ValueError("page_size deve ser maior que zero.")
+
+    query = """
+        WITH pagina AS (
+            SELECT TOP (?) d.Id, d.id_arquivo_renderizado, d.id_arquivo_externo
+            FROM MPES.dbo.documentos d WITH (NOLOCK)
+            WHERE d.id_tipo_documento = ? AND d.ativo = 1 AND d.cancelado = 0 AND d.Id > ?{fim}
+            ORDER BY d.Id
+        )
+        SELECT p.Id, 1 as prioridade, a.path
+        FROM pagina p
+        JOIN MPES.dbo.arquivos a WITH (NOLOCK) ON a.id = p.id_arquivo_renderizado
+        UNION ALL
+        SELECT p.Id, 2 as prioridade, a.path
+        FROM pagina p
+        JOIN MPES.dbo.arquivos a WITH (NOLOCK) ON a.id = p.id_arquivo_externo
+        UNION ALL
+        SELECT p.Id, 3 as prioridade, NULL
+        FROM pagina p
+        ORDER BY 1, 2
+    """.format(fim=" AND d.Id <= ?" if until_id is not None else "")
+    limite = (until_id,) if until_id is not None else ()
+
+    ultimo_id = after_id
+    while True:
+        with metrics.timer('papj_path_lookup_seconds', query='enumeracao'), db_conn.cursor() as cursor:
+            cursor.execute(query, (page_size, tipo_documento, ultimo_id, *limite))
+            rows = cursor.fetchall()
+        if not rows:
+            return
+
+        # Uma linha por arquivo (mais a de prioridade 3, que garante o documento
+        # na página): fica o primeiro caminho não vazio de cada id
+        pagina = {}
+        for id_documento, _, path in rows:
+            if not pagina.get(id_documento):
+                pagina[id_documento] = path or None
+        metrics.inc('papj_path_lookup_documents_total', len(pagina), query='enumeracao')
+        yield list(pagina.items())
+
+        if len(pagina) < page_size:
+            return
+        ultimo_id = rows[-1][0]
+
+
+def get_document_id_range(tipo_documento: int, db_conn) -> Optional[Tuple[int, int]]:
+    """
+    Menor e maior id dos documentos ativos de um tipo (para dividir em faixas)
+
+    Args:
+        tipo_documento (int): ID do tipo de documento
+        db_conn: Conexão ativa com o SQL Server
+
+    Returns:
+        tuple: (menor_id, maior_id), ou None se não houver documentos
+    """
+    query = """
+        SELECT MIN(d.Id), MAX(d.Id)
         FROM MPES.dbo.documentos d WITH (NOLOCK)
-        LEFT JOIN MPES.dbo.arquivos a WITH (NOLOCK) ON a.id = d.id_arquivo_externo
-        WHERE d.Id = ?
+        WHERE d.id_tipo_documento = ? AND d.ativo = 1 AND d.cancelado = 0
     """
-    
     with db_conn.cursor() as cursor:
-        # Tenta buscar o caminho do arquivo renderizado primeiro
-        cursor.execute(query_renderizado, (id_documento_mni,))
+        cursor.execute(query, (tipo_documento,))
         row = cursor.fetchone()
-        
-        # Se não encontrou ou o path é NULL, tenta buscar o caminho do arquivo original
-        if not row or not row[0]:
-            cursor.execute(query_original, (id_documento_mni,))
-            row = cursor.fetchone()
-        
-        # Retorna o path se encontrou, ou None se não encontrou em nenhuma das queries
-        return row[0] if row and row[0] else None
-    
+    if not row or row[0] is None:
+        return None
+    return int(row[0]), int(row[1])
+
 
 # if __name__ == "__main__":
 #     try:
@@ -121,43 +336,95 @@ def get_minio_file_path(id_documento_mni: str, db_conn) -> str:
 #         raise  # Re-lança a exceção para ver o stack trace completo
 
 
-import os
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
-from urllib.parse import urlparse
-import logging
-from dotenv import load_dotenv
+# Leitura em memória (open_document / iter_document_chunks)
+STREAM_CHUNK_SIZE = 1024 * 1024
+SPOOL_THRESHOLD = 32 * 1024 * 1024  # acima disso o conteúdo vai para um arquivo temporário
+RANGED_PART_SIZE = 8 * 1024 * 1024
+RANGED_WORKERS = 4  # partes baixadas simultaneamente em open_document
 
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
 
-# Configuração do logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+class ObjectNotFoundError(FileNotFoundError):
+    """O objeto não existe no bucket, nem pela chave esperada nem pelo uuid"""
+
+
+@dataclass
+class DownloadResult:
+    """
+    Resultado do download de um documento em download_multiple_documents
+    """
+    id: Any
+    path: str
+    local_path: Optional[str] = None
+    bytes: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.local_path is not None
+
 
 class MinIODownloader:
-    def __init__(self, endpoint_url, access_key, secret_key):
+    def __init__(self, endpoint_url, access_key, secret_key, max_workers=1, key_index=None, cache=None,
+                 checkpoints=None, throttle=None, range_workers=RANGED_WORKERS):
         """
         Inicializa o cliente MinIO
         
         Args:
-            endpoint_url (str): URL do servidor MinIO
+            endpoint_url (str): Servidor MinIO (host:porta, acessado por https, ou URL com esquema)
             access_key (str): Chave de acesso
             secret_key (str): Chave secreta
+            max_workers (int): Downloads simultâneos em download_multiple_documents
+            key_index (ObjectKeyIndex): Índice local de chaves (opcional), consultado
+                quando o objeto não é encontrado pela chave esperada
+            cache (DownloadCache): Cache local de downloads (opcional); objetos já
+                em cache são revalidados por ETag em vez de baixados de novo
+            checkpoints (CheckpointStore): Registro de etapas (opcional); documentos
+                já baixados em execuções anteriores (e ainda no disco) são pulados
+            throttle (MinIOThrottle): Controle de concorrência, novas tentativas e
+                circuit breaker das chamadas (padrão: um com teto de max_workers x
+                range_workers, começando no teto)
+            range_workers (int): Partes baixadas simultaneamente por documento em
+                open_document
         """
         self.endpoint_url = endpoint_url
         self.access_key = access_key
         self.secret_key = secret_key
+        self.max_workers = max(1, max_workers)
+        self.range_workers = max(1, range_workers)
+        self.key_index = key_index
+        self.cache = cache
+        self.checkpoints = checkpoints
+        # Cada download pode ter range_workers partes em andamento: com um teto de
+        # max_workers, as partes de um mesmo documento iriam uma de cada vez
+        chamadas = self.max_workers * self.range_workers
+        self.throttle = throttle or MinIOThrottle(max_concurrency=chamadas, initial_concurrency=chamadas)
         
-        # Configurar cliente S3 para MinIO
+        import boto3
+        from botocore.config import Config
+
+        # Configurar cliente S3 para MinIO. O cliente é compartilhado entre as
+        # threads, então o pool de conexões acompanha o número de chamadas simultâneas
+        # (o padrão do botocore é 10). As novas tentativas ficam com o throttle,
+        # que também ajusta a concorrência, então o botocore tenta uma vez só.
         self.s3_client = boto3.client(
             's3',
-            endpoint_url=f'https://{endpoint_url}',
+            endpoint_url=endpoint_url if '://' in endpoint_url else f'https://{endpoint_url}',
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
-            region_name='us-east-1'  # MinIO geralmente usa esta região
+            region_name='us-east-1',  # MinIO geralmente usa esta região
+            config=Config(
+                max_pool_connections=max(10, chamadas),
+                retries={'mode': 'standard', 'total_max_attempts': 1}
+            )
         )
     
+    def _call(self, bucket_name, operation, **kwargs):
+        # Chamada ao s3_client passando pelo throttle (ver minio_throttle.py); o
+        # tempo inclui as esperas por vaga e as novas tentativas
+        with metrics.timer('papj_minio_request_seconds', operation=operation):
+            return self.throttle.call(bucket_name, operation, getattr(self.s3_client, operation), **kwargs)
+    
     def parse_path(self, path):
         """
         Analisa o path da tabela e extrai informações do bucket e arquivo
@@ -224,94 +491,300 @@ class MinIODownloader:
         Returns:
             str: Caminho completo do arquivo baixado
         """
+        from botocore.exceptions import ClientError
+
         try:
-            # Analisar o path
-            bucket_name, object_key = self.parse_path(path)
-            uuid = path.split('|')[0]
-            
-            # Criar diretório se não existir
-            os.makedirs(local_directory, exist_ok=True)
-            
-            # Definir nome do arquivo
-            if not filename:
-                filename = object_key
-            
-            local_path = os.path.join(local_directory, filename)
-            
-            # Verificar se o objeto existe
-            try:
-                self.s3_client.head_object(Bucket=bucket_name, Key=object_key)
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    # Tentar encontrar o objeto no bucket
-                    found_object = self.find_object_in_bucket(bucket_name, uuid)
-                    if found_object:
-                        object_key = found_object
-                        # Atualizar o nome do arquivo local
-                        if not filename or filename == f"{uuid}.pdf":
-                            filename = found_object
-                            local_path = os.path.join(local_directory, filename)
-                        logger.info(f"Objeto encontrado: {bucket_name}/{object_key}")
-                    else:
-                        logger.error(f"Objeto não encontrado no bucket {bucket_name} para UUID: {uuid}")
-                        return None
-                else:
-                    raise
-            
-            # Baixar o arquivo
-            logger.info(f"Baixando {bucket_name}/{object_key} -> {local_path}")
-            self.s3_client.download_file(bucket_name, object_key, local_path)
-            
-            logger.info(f"Download concluído: {local_path}")
-            return local_path
-            
+            return self._download_document(path, local_directory, filename)
+        except ObjectNotFoundError:
+            # Já registrado em _download_document
+            return None
         except ClientError as e:
             logger.error(f"Erro ao baixar arquivo: {e}")
             return None
         except Exception as e:
             logger.error(f"Erro inesperado: {e}")
             return None
+
+    def _download_document(self, path, local_directory, filename=None):
+        # Mesma lógica de download_document, mas propagando os erros para
+        # que download_multiple_documents possa registrá-los por documento
+        from botocore.exceptions import ClientError
+
+        bucket_name, object_key = self.parse_path(path)
+        uuid = path.split('|')[0]
+        
+        # Criar diretório se não existir
+        os.makedirs(local_directory, exist_ok=True)
+        
+        # Definir nome do arquivo
+        if not filename:
+            filename = object_key
+        
+        local_path = os.path.join(local_directory, filename)
+        
+        # Verificar se o objeto existe (revalidando a cópia em cache, se houver)
+        try:
+            head, cached = self._head_object(bucket_name, object_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] == '404':
+                # Tentar encontrar o objeto no bucket
+                found_object = self.find_object_in_bucket(bucket_name, uuid)
+                if found_object:
+                    object_key = found_object
+                    # Atualizar o nome do arquivo local
+                    if not filename or filename == f"{uuid}.pdf":
+                        filename = found_object
+                        local_path = os.path.join(local_directory, filename)
+                    logger.info(f"Objeto encontrado: {bucket_name}/{object_key}")
+                    head, cached = self._head_object(bucket_name, object_key) if self.cache is not None else (None, None)
+                else:
+                    logger.error(f"Objeto não encontrado no bucket {bucket_name} para UUID: {uuid}")
+                    raise ObjectNotFoundError(f"Objeto não encontrado no bucket {bucket_name} para UUID: {uuid}")
+            else:
+                raise
+        
+        if cached is not None:
+            logger.info(f"Cache válido para {bucket_name}/{object_key} -> {local_path}")
+            try:
+                return self.cache.materialize(cached, local_path)
+            except FileNotFoundError:
+                # Removido do cache (evict) entre a validação e o link: baixa de novo
+                logger.info(f"Cópia em cache removida, baixando de novo: {bucket_name}/{object_key}")
+                head = {'ETag': cached.etag}
+        
+        if self.cache is not None:
+            # Baixa para o cache e disponibiliza em local_path sem nova cópia
+            temp_path = self.cache.temp_path(bucket_name, object_key)
+            logger.info(f"Baixando {bucket_name}/{object_key} -> cache")
+            try:
+                self._call(bucket_name, 'download_file', Bucket=bucket_name, Key=object_key, Filename=temp_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self.cache.store(bucket_name, object_key, head['ETag'], temp_path, local_path)
+            logger.info(f"Download concluído: {local_path}")
+            return local_path
+        
+        # Baixar o arquivo
+        logger.info(f"Baixando {bucket_name}/{object_key} -> {local_path}")
+        self._call(bucket_name, 'download_file', Bucket=bucket_name, Key=object_key, Filename=local_path)
+        
+        logger.info(f"Download concluído: {local_path}")
+        return local_path
+
+    def _head_object(self, bucket_name, object_key):
+        """
+        head_object condicional: se o objeto está no cache, envia If-None-Match com o
+        ETag guardado e, em caso de 304, devolve a entrada do cache.
+        
+        Returns:
+            tuple: (resposta do head_object ou None, CacheEntry válida ou None)
+        """
+        from botocore.exceptions import ClientError
+
+        cached = self.cache.get(bucket_name, object_key) if self.cache is not None else None
+        if cached is None:
+            return self._call(bucket_name, 'head_object', Bucket=bucket_name, Key=object_key), None
+        try:
+            head = self._call(bucket_name, 'head_object', Bucket=bucket_name, Key=object_key, IfNoneMatch=cached.etag)
+            return head, None
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('304', 'NotModified'):
+                return None, cached
+            raise
     
-    def download_multiple_documents(self, documents_data, local_directory="downloads"):
+    def download_multiple_documents(self, documents_data, local_directory="downloads", max_workers=None):
         """
-        Baixa múltiplos documentos
+        Baixa múltiplos documentos, em paralelo quando max_workers > 1
         
         Args:
             documents_data (list): Lista de dicionários com dados dos documentos
             local_directory (str): Diretório local para salvar
+            max_workers (int): Downloads simultâneos (padrão: o valor do construtor)
             
         Returns:
-            list: Lista de caminhos dos arquivos baixados com sucesso
+            list: Lista de DownloadResult, na mesma ordem de documents_data
         """
-        downloaded_files = []
+        max_workers = max_workers or self.max_workers
         
-        for doc in documents_data:
+        # Documentos concluídos em execuções anteriores: chave -> caminho local
+        concluidos, pulados = {}, []
+        if self.checkpoints is not None:
+            documents_data = list(documents_data)
+            concluidos = self.checkpoints.done('downloaded', (doc.get('id', 'unknown') for doc in documents_data))
+        
+        def baixar(doc):
+            local_path = concluidos.get(str(doc.get('id', 'unknown')))
+            if local_path and os.path.exists(local_path):
+                pulados.append(local_path)
+                metrics.inc('papj_downloads_total', status='pulado')
+                return DownloadResult(
+                    id=doc.get('id', 'unknown'), path=doc.get('path'),
+                    local_path=local_path, bytes=os.path.getsize(local_path)
+                )
+            result = self._download_result(doc, local_directory)
+            if self.checkpoints is not None:
+                if result.ok:
+                    self.checkpoints.mark_done('downloaded', result.id, result.local_path)
+                else:
+                    self.checkpoints.mark_failed('downloaded', result.id, result.error)
+            return result
+        
+        if max_workers <= 1:
+            results = [baixar(doc) for doc in documents_data]
+        else:
+            # executor.map preserva a ordem de entrada
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='minio') as executor:
+                results = list(executor.map(baixar, documents_data))
+        
+        falhas = sum(1 for result in results if not result.ok)
+        logger.info(
+            f"Downloads concluídos: {len(results) - falhas} ok, {falhas} com falha"
+            + (f" ({len(pulados)} já baixados anteriormente)" if pulados else "")
+        )
+        logger.info(f"Controle de concorrência MinIO: {self.throttle.snapshot()}")
+        return results
+
+    def _download_result(self, doc, local_directory):
+        inicio = time.perf_counter()
+        result = DownloadResult(id=doc.get('id', 'unknown'), path=doc.get('path'))
+        try:
+            path = doc['path']
+            
+            # Criar nome de arquivo com ID
+            parts = path.split('|')
+            if len(parts) >= 4:
+                extension = parts[3]
+                filename = f"{result.id}_{parts[0]}{extension}"
+            else:
+                filename = f"{result.id}_{parts[0]}"
+            
+            result.local_path = self._download_document(path, local_directory, filename)
+            result.bytes = os.path.getsize(result.local_path)
+        except Exception as e:
+            logger.error(f"Erro ao processar documento {doc}: {e}")
+            result.local_path = None
+            result.error = str(e)
+        result.duration = time.perf_counter() - inicio
+        status = 'ok' if result.ok else 'erro'
+        metrics.inc('papj_downloads_total', status=status)
+        metrics.observe('papj_download_seconds', result.duration, status=status)
+        if result.ok:
+            metrics.inc('papj_download_bytes_total', result.bytes)
+            metrics.observe('papj_download_size_bytes', result.bytes)
+        return result
+    
+    def open_document(self, path, spool_threshold=SPOOL_THRESHOLD, part_size=RANGED_PART_SIZE,
+                      max_workers=None, spool_dir=None):
+        """
+        Abre um documento do MinIO sem gravá-lo em local_directory
+        
+        O conteúdo fica em memória e só é despejado em disco (SpooledTemporaryFile)
+        quando passa de spool_threshold. Objetos maiores que part_size são baixados
+        em partes (Range) em paralelo.
+        
+        Args:
+            path (str): Path do documento na tabela
+            spool_threshold (int): Tamanho máximo mantido em memória
+            part_size (int): Tamanho de cada parte no download em partes
+            max_workers (int): Partes baixadas simultaneamente (padrão: range_workers)
+            spool_dir (str): Diretório para o arquivo temporário (opcional)
+            
+        Returns:
+            SpooledTemporaryFile: Arquivo posicionado no início, ou None se falhar
+        """
+        max_workers = max_workers or self.range_workers
+        try:
+            bucket_name, object_key, head = self._locate_object(path)
+            size = head['ContentLength']
+            buffer = tempfile.SpooledTemporaryFile(max_size=spool_threshold, dir=spool_dir)
             try:
-                path = doc['path']
-                doc_id = doc.get('id', 'unknown')
-                
-                # Criar nome de arquivo com ID
-                parts = path.split('|')
-                if len(parts) >= 4:
-                    extension = parts[3]
-                    filename = f"{doc_id}_{parts[0]}{extension}"
+                if size <= part_size or max_workers <= 1:
+                    for chunk in self._iter_object_chunks(bucket_name, object_key):
+                        buffer.write(chunk)
                 else:
-                    filename = f"{doc_id}_{parts[0]}"
-                
-                local_path = self.download_document(path, local_directory, filename)
-                if local_path:
-                    downloaded_files.append(local_path)
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar documento {doc}: {e}")
-                continue
-        
-        return downloaded_files
+                    self._fetch_ranges(bucket_name, object_key, size, part_size, max_workers, buffer)
+            except Exception:
+                buffer.close()
+                raise
+            buffer.seek(0)
+            logger.info(f"Documento aberto em memória: {bucket_name}/{object_key} ({size} bytes)")
+            return buffer
+        except ObjectNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao abrir documento {path}: {e}")
+            return None
+    
+    def iter_document_chunks(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Lê um documento do MinIO em blocos, direto do get_object
+        
+        Diferente de download_document, erros são propagados, já que podem
+        ocorrer no meio da leitura.
+        
+        Args:
+            path (str): Path do documento na tabela
+            chunk_size (int): Tamanho de cada bloco
+            
+        Yields:
+            bytes: Blocos do conteúdo do documento
+        """
+        bucket_name, object_key, _ = self._locate_object(path)
+        yield from self._iter_object_chunks(bucket_name, object_key, chunk_size)
+    
+    def _locate_object(self, path):
+        # head_object com o mesmo fallback de download_document para 404
+        from botocore.exceptions import ClientError
+
+        bucket_name, object_key = self.parse_path(path)
+        uuid = path.split('|')[0]
+        try:
+            head = self._call(bucket_name, 'head_object', Bucket=bucket_name, Key=object_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] != '404':
+                raise
+            found_object = self.find_object_in_bucket(bucket_name, uuid)
+            if not found_object:
+                logger.error(f"Objeto não encontrado no bucket {bucket_name} para UUID: {uuid}")
+                raise ObjectNotFoundError(f"Objeto não encontrado no bucket {bucket_name} para UUID: {uuid}")
+            object_key = found_object
+            head = self._call(bucket_name, 'head_object', Bucket=bucket_name, Key=object_key)
+        return bucket_name, object_key, head
+    
+    def _iter_object_chunks(self, bucket_name, object_key, chunk_size=STREAM_CHUNK_SIZE):
+        response = self._call(bucket_name, 'get_object', Bucket=bucket_name, Key=object_key)
+        body = response['Body']
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+    
+    def _fetch_ranges(self, bucket_name, object_key, size, part_size, max_workers, buffer):
+        # Baixa as partes em paralelo, em janelas de max_workers, e grava na ordem:
+        # no máximo max_workers partes ficam em memória ao mesmo tempo
+        def fetch(start):
+            end = min(start + part_size, size) - 1
+            response = self._call(
+                bucket_name, 'get_object', Bucket=bucket_name, Key=object_key, Range=f"bytes={start}-{end}"
+            )
+            return response['Body'].read()
+        
+        starts = list(range(0, size, part_size))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='minio-part') as executor:
+            for i in range(0, len(starts), max_workers):
+                for part in executor.map(fetch, starts[i:i + max_workers]):
+                    buffer.write(part)
     
     def find_object_in_bucket(self, bucket_name, uuid):
         """
         Procura um objeto no bucket pelo UUID, testando diferentes variações
         
+        Consulta primeiro o índice local (se configurado) e, se o uuid não estiver
+        indexado, lista apenas as chaves com prefixo igual ao uuid, registrando o
+        resultado no índice.
+        
         Args:
             bucket_name (str): Nome do bucket
             uuid (str): UUID do documento
@@ -319,39 +792,43 @@ class MinIODownloader:
         Returns:
             str: Nome do objeto encontrado ou None
         """
+        with metrics.timer('papj_object_fallback_seconds'):
+            found, origem = self._find_object_in_bucket(bucket_name, uuid)
+        metrics.inc('papj_object_fallback_total', origem=origem)
+        return found
+
+    def _find_object_in_bucket(self, bucket_name, uuid):
+        # Devolve (chave ou None, origem): 'indice', 'listagem', 'nao_encontrado' ou 'erro'
         try:
-            # Listar todos os objetos do bucket
-            response = self.s3_client.list_objects_v2(Bucket=bucket_name)
-            
-            if 'Contents' not in response:
-                return None
+            if self.key_index is not None:
+                found = self.key_index.lookup(bucket_name, uuid)
+                if found:
+                    return found, 'indice'
             
-            objects = [obj['Key'] for obj in response['Contents']]
+            # Listar apenas os objetos com o uuid como prefixo (paginado)
+            objects = []
+            kwargs = {'Bucket': bucket_name, 'Prefix': uuid}
+            while True:
+                page = self._call(bucket_name, 'list_objects_v2', **kwargs)
+                objects.extend(page.get('Contents', []))
+                if not page.get('IsTruncated'):
+                    break
+                kwargs['ContinuationToken'] = page['NextContinuationToken']
             
-            # Procurar por diferentes variações
-            candidates = [
-                uuid,                    # UUID simples
-                f"{uuid}.pdf",          # UUID com .pdf
-                f"{uuid}.PDF",          # UUID com .PDF
-                f"{uuid}.doc",          # UUID com .doc
-                f"{uuid}.docx",         # UUID com .docx
-            ]
+            if not objects:
+                return None, 'nao_encontrado'
             
-            for candidate in candidates:
-                if candidate in objects:
-                    return candidate
+            if self.key_index is not None:
+                self.key_index.add(bucket_name, objects)
             
-            # Se não encontrou exato, procurar por substring
-            for obj in objects:
-                if uuid in obj:
-                    logger.info(f"Encontrado objeto similar: {obj}")
-                    return obj
-            
-            return None
+            found = choose_key(uuid, (obj['Key'] for obj in objects))
+            if found:
+                logger.info(f"Encontrado objeto similar: {found}")
+            return found, 'listagem' if found else 'nao_encontrado'
             
         except Exception as e:
             logger.error(f"Erro ao procurar objeto no bucket {bucket_name}: {e}")
-            return None
+            return None, 'erro'
 
     def list_buckets(self):
         """
@@ -379,7 +856,9 @@ class MinIODownloader:
             list: Lista de objetos
         """
         try:
-            response = self.s3_client.list_objects_v2(
+            response = self._call(
+                bucket_name,
+                'list_objects_v2',
                 Bucket=bucket_name,
                 Prefix=prefix
             )
@@ -413,7 +892,7 @@ def baixar_documento_minio(endpoint, access_key, secret_key, document_path, loca
 
 def save_file_from_minio(
     file_id: str, 
-    db_conn: pyodbc.Connection,
+    db_conn: "pyodbc.Connection",
     local_directory="downloads"
 ) -> Optional[Path]:
     """
@@ -427,19 +906,25 @@ def save_file_from_minio(
     Retorna:
         Optional[Path]: Caminho local do arquivo baixado, ou None em caso de erro.
     """
+    AppConfig.ensure_valid()
     endpoint = AppConfig.MINIO_ENDPOINT
     access_key = AppConfig.MINIO_ACCESS_KEY
     secret_key = AppConfig.MINIO_SECRET_KEY
 
     try:
-        document_path = get_minio_file_path(file_id, db_conn)
+        document_path = get_minio_file_paths([file_id], db_conn).get(file_id)
         logger.info(f"Caminho MinIO para o documento {file_id}: {document_path}")
     except Exception as e:
         logger.error(f"Erro ao recuperar caminho do MinIO para o documento {file_id}: {e}")
         return None
 
     try:
-        downloader = MinIODownloader(endpoint, access_key, secret_key)
+        key_index = ObjectKeyIndex(AppConfig.MINIO_INDEX_PATH) if AppConfig.MINIO_INDEX_PATH else None
+        cache = (
+            DownloadCache(AppConfig.DOWNLOAD_CACHE_DIR, AppConfig.DOWNLOAD_CACHE_MAX_BYTES)
+            if AppConfig.DOWNLOAD_CACHE_DIR else None
+        )
+        downloader = MinIODownloader(endpoint, access_key, secret_key, key_index=key_index, cache=cache)
         result = downloader.download_document(document_path, local_directory)
         if result:
             logger.info(f"Documento {file_id} baixado com sucesso: {result}")
@@ -0,0 +1,230 @@
+"""
+Índice local (SQLite) de uuid -> chave de objeto por bucket do MinIO.
+
+Usado por MinIODownloader.find_object_in_bucket quando o head_object retorna 404,
+no lugar de listar o bucket inteiro a cada documento não encontrado.
+
+Uso pela linha de comando:
+    python minio_index.py rebuild [--bucket gampes-documento-externo ...]
+    python minio_index.py refresh [--bucket ...]
+    python minio_index.py lookup gampes-documento-externo <uuid>
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.getenv('MINIO_INDEX_PATH', 'minio_index.sqlite3')
+
+# Mesma ordem de preferência usada historicamente em find_object_in_bucket
+EXTENSION_PREFERENCE = ['', '.pdf', '.PDF', '.doc', '.docx']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objetos (
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    PRIMARY KEY (bucket, object_key)
+);
+CREATE INDEX IF NOT EXISTS ix_objetos_uuid ON objetos (bucket, uuid);
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket TEXT PRIMARY KEY,
+    cursor TEXT,
+    atualizado_em TEXT
+);
+"""
+
+
+def uuid_from_key(object_key: str) -> str:
+    """
+    Extrai o uuid de uma chave de objeto (nome do arquivo sem a extensão)
+    """
+    nome = object_key.rsplit('/', 1)[-1]
+    return nome.split('.', 1)[0]
+
+
+def choose_key(uuid: str, keys: Iterable[str]) -> Optional[str]:
+    """
+    Escolhe, entre as chaves candidatas para um uuid, a de maior preferência:
+    primeiro as variações exatas (uuid, .pdf, .PDF, .doc, .docx) e depois qualquer
+    chave que contenha o uuid.
+    """
+    keys = list(keys)
+    for extension in EXTENSION_PREFERENCE:
+        if f"{uuid}{extension}" in keys:
+            return f"{uuid}{extension}"
+    for key in sorted(keys):
+        if uuid in key:
+            return key
+    return None
+
+
+class ObjectKeyIndex:
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        """
+        Abre (ou cria) o índice local
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite
+        """
+        self.db_path = str(db_path)
+        # A mesma conexão é usada pelas threads de download
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def lookup(self, bucket_name: str, uuid: str) -> Optional[str]:
+        """
+        Procura a chave do objeto de um uuid no índice
+
+        Returns:
+            str: Chave do objeto ou None se o uuid não estiver indexado
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT object_key FROM objetos WHERE bucket = ? AND uuid = ?",
+                (bucket_name, uuid)
+            ).fetchall()
+        return choose_key(uuid, (row[0] for row in rows))
+
+    def add(self, bucket_name: str, objects: Iterable[dict]):
+        """
+        Insere ou atualiza objetos no formato retornado por list_objects_v2
+        """
+        registros = [
+            (bucket_name, obj['Key'], uuid_from_key(obj['Key']), obj.get('Size'), obj.get('ETag'))
+            for obj in objects
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO objetos (bucket, object_key, uuid, size, etag) VALUES (?, ?, ?, ?, ?)",
+                registros
+            )
+
+    def count(self, bucket_name: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM objetos WHERE bucket = ?", (bucket_name,)
+            ).fetchone()[0]
+
+    def refresh(self, s3_client, bucket_name: str, page_size: int = 1000) -> int:
+        """
+        Atualiza o índice de um bucket com uma listagem paginada.
+
+        A listagem começa depois da última chave já indexada (StartAfter), e o
+        progresso é salvo a cada página: uma listagem interrompida continua de onde
+        parou, e uma atualização depois de uma listagem completa lista só as chaves
+        novas em ordem lexicográfica, em vez do bucket inteiro. Chaves apagadas, e
+        chaves novas anteriores à última indexada, ficam para o rebuild; até lá, um
+        uuid fora do índice é procurado pelo prefixo em find_object_in_bucket.
+
+        Args:
+            s3_client: Cliente boto3 S3
+            bucket_name (str): Nome do bucket
+            page_size (int): Chaves por página do list_objects_v2
+
+        Returns:
+            int: Quantidade de objetos gravados nesta chamada
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cursor FROM buckets WHERE bucket = ?", (bucket_name,)
+            ).fetchone()
+        start_after = row[0] if row and row[0] else None
+        if start_after:
+            logger.info(f"Listando {bucket_name} após {start_after}")
+
+        params = {'Bucket': bucket_name, 'PaginationConfig': {'PageSize': page_size}}
+        if start_after:
+            params['StartAfter'] = start_after
+
+        total = 0
+        ultima = start_after
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            contents = page.get('Contents', [])
+            if not contents:
+                continue
+            self.add(bucket_name, contents)
+            total += len(contents)
+            ultima = contents[-1]['Key']
+            self._set_cursor(bucket_name, ultima)
+            logger.debug(f"{bucket_name}: {total} objetos indexados")
+
+        # O cursor fica na última chave: a próxima atualização continua dela
+        self._set_cursor(bucket_name, ultima, atualizado_em=datetime.now().isoformat(timespec='seconds'))
+        logger.info(f"Índice de {bucket_name} atualizado: {total} objetos listados")
+        return total
+
+    def rebuild(self, s3_client, bucket_name: str, page_size: int = 1000) -> int:
+        """
+        Descarta o índice do bucket e o reconstrói do zero (remove chaves apagadas)
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM objetos WHERE bucket = ?", (bucket_name,))
+            self._conn.execute("DELETE FROM buckets WHERE bucket = ?", (bucket_name,))
+        return self.refresh(s3_client, bucket_name, page_size)
+
+    def _set_cursor(self, bucket_name, cursor, atualizado_em=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO buckets (bucket, cursor, atualizado_em) VALUES (?, ?, ?)
+                ON CONFLICT(bucket) DO UPDATE SET
+                    cursor = excluded.cursor,
+                    atualizado_em = COALESCE(excluded.atualizado_em, buckets.atualizado_em)
+                """,
+                (bucket_name, cursor, atualizado_em)
+            )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Índice local de objetos do MinIO")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="Arquivo SQLite do índice")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    for comando, ajuda in (('rebuild', "Reconstrói o índice do zero"),
+                           ('refresh', "Acrescenta as chaves depois da última indexada")):
+        p = sub.add_parser(comando, help=ajuda)
+        p.add_argument('--bucket', action='append', help="Bucket a indexar (padrão: todos)")
+    p = sub.add_parser('lookup', help="Consulta a chave de um uuid")
+    p.add_argument('bucket')
+    p.add_argument('uuid')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    index = ObjectKeyIndex(args.index)
+    try:
+        if args.comando == 'lookup':
+            print(index.lookup(args.bucket, args.uuid) or '')
+            return
+
+        # Import tardio: a consulta ao índice não precisa do boto3
+        from minio_extraction import AppConfig, MinIODownloader
+        downloader = MinIODownloader(
+            AppConfig.MINIO_ENDPOINT,
+            AppConfig.MINIO_ACCESS_KEY,
+            AppConfig.MINIO_SECRET_KEY
+        )
+        for bucket_name in args.bucket or downloader.list_buckets():
+            if args.comando == 'rebuild':
+                index.rebuild(downloader.s3_client, bucket_name)
+            else:
+                index.refresh(downloader.s3_client, bucket_name)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
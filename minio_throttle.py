@@ -0,0 +1,317 @@
+"""
+Controle adaptativo de concorrência e novas tentativas para as chamadas ao MinIO.
+
+Todas as chamadas do MinIODownloader (head_object, download_file, get_object,
+list_objects_v2) passam por MinIOThrottle.call:
+
+- Concorrência AIMD: o limite de chamadas simultâneas cresce aos poucos enquanto
+  as respostas vêm rápidas e sem erro, e cai pela metade quando o servidor pede
+  para desacelerar (503 SlowDown, 429...) ou a latência dos metadados dispara.
+  Threads acima do limite esperam a vez em vez de bater no servidor.
+- Novas tentativas com espera exponencial e jitter para erros transitórios
+  (throttling, 5xx, conexão).
+- Circuit breaker por bucket: depois de várias falhas seguidas, as chamadas ao
+  bucket falham na hora (CircuitOpenError) por um tempo, e só uma chamada de
+  teste passa quando ele reabre.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Códigos que indicam que o servidor está sobrecarregado: reduzem a concorrência
+THROTTLE_CODES = {'SlowDown', '503', 'ServiceUnavailable', '429', 'TooManyRequests',
+                  'Throttling', 'ThrottlingException', 'RequestLimitExceeded'}
+# Outros erros transitórios: só nova tentativa
+TRANSIENT_CODES = {'500', 'InternalError', '502', 'BadGateway', '504', 'GatewayTimeout', 'RequestTimeout'}
+
+# Operações de metadados: a latência delas é um sinal de carga (a de downloads
+# depende do tamanho do objeto)
+LATENCY_OPERATIONS = {'head_object', 'list_objects_v2'}
+
+# Fração da distância até a média atual que a referência de latência sobe a cada
+# chamada: uma latência maior e estável vira a nova referência depois de algumas
+# dezenas de chamadas, em vez de contar como sobrecarga para sempre
+BASELINE_DECAY = 0.01
+
+
+class CircuitOpenError(Exception):
+    """O bucket teve falhas seguidas demais e está temporariamente bloqueado"""
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=4, minimum=1, maximum=32, decrease_factor=0.5,
+                 latency_factor=3.0, baseline_decay=BASELINE_DECAY):
+        """
+        Limite de concorrência AIMD (aumento aditivo, redução multiplicativa)
+
+        Uma rajada de erros reduz o limite uma vez só: sinais de chamadas que
+        começaram antes da última redução são ignorados (elas foram feitas com o
+        limite antigo).
+
+        Args:
+            initial (int): Limite inicial de chamadas simultâneas
+            minimum (int): Limite mínimo
+            maximum (int): Limite máximo
+            decrease_factor (float): Multiplicador aplicado ao limite em caso de throttling
+            latency_factor (float): Latência média acima de latency_factor x a
+                referência da operação conta como sinal de sobrecarga
+            baseline_decay (float): Quanto a referência (a menor média observada)
+                se aproxima da média atual a cada chamada
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.baseline_decay = baseline_decay
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        # Operação -> [média móvel, referência]: cada operação tem a sua latência típica
+        self._latency: Dict[str, list] = {}
+
+    def acquire(self) -> float:
+        """
+        Espera uma vaga
+
+        Returns:
+            float: Momento (time.monotonic) em que a chamada começou, para o release
+        """
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started, throttled=False, latency=None, ok=True, operation=None):
+        """
+        Libera a vaga e ajusta o limite conforme o resultado da chamada
+
+        Args:
+            started (float): Valor devolvido por acquire()
+            throttled (bool): O servidor pediu para desacelerar
+            latency (float): Latência da chamada, se for um sinal de carga
+            operation (str): Operação da chamada (as latências são comparadas por operação)
+            ok (bool): A chamada teve resposta do servidor (falhas de conexão não
+                mexem no limite)
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled or self._latency_high(operation, latency):
+                if started >= self._last_decrease:
+                    self._last_decrease = time.monotonic()
+                    anterior = self.limit
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    logger.info(f"Concorrência MinIO reduzida: {anterior:.1f} -> {self.limit:.1f}")
+            elif ok:
+                # +1 a cada "janela" cheia de sucessos
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _latency_high(self, operation, latency):
+        if latency is None:
+            return False
+        estado = self._latency.get(operation)
+        if estado is None:
+            self._latency[operation] = [latency, latency]
+            return False
+        ewma = estado[0] = 0.8 * estado[0] + 0.2 * latency
+        if ewma < estado[1]:
+            estado[1] = ewma
+        else:
+            estado[1] += self.baseline_decay * (ewma - estado[1])
+        return ewma > self.latency_factor * estado[1]
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            failure_threshold (int): Falhas seguidas que abrem o circuito
+            reset_timeout (float): Segundos com o circuito aberto antes da chamada de teste
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self) -> bool:
+        """
+        Returns:
+            bool: True se esta é a chamada de teste do circuito meio aberto
+
+        Raises:
+            CircuitOpenError: O circuito está aberto (ou já há uma chamada de teste)
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return False
+            if state == 'half-open' and not self._trial:
+                self._trial = True  # só uma chamada de teste por vez
+                return True
+            raise CircuitOpenError("circuito aberto")
+
+    def trial_failed(self):
+        # A chamada de teste teve um erro transitório (ou throttling): o circuito
+        # volta a abrir; as novas tentativas dela seguem sem passar pelo circuito
+        with self._lock:
+            self._trial = False
+            self.opened_at = time.monotonic()
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        # Uma chamada esgotou as tentativas (a chamada de teste já reabriu o
+        # circuito em trial_failed)
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class MinIOThrottle:
+    def __init__(self, max_concurrency=32, initial_concurrency=None, max_retries=5,
+                 base_delay=0.2, max_delay=20.0, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            max_concurrency (int): Teto de chamadas simultâneas (somando todos os buckets)
+            initial_concurrency (int): Limite inicial (padrão: metade do teto)
+            max_retries (int): Novas tentativas por chamada para erros transitórios
+            base_delay (float): Espera base, em segundos, antes da primeira nova tentativa
+            max_delay (float): Espera máxima entre tentativas
+            failure_threshold (int): Falhas seguidas que abrem o circuito de um bucket
+            reset_timeout (float): Segundos até o circuito aberto aceitar uma chamada de teste
+        """
+        self.limiter = AdaptiveLimiter(
+            initial=initial_concurrency or max(1, max_concurrency // 2),
+            maximum=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'rejected': 0}
+
+    def breaker(self, bucket_name) -> CircuitBreaker:
+        with self._lock:
+            if bucket_name not in self._breakers:
+                self._breakers[bucket_name] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[bucket_name]
+
+    def call(self, bucket_name, operation, fn, *args, **kwargs):
+        """
+        Executa `fn(*args, **kwargs)` com controle de concorrência, novas tentativas
+        e circuit breaker do bucket
+
+        Args:
+            bucket_name (str): Bucket da chamada (um circuito por bucket)
+            operation (str): Nome da operação (ex.: 'head_object'), para logs e latência
+
+        Raises:
+            CircuitOpenError: O circuito do bucket está aberto
+            ClientError: Erros não transitórios (404, 403, 304...) ou depois de
+                esgotar as tentativas
+        """
+        breaker = self.breaker(bucket_name)
+        tentativa = 0
+        teste = False  # esta chamada é a chamada de teste do circuito
+        teste_falhou = False
+        while True:
+            if not teste:
+                try:
+                    teste = breaker.before_call()
+                except CircuitOpenError:
+                    self._count('rejected')
+                    raise CircuitOpenError(f"Circuito aberto para o bucket {bucket_name} ({operation})")
+
+            inicio = self.limiter.acquire()
+            self._count('calls')
+            try:
+                resultado = fn(*args, **kwargs)
+            except Exception as e:
+                tipo = _classify(e)
+                self.limiter.release(inicio, throttled=tipo == 'throttle', ok=tipo is None)
+                if tipo is None:
+                    # Resposta "normal" do servidor (404, 304...): não é falha do bucket
+                    breaker.success()
+                    raise
+                if tipo == 'throttle':
+                    self._count('throttled')
+                if teste and not teste_falhou:
+                    teste_falhou = True
+                    breaker.trial_failed()
+                # Conta uma falha por chamada, quando as tentativas se esgotam:
+                # as novas tentativas de uma chamada não abrem o circuito dela
+                if tentativa >= self.max_retries:
+                    breaker.failure()
+                    raise
+                espera = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** tentativa))
+                tentativa += 1
+                self._count('retries')
+                logger.warning(
+                    f"{operation} em {bucket_name} falhou ({e}); "
+                    f"tentativa {tentativa}/{self.max_retries} em {espera:.2f}s"
+                )
+                time.sleep(espera)
+                continue
+
+            latencia = time.monotonic() - inicio
+            self.limiter.release(
+                inicio, latency=latencia if operation in LATENCY_OPERATIONS else None, operation=operation
+            )
+            breaker.success()
+            return resultado
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'limit': round(self.limiter.limit, 1),
+                'open_buckets': [b for b, br in self._breakers.items() if br.state != 'closed'],
+            }
+
+
+def _classify(error) -> Optional[str]:
+    # 'throttle', 'transient' ou None (erro definitivo)
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = str(response.get('Error', {}).get('Code', ''))
+        status = str(response.get('ResponseMetadata', {}).get('HTTPStatusCode', ''))
+        if code in THROTTLE_CODES or status in ('503', '429'):
+            return 'throttle'
+        if code in TRANSIENT_CODES or status.startswith('5'):
+            return 'transient'
+        return None
+
+    from botocore.exceptions import ConnectionError as BotocoreConnectionError
+    from botocore.exceptions import HTTPClientError
+
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError, ConnectionError, TimeoutError)):
+        return 'transient'
+    return None
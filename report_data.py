@@ -0,0 +1,90 @@
+"""
+Preparação das linhas da planilha para o preenchimento dos relatórios.
+
+O mapeamento placeholder do modelo -> coluna é declarativo e aplicado coluna a
+coluna (fillna/where do pandas), sem percorrer a planilha linha a linha. Para
+incluir um indicador novo basta acrescentá-lo em INDICATORS.
+"""
+from typing import Dict, Iterator, NamedTuple
+
+import pandas as pd
+
+# Placeholder do modelo -> coluna da planilha
+FIELDS = {
+    'id_documento': 'id_documento',
+    'COD_ACAO': 'COD_ACAO',
+    'Responsavel_': 'Responsavel',
+    'NOME_PJ_CONCATENADO': 'NOME_PJ_CONCATENADO',
+    'proced_SEI': 'proced_SEI',
+    'TEMA_ind': 'TEMA',
+    'DIRETRIZ_CONSOLIDADA': 'DIRETRIZ_CONSOLIDADA',
+    'RESULTADOS_ESPERADOS': 'RESULTADOS_ESPERADOS',
+}
+
+# Colunas dos indicadores, na ordem do modelo. Cada uma preenche
+# 'Indicador N: <coluna>' e, quando tem valor, mantém o texto
+# 'Insira aqui o resultado do indicador N' (vazio caso contrário)
+INDICATORS = [
+    'IND_01',
+    'IND_02',
+    'IND_03',
+    'IND_04',
+    'IND_05',
+    'IND_06',
+    'IND_07',
+    'IND_08',
+]
+
+# Colunas usadas no e-mail (destinatário, assunto e corpo), com os valores originais
+MESSAGE_COLUMNS = ['id_documento', 'COD_ACAO', 'NOME_PJ_CONCATENADO', 'Responsavel', 'E-mail']
+
+
+class ReportRecord(NamedTuple):
+    data: Dict[str, object]  # placeholder -> valor, pronto para o modelo
+    row: Dict[str, object]   # valores originais de MESSAGE_COLUMNS
+
+
+def placeholder_columns() -> Dict[str, object]:
+    """
+    Mapeamento completo placeholder -> coluna, na ordem em que os placeholders
+    eram montados. Os de resultado apontam para (coluna, texto).
+    """
+    colunas = dict(FIELDS)
+    for n, coluna in enumerate(INDICATORS, start=1):
+        colunas[f'Indicador {n}: {coluna}'] = coluna
+    for n, coluna in enumerate(INDICATORS, start=1):
+        texto = f'Insira aqui o resultado do indicador {n}'
+        colunas[texto] = (coluna, texto)
+    return colunas
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Monta um DataFrame com uma coluna por placeholder, valores vazios ou NaN
+    substituídos por ""
+    """
+    preparado = {}
+    for placeholder, origem in placeholder_columns().items():
+        if isinstance(origem, tuple):
+            coluna, texto = origem
+            preparado[placeholder] = pd.Series(texto, index=df.index, dtype=object).where(df[coluna].notna(), "")
+        else:
+            preparado[placeholder] = df[origem].astype(object).where(df[origem].notna(), "")
+    return pd.DataFrame(preparado, index=df.index)
+
+
+def iter_records(df: pd.DataFrame) -> Iterator[ReportRecord]:
+    """
+    Percorre a planilha devolvendo, por linha, os dados do modelo e os campos do e-mail
+
+    Yields:
+        ReportRecord: Na ordem das linhas de `df`
+    """
+    preparado = prepare_frame(df)
+    placeholders = list(preparado.columns)
+    mensagem = df.reindex(columns=MESSAGE_COLUMNS)
+    for valores, campos in zip(
+        zip(*(preparado[c].tolist() for c in placeholders)),
+        zip(*(mensagem[c].tolist() for c in MESSAGE_COLUMNS)),
+    ):
+        yield ReportRecord(dict(zip(placeholders, valores)), dict(zip(MESSAGE_COLUMNS, campos)))
@@ -0,0 +1,309 @@
+"""
+Geração e envio dos relatórios em pipeline.
+
+Os relatórios são renderizados em um pool de processos (CPU) enquanto threads
+enviam os já prontos pelo Mailer (rede), então as duas etapas se sobrepõem. Uma
+fila limitada entre as etapas segura a renderização quando o SMTP fica para
+trás, e o número de renderizações em andamento também é limitado: a memória não
+cresce com o tamanho da campanha.
+
+O .docx é gerado em memória e anexado direto à mensagem. Gravar uma cópia em
+disco é opcional (archive_dir) e feito por uma thread à parte, fora do caminho
+do envio.
+
+No modo resumo (digest), relatórios consecutivos do mesmo destinatário vão
+juntos em uma única mensagem, até o limite de tamanho dos anexos.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import metrics
+from mailer import build_message
+from report_template import load_template
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()
+
+# Limite padrão da soma dos anexos (.docx, antes do base64) por mensagem no modo resumo
+DIGEST_MAX_BYTES = 15 * 1024 * 1024
+
+
+@dataclass
+class ReportJob:
+    data: Dict[str, object]  # placeholder -> valor
+    output_path: str  # nome do anexo (e do arquivo, quando há cópia em disco)
+    recipient: str
+    subject: str
+    body: str
+    key: Optional[str] = None  # identifica o relatório no registro de etapas
+    content: Optional[bytes] = None  # .docx renderizado, liberado após o envio
+
+
+@dataclass
+class StageStats:
+    name: str
+    done: int = 0
+    failed: int = 0
+    busy: float = 0.0  # soma do tempo gasto nos itens (todas as threads/processos)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def record(self, duration, ok=True):
+        agora = time.perf_counter()
+        if self.started is None:
+            self.started = agora - duration
+        self.finished = agora
+        self.busy += duration
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class PipelineStats:
+    render: StageStats = field(default_factory=lambda: StageStats('render'))
+    send: StageStats = field(default_factory=lambda: StageStats('send'))
+    skipped: int = 0  # já enviados em execuções anteriores
+    reports_sent: int = 0  # relatórios anexados às mensagens enviadas com sucesso
+    duration: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        linhas = [f"Pipeline concluído em {self.duration:.1f}s"]
+        if self.skipped:
+            linhas.append(f"  {self.skipped} relatórios já enviados anteriormente")
+        if self.reports_sent != self.send.done:
+            linhas.append(f"  {self.reports_sent} relatórios em {self.send.done} mensagens")
+        for stage in (self.render, self.send):
+            media = stage.busy / (stage.done + stage.failed) if stage.done + stage.failed else 0.0
+            linhas.append(
+                f"  {stage.name:<7} {stage.done} ok, {stage.failed} com falha, "
+                f"{stage.per_second:.1f}/s, {media * 1000:.0f} ms/item"
+            )
+        return '\n'.join(linhas)
+
+
+def _render(template_path, job: ReportJob):
+    # Executado nos processos do pool: cada processo compila o modelo uma vez
+    # (load_template guarda a compilação) e reaproveita nas linhas seguintes
+    inicio = time.perf_counter()
+    template = load_template(template_path, job.data.keys())
+    content = template.render(job.data)
+    return time.perf_counter() - inicio, content
+
+
+def _checkpoint(checkpoints, stage, job, detail=None, error=None):
+    if checkpoints is None or job.key is None:
+        return
+    if error is None:
+        checkpoints.mark_done(stage, job.key, detail)
+    else:
+        checkpoints.mark_failed(stage, job.key, error)
+
+
+def _recipient_key(job):
+    return str(job.recipient).strip().lower()
+
+
+def run_pipeline(
+    jobs: Iterable[ReportJob],
+    template_path,
+    mailer,
+    render_workers: Optional[int] = None,
+    send_workers: Optional[int] = None,
+    queue_size: int = 32,
+    checkpoints=None,
+    archive_dir=None,
+    digest=None,
+    max_attachment_bytes: int = DIGEST_MAX_BYTES
+) -> PipelineStats:
+    """
+    Renderiza e envia os relatórios com as duas etapas em paralelo
+
+    Args:
+        jobs (Iterable[ReportJob]): Relatórios a gerar, consumidos aos poucos
+        template_path (str): Modelo .docx
+        mailer (Mailer): Usado pelas threads de envio
+        render_workers (int): Processos de renderização (padrão: número de CPUs)
+        send_workers (int): Threads de envio (padrão: mailer.sessions)
+        queue_size (int): Relatórios renderizados aguardando envio
+        checkpoints (CheckpointStore): Registro de etapas (opcional). Relatórios
+            com `key` já enviados são pulados, e os já renderizados (arquivo
+            ainda no disco) vão direto para o envio
+        archive_dir (str): Pasta onde guardar uma cópia de cada relatório
+            (padrão: nenhuma; os relatórios só existem em memória)
+        digest (callable): Ativa o modo resumo. Recebe a lista de ReportJob de
+            uma mensagem e devolve (assunto, corpo). Os jobs de um mesmo
+            destinatário precisam vir em sequência em `jobs`
+        max_attachment_bytes (int): Soma máxima dos anexos por mensagem no modo
+            resumo; acima disso o destinatário recebe mais de uma mensagem
+
+    Returns:
+        PipelineStats: Itens, falhas e vazão de cada etapa
+    """
+    render_workers = render_workers or os.cpu_count() or 1
+    send_workers = send_workers or getattr(mailer, 'sessions', 1)
+    stats = PipelineStats()
+    lock = threading.Lock()
+    prontos = queue.Queue(maxsize=queue_size)
+    arquivo = queue.Queue(maxsize=queue_size) if archive_dir else None
+    inicio = time.perf_counter()
+
+    def enviar():
+        while True:
+            lote = prontos.get()
+            if lote is _FIM:
+                return
+            recipient = lote[0].recipient
+            t0 = time.perf_counter()
+            try:
+                if len(lote) == 1:
+                    subject, body = lote[0].subject, lote[0].body
+                else:
+                    subject, body = digest(lote)
+                anexos = [(os.path.basename(job.output_path), job.content) for job in lote]
+                mailer.send(build_message(mailer.sender, recipient, subject, body, attachments=anexos))
+                ok = True
+                logger.info(f"E-mail enviado para {recipient} ({len(lote)} relatórios)")
+                for job in lote:
+                    _checkpoint(checkpoints, 'emailed', job)
+            except Exception as e:
+                ok = False
+                logger.error(f"Falha ao enviar e-mail para {recipient}: {e}")
+                for job in lote:
+                    _checkpoint(checkpoints, 'emailed', job, error=str(e))
+                with lock:
+                    stats.errors.append(f"{recipient}: {e}")
+            for job in lote:
+                job.content = None
+            metrics.inc('papj_reports_total', len(lote), status='enviado' if ok else 'erro_envio')
+            with lock:
+                stats.send.record(time.perf_counter() - t0, ok)
+                if ok:
+                    stats.reports_sent += len(lote)
+
+    def arquivar():
+        while True:
+            item = arquivo.get()
+            if item is _FIM:
+                return
+            job, content = item
+            try:
+                with open(job.output_path, 'wb') as f:
+                    f.write(content)
+                _checkpoint(checkpoints, 'rendered', job, detail=job.output_path)
+            except OSError as e:
+                logger.error(f"Erro ao gravar a cópia {job.output_path}: {e}")
+
+    threads = [
+        threading.Thread(target=enviar, name=f'report-send-{i}', daemon=True)
+        for i in range(send_workers)
+    ]
+    if arquivo is not None:
+        os.makedirs(archive_dir, exist_ok=True)
+        threads.append(threading.Thread(target=arquivar, name='report-archive', daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        with ProcessPoolExecutor(max_workers=render_workers) as executor:
+            # Poucos itens em andamento por processo: a fila de envio é quem dita o ritmo
+            pendentes = []
+            # Relatórios do destinatário atual ainda não enviados (modo resumo)
+            grupo, tamanho = [], 0
+
+            def despachar(job):
+                nonlocal grupo, tamanho
+                if digest is None:
+                    prontos.put([job])  # bloqueia enquanto a fila de envio estiver cheia
+                    return
+                if grupo and (
+                    _recipient_key(job) != _recipient_key(grupo[0])
+                    or tamanho + len(job.content) > max_attachment_bytes
+                ):
+                    prontos.put(grupo)
+                    grupo, tamanho = [], 0
+                grupo.append(job)
+                tamanho += len(job.content)
+
+            def entregar(job, future):
+                if future is None:
+                    # Já gerado numa execução anterior (conteúdo lido da cópia em disco)
+                    despachar(job)
+                    return
+                try:
+                    duracao, job.content = future.result()
+                except Exception as e:
+                    logger.error(f"Erro ao gerar {job.output_path}: {e}")
+                    _checkpoint(checkpoints, 'rendered', job, error=str(e))
+                    metrics.inc('papj_reports_total', status='erro_render')
+                    with lock:
+                        stats.render.record(0.0, ok=False)
+                        stats.errors.append(f"{job.output_path}: {e}")
+                    return
+                # Medida no processo do pool e registrada aqui (as métricas são por processo)
+                metrics.observe('papj_render_seconds', duracao)
+                metrics.observe('papj_render_size_bytes', len(job.content))
+                with lock:
+                    stats.render.record(duracao)
+                if arquivo is not None:
+                    job.output_path = os.path.join(archive_dir, os.path.basename(job.output_path))
+                    arquivo.put((job, job.content))
+                else:
+                    # Sem cópia em disco não há o que reaproveitar numa nova execução
+                    _checkpoint(checkpoints, 'rendered', job)
+                despachar(job)
+
+            for job in jobs:
+                if checkpoints is not None and job.key is not None:
+                    if checkpoints.is_done('emailed', job.key):
+                        stats.skipped += 1
+                        metrics.inc('papj_reports_total', status='pulado')
+                        continue
+                    renderizado = checkpoints.get('rendered', job.key)
+                else:
+                    renderizado = None
+                if renderizado and renderizado[0] == 'ok' and os.path.exists(renderizado[1] or ''):
+                    job.output_path = renderizado[1]
+                    with open(job.output_path, 'rb') as f:
+                        job.content = f.read()
+                    # Passa pela mesma fila dos outros (sem future): os relatórios saem
+                    # na ordem de entrada e o agrupamento por destinatário é mantido
+                    pendentes.append((job, None))
+                else:
+                    pendentes.append((job, executor.submit(_render, template_path, job)))
+                if len(pendentes) >= 2 * render_workers:
+                    entregar(*pendentes.pop(0))
+            for job, future in pendentes:
+                entregar(job, future)
+            if grupo:
+                prontos.put(grupo)
+    finally:
+        for _ in range(send_workers):
+            prontos.put(_FIM)
+        if arquivo is not None:
+            arquivo.put(_FIM)
+        for thread in threads:
+            thread.join()
+
+    stats.duration = time.perf_counter() - inicio
+    logger.info(stats.summary())
+    return stats
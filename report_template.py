@@ -0,0 +1,178 @@
+"""
+Modelo .docx compilado para o preenchimento dos relatórios.
+
+O modelo é lido uma única vez: os placeholders são localizados no corpo, nas
+tabelas, nos cabeçalhos/rodapés e nas notas (inclusive quando o Word quebrou o
+texto em vários runs), e cada parte XML vira uma lista de trechos fixos e
+"slots". Preencher uma linha é só uma substituição de uma passada nos slots e a
+escrita do zip; nenhuma árvore XML é percorrida por relatório.
+"""
+import io
+import os
+import re
+import zipfile
+from functools import lru_cache
+from typing import Dict, Iterable, List, Union
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# Partes do pacote onde pode haver texto de placeholders
+_TEXT_PARTS = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+_TEXT_NODE = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>')
+
+
+class CompiledTemplate:
+    def __init__(self, template_path, placeholders: Iterable[str]):
+        """
+        Compila o modelo para os placeholders informados
+
+        Args:
+            template_path (str): Caminho do modelo .docx
+            placeholders (Iterable[str]): Textos do modelo que serão substituídos
+        """
+        from lxml import etree
+
+        self.template_path = str(template_path)
+        # Mais longos primeiro, para que um placeholder que é prefixo de outro
+        # não "roube" o trecho na alternância
+        self.placeholders = sorted(set(placeholders), key=len, reverse=True)
+        self._raw_pattern = re.compile('|'.join(re.escape(p) for p in self.placeholders))
+        self._pattern = re.compile('|'.join(re.escape(escape(p)) for p in self.placeholders))
+
+        # (ZipInfo, conteúdo) das partes sem placeholders e, para as demais,
+        # lista alternando trechos fixos (str) e slots (tuple com o texto original)
+        self._entries = []
+        with zipfile.ZipFile(self.template_path) as zf:
+            for info in zf.infolist():
+                data = zf.read(info.filename)
+                if self.placeholders and _TEXT_PARTS.match(info.filename):
+                    root = etree.fromstring(data)
+                    self._normalize_runs(root)
+                    xml = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+                    segments = self._split_segments(xml.decode('utf-8'))
+                    if segments is not None:
+                        self._entries.append((info, segments))
+                        continue
+                self._entries.append((info, data))
+
+    def render(self, data: Dict[str, object]) -> bytes:
+        """
+        Preenche o modelo com os valores de uma linha
+
+        Args:
+            data (dict): placeholder -> valor (convertido com str); placeholders
+                ausentes em `data` ficam como estão no modelo
+
+        Returns:
+            bytes: Conteúdo do .docx preenchido
+        """
+        valores = {escape(key): _xml_value(value) for key, value in data.items()}
+
+        def substituir(match):
+            return valores.get(match.group(0), match.group(0))
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as out:
+            for info, content in self._entries:
+                if isinstance(content, list):
+                    content = ''.join(
+                        self._pattern.sub(substituir, parte[0]) if isinstance(parte, tuple) else parte
+                        for parte in content
+                    ).encode('utf-8')
+                out.writestr(info, content)
+        return buffer.getvalue()
+
+    def render_to(self, output_path, data: Dict[str, object]):
+        with open(output_path, 'wb') as f:
+            f.write(self.render(data))
+        return output_path
+
+    def _normalize_runs(self, root):
+        # Quando um placeholder está dividido entre vários <w:t> do mesmo parágrafo,
+        # junta o texto no primeiro nó e remove o trecho dos nós seguintes
+        for paragraph in root.iter(f'{{{W_NS}}}p'):
+            nodes = [node for node in paragraph.iter(f'{{{W_NS}}}t') if _owner_paragraph(node) is paragraph]
+            if not nodes:
+                continue
+            textos = [node.text or '' for node in nodes]
+            completo = ''.join(textos)
+            ocorrencias = [m.span() for m in self._raw_pattern.finditer(completo)]
+            if not ocorrencias:
+                continue
+
+            inicios = []
+            posicao = 0
+            for texto in textos:
+                inicios.append(posicao)
+                posicao += len(texto)
+
+            for start, end in reversed(ocorrencias):
+                primeiro = _node_at(inicios, start)
+                ultimo = _node_at(inicios, end - 1)
+                nodes[primeiro].set(XML_SPACE, 'preserve')
+                if primeiro == ultimo:
+                    continue
+                offset = start - inicios[primeiro]
+                textos[primeiro] = textos[primeiro][:offset] + completo[start:end]
+                for i in range(primeiro + 1, ultimo):
+                    textos[i] = ''
+                textos[ultimo] = textos[ultimo][end - inicios[ultimo]:]
+                for i in range(primeiro, ultimo + 1):
+                    nodes[i].text = textos[i]
+                    nodes[i].set(XML_SPACE, 'preserve')
+
+    def _split_segments(self, xml: str):
+        segments: List[Union[str, tuple]] = []
+        posicao = 0
+        for match in _TEXT_NODE.finditer(xml):
+            texto = match.group(1)
+            if not self._pattern.search(texto):
+                continue
+            segments.append(xml[posicao:match.start(1)])
+            segments.append((texto,))
+            posicao = match.end(1)
+        if not segments:
+            return None
+        segments.append(xml[posicao:])
+        return segments
+
+
+def _owner_paragraph(node):
+    parent = node.getparent()
+    while parent is not None and parent.tag != f'{{{W_NS}}}p':
+        parent = parent.getparent()
+    return parent
+
+
+def _node_at(inicios, posicao):
+    # Índice do nó cujo texto contém a posição (inicios é crescente)
+    i = len(inicios) - 1
+    while inicios[i] > posicao:
+        i -= 1
+    return i
+
+
+def _xml_value(value) -> str:
+    # Como o python-docx: quebras de linha e tabulações viram <w:br/> e <w:tab/>
+    texto = escape(str(value))
+    if '\n' in texto or '\t' in texto:
+        texto = (texto
+                 .replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
+                 .replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">'))
+    return texto
+
+
+@lru_cache(maxsize=8)
+def _load_template(template_path, mtime, placeholders):
+    return CompiledTemplate(template_path, placeholders)
+
+
+def load_template(template_path, placeholders: Iterable[str]) -> CompiledTemplate:
+    """
+    Devolve o modelo compilado, reaproveitando a compilação enquanto o arquivo
+    não for alterado
+    """
+    template_path = os.path.abspath(template_path)
+    return _load_template(template_path, os.path.getmtime(template_path), tuple(sorted(placeholders)))
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('elasticsearch')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from checkpoints import CheckpointStore  # noqa: E402
+import es_indexer  # noqa: E402
+from es_indexer import get_es_client, index_documents  # noqa: E402
+from stubs import StubElasticsearch  # noqa: E402
+from text_extraction import DocumentText, PageText  # noqa: E402
+
+
+def documents(ids, pages=2):
+    for document_id in ids:
+        yield DocumentText(document_id, f'{document_id}.pdf', [
+            PageText(document_id, n, f'texto {document_id} {n}') for n in range(1, pages + 1)
+        ])
+
+
+@pytest.fixture
+def es():
+    with StubElasticsearch() as stub:
+        yield stub
+
+
+@pytest.mark.parametrize('thread_count', [1, 2])
+def test_rerun_skips_indexed_documents(es, tmp_path, thread_count):
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.sqlite3')
+    client = get_es_client([es.url])
+
+    stats = index_documents(documents(['1', '2', '3']), client=client, chunk_size=2,
+                            thread_count=thread_count, checkpoints=checkpoints)
+    assert stats.indexed == 9
+    assert checkpoints.counts()['indexed'] == {'ok': 3}
+
+    stats = index_documents(documents(['1', '2', '3', '4']), client=client, chunk_size=2,
+                            thread_count=thread_count, checkpoints=checkpoints)
+    assert (stats.documents, stats.skipped, stats.indexed) == (1, 3, 3)
+    assert checkpoints.is_done('indexed', '4')
+
+
+def test_failed_batch_marks_documents(tmp_path):
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.sqlite3')
+
+    # Nada escutando na porta: o lote inteiro falha
+    client = get_es_client(['http://127.0.0.1:9'], max_retries=0)
+    with pytest.raises(Exception):
+        index_documents(documents(['1', '2']), client=client, thread_count=2, checkpoints=checkpoints)
+    assert checkpoints.counts()['indexed'] == {'erro': 2}
+
+
+def test_checkpoint_lookup_holds_few_documents(es, tmp_path, monkeypatch):
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.sqlite3')
+    lidos, consumidos, retidos = [], [], []
+    original = es_indexer.iter_actions
+
+    def contando(docs, stats):
+        for doc in docs:
+            consumidos.append(doc.document_id)
+            retidos.append(len(lidos) - len(consumidos))
+            yield from original([doc], stats)
+
+    def gerar():
+        for doc in documents([str(i) for i in range(100)]):
+            lidos.append(doc.document_id)
+            yield doc
+
+    monkeypatch.setattr(es_indexer, 'iter_actions', contando)
+    stats = index_documents(gerar(), client=get_es_client([es.url]), checkpoints=checkpoints)
+    assert stats.indexed == 300
+    # Só um lote pequeno de documentos (com o texto) fica à frente da indexação
+    assert max(retidos) < es_indexer._PENDING_CHUNK
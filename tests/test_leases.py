@@ -0,0 +1,66 @@
+import sqlite3
+
+from leases import LeaseStore, run_worker
+
+
+def test_failing_range_does_not_block_others(tmp_path):
+    store = LeaseStore(tmp_path / 'leases.sqlite3', max_attempts=3, retry_delay=0.01)
+    store.create_ranges('docs', 10, 39, 10)
+    processadas = []
+
+    def processar(lease):
+        if lease.start == 10:
+            raise RuntimeError('erro no banco')
+        processadas.append(lease.start)
+
+    assert run_worker(store, 'docs', processar, worker_id='w1') == 2
+    assert processadas == [20, 30]
+    assert store.progress('docs') == {'concluida': 2, 'falhou': 1}
+    tentativas = store._conn.execute(
+        "SELECT tentativas FROM faixas WHERE nome = 'docs' AND inicio = 10"
+    ).fetchone()[0]
+    assert tentativas == 3
+
+
+def test_failed_range_waits_before_retry(tmp_path):
+    store = LeaseStore(tmp_path / 'leases.sqlite3', retry_delay=60)
+    store.create_ranges('docs', 0, 9, 10)
+    lease = store.claim('docs', 'w1')
+    assert store.fail(lease) == 'livre'
+    assert store.claim('docs', 'w2') is None
+    assert store.next_available_at('docs') is not None
+
+
+def test_expired_lease_counts_attempts(tmp_path):
+    store = LeaseStore(tmp_path / 'leases.sqlite3', lease_seconds=-1, max_attempts=2)
+    store.create_ranges('docs', 0, 9, 10)
+    assert store.claim('docs', 'w1') is not None
+    assert store.claim('docs', 'w2') is not None
+    # Segundo lease também expirou: a faixa esgotou as tentativas
+    assert store.claim('docs', 'w3') is None
+    assert store.progress('docs') == {'falhou': 1}
+
+
+def test_existing_table_gets_retry_column(tmp_path):
+    path = tmp_path / 'leases.sqlite3'
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE faixas (nome TEXT NOT NULL, inicio INTEGER NOT NULL, fim INTEGER NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'livre', dono TEXT, expira_em REAL,"
+            " tentativas INTEGER NOT NULL DEFAULT 0, atualizado_em REAL, PRIMARY KEY (nome, inicio))"
+        )
+    store = LeaseStore(path)
+    store.create_ranges('docs', 0, 9, 10)
+    assert store.claim('docs', 'w1') is not None
+
+
+def test_abandoned_lease_is_finished_by_another_worker(tmp_path):
+    store = LeaseStore(tmp_path / 'leases.sqlite3', lease_seconds=0.3)
+    store.create_ranges('docs', 0, 19, 10)
+    # w1 pega a primeira faixa e morre sem concluir nem renovar
+    assert store.claim('docs', 'w1') is not None
+    processadas = []
+
+    assert run_worker(store, 'docs', lambda lease: processadas.append(lease.start), worker_id='w2') == 2
+    assert processadas == [10, 0]
+    assert store.progress('docs') == {'concluida': 2}
@@ -0,0 +1,111 @@
+import os
+import smtplib
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import mailer as mailer_module  # noqa: E402
+from mailer import Mailer, RateLimiter, build_message  # noqa: E402
+from stubs import StubSMTP  # noqa: E402
+
+
+@pytest.fixture
+def conexoes(monkeypatch):
+    # Conta as conexões SMTP abertas
+    abertas = []
+
+    class CountingSMTP(smtplib.SMTP):
+        def __init__(self, *args, **kwargs):
+            abertas.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(mailer_module.smtplib, 'SMTP', CountingSMTP)
+    return abertas
+
+
+def mensagem(n):
+    return build_message('papj@mpes', f'dest{n}@mpes', f'Relatório {n}', 'corpo',
+                         attachments=[(f'relatorio_{n}.docx', b'PK' * 100)])
+
+
+def test_session_reused_and_reconnected_after_drop(conexoes):
+    with StubSMTP() as smtp:
+        with Mailer(smtp.host, smtp.port, username='u', password='p', starttls=False) as mailer:
+            for n in range(3):
+                mailer.send(mensagem(n))
+            assert len(conexoes) == 1
+
+            # Conexão perdida entre duas mensagens: reconecta e reenvia
+            mailer._all[0].server.sock.close()
+            mailer._all[0].server.sock = None
+            mailer.send(mensagem(3))
+            assert len(conexoes) == 2
+        assert smtp.messages == 4
+
+
+def test_server_closing_with_421_reconnects(monkeypatch):
+    enviados, conexoes = [], []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout=None):
+            conexoes.append(self)
+
+        def login(self, username, password):
+            pass
+
+        def send_message(self, msg):
+            if len(conexoes) == 1:
+                raise smtplib.SMTPResponseException(421, b'Too many messages in this session')
+            enviados.append(msg['To'])
+
+        def quit(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(mailer_module.smtplib, 'SMTP', FakeSMTP)
+    mailer = Mailer('smtp', 25, username='u', starttls=False)
+    mailer.send(mensagem(1))
+    assert enviados == ['dest1@mpes']
+    assert len(conexoes) == 2
+
+
+def test_other_smtp_errors_are_not_retried(monkeypatch):
+    class RejectingSMTP:
+        def __init__(self, host, port, timeout=None):
+            pass
+
+        def send_message(self, msg):
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'no such user')})
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(mailer_module.smtplib, 'SMTP', RejectingSMTP)
+    resultados = Mailer('smtp', 25, starttls=False).send_many([mensagem(1)])
+    assert resultados[0][0] is False and 'no such user' in resultados[0][1]
+
+
+def test_rate_limit_shared_between_sessions(conexoes):
+    with StubSMTP() as smtp:
+        with Mailer(smtp.host, smtp.port, sessions=3, messages_per_minute=600, starttls=False) as mailer:
+            inicio = time.monotonic()
+            resultados = mailer.send_many([mensagem(n) for n in range(6)])
+            decorrido = time.monotonic() - inicio
+        assert all(ok for ok, _ in resultados)
+        assert smtp.messages == 6
+    # 600 por minuto: uma mensagem a cada 0,1 s, mesmo com 3 sessões
+    assert decorrido >= 0.45
+    assert len(conexoes) <= 3
+
+
+def test_rate_limiter_disabled():
+    limiter = RateLimiter(None)
+    inicio = time.monotonic()
+    for _ in range(100):
+        limiter.acquire()
+    assert time.monotonic() - inicio < 0.1
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry
+
+
+def test_disabled_registry_ignores_calls():
+    registry = MetricsRegistry(enabled=False)
+    registry.inc('papj_downloads_total')
+    registry.observe('papj_download_seconds', 1.0)
+    with registry.timer('papj_render_seconds') as t:
+        pass
+    assert t is None
+    resumo = registry.snapshot()
+    assert resumo['counters'] == {} and resumo['histograms'] == {}
+    assert registry.prometheus_text() == '\n'
+
+
+def test_prometheus_text_counters_and_histograms():
+    registry = MetricsRegistry(enabled=True)
+    registry.inc('papj_downloads_total', status='ok')
+    registry.inc('papj_downloads_total', 2, status='ok')
+    registry.inc('papj_downloads_total', status='erro')
+    registry.observe('papj_download_seconds', 0.003, buckets=(0.001, 0.01, 0.1))
+    registry.observe('papj_download_seconds', 0.05, buckets=(0.001, 0.01, 0.1))
+    registry.observe('papj_download_seconds', 7.0, buckets=(0.001, 0.01, 0.1))
+
+    linhas = registry.prometheus_text().splitlines()
+
+    assert linhas.count('# TYPE papj_downloads_total counter') == 1
+    assert 'papj_downloads_total{status="ok"} 3' in linhas
+    assert 'papj_downloads_total{status="erro"} 1' in linhas
+    assert '# TYPE papj_download_seconds histogram' in linhas
+    # Buckets acumulados, como o Prometheus espera
+    assert 'papj_download_seconds_bucket{le="0.001"} 0' in linhas
+    assert 'papj_download_seconds_bucket{le="0.01"} 1' in linhas
+    assert 'papj_download_seconds_bucket{le="0.1"} 2' in linhas
+    assert 'papj_download_seconds_bucket{le="+Inf"} 3' in linhas
+    assert 'papj_download_seconds_sum 7.053' in linhas
+    assert 'papj_download_seconds_count 3' in linhas
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry(enabled=True)
+    registry.inc('papj_errors_total', erro='falha "x"\\y\nz')
+    assert 'papj_errors_total{erro="falha \\"x\\"\\\\y\\nz"} 1' in registry.prometheus_text()
+
+
+def test_timer_marks_errors():
+    registry = MetricsRegistry(enabled=True)
+    with registry.timer('papj_render_seconds', etapa='docx'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.timer('papj_render_seconds', etapa='docx'):
+            raise ValueError
+    histogramas = registry.snapshot()['histograms']
+    assert histogramas['papj_render_seconds{etapa="docx"}']['count'] == 1
+    assert histogramas['papj_render_seconds{etapa="docx",status="erro"}']['count'] == 1
+
+
+def test_json_summary(tmp_path):
+    registry = MetricsRegistry(enabled=True)
+    for valor in range(1, 101):
+        registry.observe('papj_send_seconds', valor / 1000, buckets=tuple(i / 100 for i in range(1, 11)))
+    registry.observe('papj_download_size_bytes', 5000)
+
+    path = registry.write_json(tmp_path, run='teste')
+    with open(path, encoding='utf-8') as f:
+        resumo = json.load(f)
+
+    assert resumo['run'] == 'teste'
+    envio = resumo['histograms']['papj_send_seconds']
+    assert envio['count'] == 100 and envio['min'] == 0.001 and envio['max'] == 0.1
+    assert envio['p50'] == pytest.approx(0.05, abs=0.01)
+    assert envio['p95'] == pytest.approx(0.095, abs=0.01)
+    # Nomes terminados em _bytes usam os limites de tamanho
+    assert resumo['histograms']['papj_download_size_bytes']['count'] == 1
+
+
+def test_export_writes_configured_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'REGISTRY', MetricsRegistry(enabled=True))
+    metrics.REGISTRY.inc('papj_reports_total')
+    textfile = tmp_path / 'prom' / 'papj.prom'
+
+    metrics.export(textfile=str(textfile), json_dir=str(tmp_path / 'json'), run='relatorios')
+
+    assert 'papj_reports_total 1' in textfile.read_text(encoding='utf-8')
+    assert len(list((tmp_path / 'json').glob('metrics_*.json'))) == 1
+    assert not list(textfile.parent.glob('*.tmp'))
@@ -0,0 +1,43 @@
+import os
+
+from minio_cache import DownloadCache
+
+
+def write_temp(cache, bucket, key, size):
+    temp_path = cache.temp_path(bucket, key)
+    with open(temp_path, 'wb') as f:
+        f.write(b'x' * size)
+    return temp_path
+
+
+def test_object_larger_than_cache_is_not_cached(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', max_bytes=10)
+    local_path = str(tmp_path / 'doc.pdf')
+    temp_path = write_temp(cache, 'b', 'k', 100)
+
+    assert cache.store('b', 'k', '"etag"', temp_path, local_path) == local_path
+    assert os.path.getsize(local_path) == 100
+    assert not os.path.exists(temp_path)
+    assert cache.get('b', 'k') is None
+
+
+def test_eviction_keeps_object_just_stored(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', max_bytes=100)
+    for key in ('a', 'b', 'c'):
+        local_path = str(tmp_path / f'{key}.pdf')
+        cache.store('b', key, '"etag"', write_temp(cache, 'b', key, 60), local_path)
+        assert os.path.getsize(local_path) == 60
+        assert cache.get('b', key) is not None
+    assert cache.get('b', 'a') is None
+    assert cache.total_bytes() <= 100
+
+
+def test_pinned_entry_is_not_evicted(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', max_bytes=50)
+    cache.store('b', 'a', '"etag"', write_temp(cache, 'b', 'a', 40), str(tmp_path / 'a.pdf'))
+    with cache._pin('b', 'a'):
+        cache.store('b', 'c', '"etag"', write_temp(cache, 'b', 'c', 40), str(tmp_path / 'c.pdf'))
+        assert cache.get('b', 'a') is not None
+    cache.evict()
+    assert cache.get('b', 'a') is None
+    assert cache.get('b', 'c') is not None
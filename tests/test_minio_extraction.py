@@ -0,0 +1,182 @@
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from minio_extraction import (  # noqa: E402
+    MinIODownloader, get_minio_file_path, iter_document_pages, iter_minio_file_paths
+)
+from stubs import LocalDatabase  # noqa: E402
+
+PART = 1024
+BODY = bytes(range(256)) * 16  # 4 partes de PART bytes
+
+
+class SlowS3:
+    # get_object com Range lento, registrando quantas partes estão em andamento
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.em_andamento = 0
+        self.maximo = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(BODY)}
+
+    def get_object(self, Bucket, Key, Range):
+        with self.lock:
+            self.em_andamento += 1
+            self.maximo = max(self.maximo, self.em_andamento)
+        time.sleep(0.1)
+        with self.lock:
+            self.em_andamento -= 1
+        inicio, fim = (int(n) for n in Range[len('bytes='):].split('-'))
+        return {'Body': io.BytesIO(BODY[inicio:fim + 1])}
+
+
+def test_ranged_parts_overlap_with_default_throttle():
+    pytest.importorskip('boto3')
+    downloader = MinIODownloader('127.0.0.1:9', 'x', 'x')  # max_workers=1
+    downloader.s3_client = SlowS3()
+
+    buffer = downloader.open_document('bucket|chave', part_size=PART)
+
+    assert buffer.read() == BODY
+    assert downloader.s3_client.maximo == 4
+
+
+class CountingDatabase:
+    # Conta os comandos enviados ao banco
+    def __init__(self, db):
+        self.db = db
+        self.queries = 0
+
+    def cursor(self):
+        self.queries += 1
+        return self.db.cursor()
+
+
+def test_paths_resolved_in_chunks_in_input_order():
+    db = CountingDatabase(LocalDatabase().seed(30))
+    ids = [4, '3', 10, 999, 4, 7, ' 8 ']
+
+    resolvidos = list(iter_minio_file_paths(ids, db, chunk_size=3))
+
+    assert [id_documento for id_documento, _ in resolvidos] == ids
+    caminhos = dict((str(i), path) for i, path in resolvidos)
+    # Renderizado (pares) tem prioridade sobre o externo (ímpares só têm o externo)
+    assert caminhos['4'].split('|')[1] == 'documento.renderizado'
+    assert caminhos['3'].split('|')[1] == 'documento.externo'
+    assert caminhos[' 8 '].split('|')[1] == 'documento.renderizado'
+    assert caminhos['10'] is None   # sem arquivo
+    assert caminhos['999'] is None  # não existe
+    assert db.queries == 3          # uma consulta por lote
+
+
+def test_single_path_lookup_uses_batch_query():
+    db = CountingDatabase(LocalDatabase().seed(5))
+    assert get_minio_file_path('5', db).split('|')[1] == 'documento.externo'
+    assert db.queries == 1
+
+
+def test_multiple_downloads_keep_order_and_record_failures(tmp_path):
+    pytest.importorskip('boto3')
+    from stubs import StubS3
+
+    corpos = {i: f'documento {i}'.encode() * 100 for i in range(8)}
+    objetos = {('gampes-documento-externo', f'{i:032x}.pdf'): corpo for i, corpo in corpos.items()}
+    documentos = [{'id': i, 'path': f'{i:032x}|documento.externo|application/pdf|.pdf'} for i in range(8)]
+    documentos.insert(2, {'id': 'x', 'path': f'{99:032x}|documento.externo|application/pdf|.pdf'})
+
+    with StubS3(objetos) as s3:
+        downloader = MinIODownloader(s3.url, 'x', 'x', max_workers=4)
+        resultados = downloader.download_multiple_documents(documentos, tmp_path)
+
+    assert [r.id for r in resultados] == [d['id'] for d in documentos]
+    assert [r.id for r in resultados if not r.ok] == ['x']
+    assert resultados[2].error and resultados[2].local_path is None
+    for resultado in resultados:
+        if resultado.ok:
+            with open(resultado.local_path, 'rb') as f:
+                assert f.read() == corpos[resultado.id]
+            assert resultado.bytes == len(corpos[resultado.id])
+
+
+def test_multiple_downloads_run_concurrently(tmp_path, monkeypatch):
+    pytest.importorskip('boto3')
+    downloader = MinIODownloader('127.0.0.1:9', 'x', 'x', max_workers=4)
+    lock = threading.Lock()
+    estado = {'agora': 0, 'maximo': 0}
+
+    def baixar(path, local_directory, filename=None):
+        with lock:
+            estado['agora'] += 1
+            estado['maximo'] = max(estado['maximo'], estado['agora'])
+        time.sleep(0.05)
+        with lock:
+            estado['agora'] -= 1
+        destino = tmp_path / filename
+        destino.write_bytes(b'pdf')
+        return str(destino)
+
+    monkeypatch.setattr(downloader, '_download_document', baixar)
+    documentos = [{'id': i, 'path': f'{i:032x}|documento.externo|application/pdf|.pdf'} for i in range(8)]
+
+    resultados = downloader.download_multiple_documents(documentos, tmp_path)
+
+    assert all(r.ok for r in resultados)
+    assert estado['maximo'] == 4
+
+
+class KeysetDatabase:
+    # O SQLite não tem TOP (?): vira LIMIT ? no fim da CTE, com o parâmetro no fim
+    def __init__(self, db):
+        self.db = db
+        self.pages = []
+
+    def cursor(self):
+        return _TopCursor(self.db.cursor(), self.pages)
+
+
+class _TopCursor:
+    def __init__(self, cursor, pages):
+        self._cursor = cursor
+        self._pages = pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.__exit__(*exc)
+
+    def execute(self, query, params=()):
+        query = query.replace('SELECT TOP (?)', 'SELECT', 1).replace('ORDER BY d.Id\n', 'ORDER BY d.Id LIMIT ?\n', 1)
+        self._pages.append(params[2])  # d.Id > ?
+        return self._cursor.execute(query, (*params[1:], params[0]))
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+def test_keyset_pages_cover_range_in_order():
+    db = KeysetDatabase(LocalDatabase().seed(25))
+
+    paginas = list(iter_document_pages(59, db, page_size=10, after_id=3, until_id=22))
+
+    ids = [i for pagina in paginas for i, _ in pagina]
+    assert ids == list(range(4, 23))
+    assert [len(p) for p in paginas] == [10, 9]
+    assert db.pages == [3, 13]  # cada página continua do último id da anterior
+    caminhos = dict(i for pagina in paginas for i in pagina)
+    assert caminhos[4].split('|')[1] == 'documento.renderizado'
+    assert caminhos[5].split('|')[1] == 'documento.externo'
+    assert caminhos[10] is None and caminhos[20] is None
+
+
+def test_keyset_pages_skip_other_types():
+    db = LocalDatabase().seed(12)  # todos do tipo 59
+    assert list(iter_document_pages(60, KeysetDatabase(db), page_size=5)) == []
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from minio_index import ObjectKeyIndex  # noqa: E402
+from stubs import StubS3  # noqa: E402
+
+
+def client(s3):
+    return boto3.client('s3', endpoint_url=s3.url, aws_access_key_id='x', aws_secret_access_key='x',
+                        region_name='us-east-1')
+
+
+def test_refresh_lists_only_keys_after_last_indexed(tmp_path):
+    objetos = {('docs', f'{i:04d}.pdf'): b'x' for i in range(5)}
+    with StubS3(objetos, page_size=2) as s3:
+        index = ObjectKeyIndex(tmp_path / 'index.sqlite3')
+        assert index.refresh(client(s3), 'docs', page_size=2) == 5
+
+        # Nada novo: uma listagem vazia a partir da última chave
+        antes = s3.requests['list_objects_v2']
+        assert index.refresh(client(s3), 'docs', page_size=2) == 0
+        assert s3.requests['list_objects_v2'] == antes + 1
+
+        s3.put('docs', '0005.pdf', b'x')
+        assert index.refresh(client(s3), 'docs', page_size=2) == 1
+        assert index.lookup('docs', '0005') == '0005.pdf'
+        assert index.count('docs') == 6
+
+
+def test_rebuild_drops_deleted_keys(tmp_path):
+    with StubS3({('docs', 'a.pdf'): b'x', ('docs', 'b.pdf'): b'x'}) as s3:
+        index = ObjectKeyIndex(tmp_path / 'index.sqlite3')
+        index.refresh(client(s3), 'docs')
+        del s3.objects[('docs', 'a.pdf')]
+        assert index.rebuild(client(s3), 'docs') == 1
+        assert index.lookup('docs', 'a') is None
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from minio_throttle import AdaptiveLimiter, CircuitOpenError, MinIOThrottle
+
+
+class FakeClientError(Exception):
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+def slowdown():
+    return FakeClientError('SlowDown', 503)
+
+
+def internal_error():
+    return FakeClientError('InternalError', 500)
+
+
+def sequence(*outcomes):
+    # Chamável que levanta/devolve os resultados na ordem
+    restantes = list(outcomes)
+
+    def fn():
+        outcome = restantes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return fn
+
+
+def make_throttle(**kwargs):
+    opcoes = dict(max_retries=5, base_delay=0, failure_threshold=5, reset_timeout=0.05)
+    opcoes.update(kwargs)
+    return MinIOThrottle(**opcoes)
+
+
+def open_circuit(throttle, bucket='b'):
+    breaker = throttle.breaker(bucket)
+    for _ in range(breaker.failure_threshold):
+        breaker.failure()
+    assert breaker.state == 'open'
+    return breaker
+
+
+def test_retries_of_one_call_do_not_open_its_circuit():
+    throttle = make_throttle()
+    fn = sequence(*[internal_error() for _ in range(5)], 'ok')
+    assert throttle.call('b', 'head_object', fn) == 'ok'
+    assert throttle.breaker('b').state == 'closed'
+
+
+def test_exhausted_retries_count_one_failure():
+    throttle = make_throttle(max_retries=2)
+    with pytest.raises(FakeClientError):
+        throttle.call('b', 'head_object', sequence(*[internal_error() for _ in range(3)]))
+    breaker = throttle.breaker('b')
+    assert breaker.failures == 1
+    assert breaker.state == 'closed'
+
+
+def test_failures_across_calls_open_circuit():
+    throttle = make_throttle(max_retries=0, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(FakeClientError):
+            throttle.call('b', 'head_object', sequence(internal_error()))
+    with pytest.raises(CircuitOpenError):
+        throttle.call('b', 'head_object', sequence('ok'))
+
+
+@pytest.mark.parametrize('erro', [slowdown, internal_error])
+def test_failed_trial_reopens_and_recovers(erro):
+    throttle = make_throttle(max_retries=0)
+    breaker = open_circuit(throttle)
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+
+    with pytest.raises(FakeClientError):
+        throttle.call('b', 'head_object', sequence(erro()))
+    assert breaker.state == 'open'
+    assert not breaker._trial
+
+    time.sleep(0.06)
+    assert throttle.call('b', 'head_object', sequence('ok')) == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_trial_retries_skip_gate_and_close_circuit():
+    throttle = make_throttle()
+    breaker = open_circuit(throttle)
+    time.sleep(0.06)
+
+    fn = sequence(slowdown(), internal_error(), 'ok')
+    assert throttle.call('b', 'head_object', fn) == 'ok'
+    assert breaker.state == 'closed'
+    assert not breaker._trial
+
+
+def test_other_calls_rejected_while_trial_retries():
+    throttle = make_throttle()
+    breaker = open_circuit(throttle)
+    time.sleep(0.06)
+
+    rejeitadas = []
+
+    def fn_teste():
+        # Durante a chamada de teste, outra chamada ao bucket é rejeitada
+        if not rejeitadas:
+            with pytest.raises(CircuitOpenError):
+                throttle.call('b', 'head_object', sequence('ok'))
+            rejeitadas.append(True)
+            raise slowdown()
+        return 'ok'
+
+    assert throttle.call('b', 'head_object', fn_teste) == 'ok'
+    assert rejeitadas == [True]
+    assert breaker.state == 'closed'
+
+
+def test_limit_recovers_when_latency_settles_higher():
+    limiter = AdaptiveLimiter(initial=16, maximum=32)
+    for _ in range(5):
+        limiter.release(limiter.acquire(), latency=0.002, operation='head_object')
+    minimo = limiter.limit
+    for _ in range(300):
+        limiter.release(limiter.acquire(), latency=0.010, operation='head_object')
+        minimo = min(minimo, limiter.limit)
+    # A mudança reduz o limite, mas a nova latência estável vira a referência
+    assert minimo < 16
+    assert limiter.limit > 8
+
+
+def test_latency_compared_per_operation():
+    limiter = AdaptiveLimiter(initial=16, maximum=32)
+    for _ in range(50):
+        limiter.release(limiter.acquire(), latency=0.002, operation='head_object')
+        limiter.release(limiter.acquire(), latency=0.050, operation='list_objects_v2')
+    assert limiter.limit >= 16
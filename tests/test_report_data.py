@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from report_data import INDICATORS, MESSAGE_COLUMNS, iter_records, placeholder_columns, prepare_frame
+
+
+def frame():
+    linhas = 5
+    df = pd.DataFrame({
+        'id_documento': pd.array([1, 2, None, 4, 5], dtype='Int64'),
+        'COD_ACAO': ['A1', 'A2', 'A3', np.nan, 'A5'],
+        'Responsavel': ['Ana', np.nan, 'Bia', 'Caio', 'Duda'],
+        'E-mail': ['a@mpes', 'b@mpes', 'c@mpes', np.nan, 'e@mpes'],
+        'NOME_PJ_CONCATENADO': ['PJ 1'] * linhas,
+        'proced_SEI': ['1.0', np.nan, '3', '4', '5'],
+        'TEMA': ['Tema'] * linhas,
+        'DIRETRIZ_CONSOLIDADA': [np.nan] * linhas,
+        'RESULTADOS_ESPERADOS': ['R'] * linhas,
+    })
+    for n, coluna in enumerate(INDICATORS):
+        df[coluna] = [f'ind {n}' if (i + n) % 3 else np.nan for i in range(linhas)]
+    return df
+
+
+def row_by_row(row):
+    # Preenchimento original, linha a linha com pd.isna
+    data = {}
+    for placeholder, origem in placeholder_columns().items():
+        if isinstance(origem, tuple):
+            coluna, texto = origem
+            data[placeholder] = "" if pd.isna(row[coluna]) else texto
+        else:
+            data[placeholder] = "" if pd.isna(row[origem]) else row[origem]
+    return data
+
+
+def test_records_match_row_by_row_filling():
+    df = frame()
+    registros = list(iter_records(df))
+    assert len(registros) == len(df)
+    for registro, (_, row) in zip(registros, df.iterrows()):
+        assert registro.data == row_by_row(row)
+        assert list(registro.data) == list(placeholder_columns())
+
+
+def test_result_text_only_for_filled_indicators():
+    registros = list(iter_records(frame()))
+    assert registros[0].data['Indicador 1: IND_01'] == ''
+    assert registros[0].data['Insira aqui o resultado do indicador 1'] == ''
+    assert registros[1].data['Indicador 1: IND_01'] == 'ind 0'
+    assert registros[1].data['Insira aqui o resultado do indicador 1'] == 'Insira aqui o resultado do indicador 1'
+
+
+def test_message_columns_keep_original_values():
+    registros = list(iter_records(frame()))
+    assert list(registros[0].row) == MESSAGE_COLUMNS
+    assert registros[0].row['id_documento'] == 1
+    # Vazios seguem como NA no e-mail (e "" no modelo)
+    assert pd.isna(registros[2].row['id_documento'])
+    assert registros[2].data['id_documento'] == ''
+    assert pd.isna(registros[3].row['E-mail'])
+
+
+def test_prepare_frame_keeps_index():
+    df = frame().iloc[[3, 1]]
+    preparado = prepare_frame(df)
+    assert preparado.index.tolist() == [3, 1]
+    assert preparado['COD_ACAO'].tolist() == ['', 'A2']
@@ -0,0 +1,55 @@
+import email
+import time
+
+import report_pipeline
+from checkpoints import CheckpointStore
+from report_pipeline import ReportJob, run_pipeline
+
+
+def fake_render(template_path, job):
+    # Relatórios gerados agora ficam prontos depois dos retomados do checkpoint
+    time.sleep(0.05)
+    return 0.0, f"gerado {job.key}".encode()
+
+
+class FakeMailer:
+    sender = 'papj@example.org'
+    sessions = 1
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+def attachments(message):
+    return [part.get_filename() for part in email.message_from_bytes(message.as_bytes()).walk()
+            if part.get_filename()]
+
+
+def test_resumed_jobs_keep_recipient_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_pipeline, '_render', fake_render)
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.sqlite3')
+    jobs = []
+    for i, recipient in enumerate(['a@x.org', 'a@x.org', 'a@x.org', 'b@x.org', 'b@x.org', 'c@x.org']):
+        jobs.append(ReportJob({}, f'relatorio_{i}.docx', recipient, 'assunto', 'corpo', key=str(i)))
+    # Relatórios 1 e 4 já foram gerados numa execução anterior
+    for i in (1, 4):
+        path = tmp_path / f'relatorio_{i}.docx'
+        path.write_bytes(b'retomado')
+        checkpoints.mark_done('rendered', str(i), str(path))
+
+    mailer = FakeMailer()
+    stats = run_pipeline(
+        jobs, 'modelo.docx', mailer, render_workers=2, send_workers=1, checkpoints=checkpoints,
+        digest=lambda lote: ('resumo', f'{len(lote)} relatórios')
+    )
+
+    assert stats.reports_sent == 6
+    assert [message['To'] for message in mailer.messages] == ['a@x.org', 'b@x.org', 'c@x.org']
+    assert [attachments(message) for message in mailer.messages] == [
+        ['relatorio_0.docx', 'relatorio_1.docx', 'relatorio_2.docx'],
+        ['relatorio_3.docx', 'relatorio_4.docx'],
+        ['relatorio_5.docx'],
+    ]
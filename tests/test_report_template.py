@@ -0,0 +1,71 @@
+import io
+import os
+
+import pytest
+
+docx = pytest.importorskip('docx')
+
+from report_template import CompiledTemplate, load_template  # noqa: E402
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / 'modelo.docx'
+    doc = docx.Document()
+    p = doc.add_paragraph()
+    # O Word costuma quebrar o placeholder em vários runs
+    for trecho in ('Ação: COD_', 'AC', 'AO fim'):
+        p.add_run(trecho)
+    doc.add_paragraph('Indicador 1: IND_01 / Indicador 10: IND_10')
+    tabela = doc.add_table(rows=1, cols=1)
+    tabela.cell(0, 0).text = 'Responsavel_'
+    doc.sections[0].header.paragraphs[0].text = 'id_documento'
+    doc.save(path)
+    return path
+
+
+def paragraphs(conteudo):
+    doc = docx.Document(io.BytesIO(conteudo))
+    textos = [p.text for p in doc.paragraphs]
+    textos += [c.text for t in doc.tables for row in t.rows for c in row.cells]
+    textos += [p.text for p in doc.sections[0].header.paragraphs]
+    return textos
+
+
+def test_placeholders_replaced_in_runs_tables_and_headers(template):
+    modelo = CompiledTemplate(template, ['COD_ACAO', 'Responsavel_', 'id_documento'])
+    textos = paragraphs(modelo.render({'COD_ACAO': 'A-1', 'Responsavel_': 'Ana & Bia <x>', 'id_documento': 42}))
+    assert 'Ação: A-1 fim' in textos
+    assert 'Ana & Bia <x>' in textos
+    assert '42' in textos
+
+
+def test_single_pass_does_not_replace_inside_values(template):
+    modelo = CompiledTemplate(template, ['COD_ACAO', 'Responsavel_'])
+    # O valor de um placeholder contém o nome de outro: não é substituído de novo
+    textos = paragraphs(modelo.render({'COD_ACAO': 'Responsavel_', 'Responsavel_': 'Ana'}))
+    assert 'Ação: Responsavel_ fim' in textos
+    assert 'Ana' in textos
+
+
+def test_longest_placeholder_wins(template):
+    modelo = CompiledTemplate(template, ['IND_01', 'IND_1', 'IND_10'])
+    textos = paragraphs(modelo.render({'IND_01': 'um', 'IND_1': 'errado', 'IND_10': 'dez'}))
+    assert 'Indicador 1: um / Indicador 10: dez' in textos
+
+
+def test_line_breaks_and_missing_values(template):
+    modelo = CompiledTemplate(template, ['COD_ACAO', 'Responsavel_'])
+    doc = docx.Document(io.BytesIO(modelo.render({'COD_ACAO': 'linha 1\nlinha 2'})))
+    assert doc.paragraphs[0].text == 'Ação: linha 1\nlinha 2 fim'
+    # Placeholder sem valor fica como no modelo
+    assert doc.tables[0].cell(0, 0).text == 'Responsavel_'
+
+
+def test_load_template_recompiles_when_file_changes(template):
+    primeiro = load_template(template, ['COD_ACAO'])
+    assert load_template(template, ['COD_ACAO']) is primeiro
+
+    stat = os.stat(template)
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_template(template, ['COD_ACAO']) is not primeiro
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+fitz = pytest.importorskip('fitz')
+
+import text_extraction  # noqa: E402
+from text_cache import TextCache  # noqa: E402
+from text_extraction import extract_document_text  # noqa: E402
+
+
+def make_pdf(path, texto):
+    # Página 1 com camada de texto; página 2 sem texto (vai para o OCR)
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), texto)
+    doc.new_page().draw_rect(fitz.Rect(50, 50, 200, 200), fill=(0, 0, 0))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    chamadas = []
+
+    def fake_ocr(page, dpi, lang):
+        chamadas.append(dpi)
+        return f'ocr {dpi}'
+
+    monkeypatch.setattr(text_extraction, '_ocr_page', fake_ocr)
+    return chamadas
+
+
+def test_repeated_file_is_not_reopened(tmp_path, ocr):
+    pdf = make_pdf(tmp_path / 'a.pdf', 'Relatório da ação número um')
+    with TextCache(tmp_path / 'cache.sqlite3') as cache:
+        primeiro = extract_document_text(pdf, '1', dpi=200, lang='por', cache=cache)
+        # A mesma cópia com outro nome (outro bucket)
+        copia = tmp_path / 'b.pdf'
+        copia.write_bytes(pdf.read_bytes())
+        segundo = extract_document_text(copia, '2', dpi=200, lang='por', cache=cache)
+
+    assert ocr == [200]
+    assert [p.cached for p in primeiro.pages] == [False, False]
+    assert [p.cached for p in segundo.pages] == [True, True]
+    assert [(p.text, p.ocr) for p in segundo.pages] == [(p.text, p.ocr) for p in primeiro.pages]
+    assert segundo.document_id == '2'
+
+
+def test_changed_file_is_extracted_again_but_reuses_same_pages(tmp_path, ocr):
+    pdf = tmp_path / 'a.pdf'
+    with TextCache(tmp_path / 'cache.sqlite3') as cache:
+        make_pdf(pdf, 'Versão antiga do texto da página')
+        extract_document_text(pdf, '1', dpi=200, lang='por', cache=cache)
+        # Conteúdo novo (hash do arquivo muda): a página 1 é lida de novo, e a
+        # página escaneada, igual à anterior, vem do cache de páginas
+        make_pdf(pdf, 'Versão nova do texto da página')
+        novo = extract_document_text(pdf, '1', dpi=200, lang='por', cache=cache)
+
+    assert ocr == [200]
+    assert 'nova' in novo.pages[0].text and not novo.pages[0].cached
+    assert novo.pages[1].cached and novo.pages[1].text == 'ocr 200'
+
+
+def test_extraction_parameters_are_part_of_the_key(tmp_path, ocr):
+    pdf = make_pdf(tmp_path / 'a.pdf', 'Relatório da ação número um')
+    with TextCache(tmp_path / 'cache.sqlite3') as cache:
+        extract_document_text(pdf, '1', dpi=200, lang='por', cache=cache)
+        outro = extract_document_text(pdf, '1', dpi=300, lang='por', cache=cache)
+    assert ocr == [200, 300]
+    assert outro.pages[1].text == 'ocr 300' and not outro.pages[1].cached
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    with TextCache(tmp_path / 'cache.sqlite3', max_bytes=250) as cache:
+        for n in range(3):
+            cache.put_page(f'p{n}', 'x' * 100)
+            time.sleep(0.01)
+        assert cache.get_page('p0') is not None  # acesso recente: p1 é o mais antigo
+        cache.evict()
+        assert cache.get_page('p1') is None
+        assert cache.get_page('p0') is not None and cache.get_page('p2') is not None
+        assert cache.total_bytes() <= 250
@@ -0,0 +1,23 @@
+import os
+
+import text_extraction
+from text_extraction import DocumentText, PageText, extract_texts
+
+
+def extract_or_crash(path, document_id, dpi, lang, max_rss_mb):
+    # No lugar de _extract_in_worker: o documento 'quebra' derruba o processo
+    if 'quebra' in str(path):
+        os._exit(1)
+    return DocumentText(document_id, str(path), [PageText(document_id, 1, f'texto {document_id}')])
+
+
+def test_crashed_worker_fails_only_its_document(monkeypatch):
+    monkeypatch.setattr(text_extraction, '_extract_in_worker', extract_or_crash)
+    documentos = [(str(i), f'{i}.pdf') for i in range(6)]
+    documentos.insert(3, ('3q', 'quebra.pdf'))
+
+    resultados = list(extract_texts(documentos, max_workers=2, max_pending=4, cache_path=''))
+
+    assert [r.document_id for r in resultados] == ['0', '1', '2', '3q', '3', '4', '5']
+    assert [r.document_id for r in resultados if not r.ok] == ['3q']
+    assert all(r.pages for r in resultados if r.ok)
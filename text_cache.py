@@ -0,0 +1,203 @@
+"""
+Cache persistente do texto extraído dos documentos (camada de texto + OCR).
+
+O mesmo PDF costuma aparecer em mais de um bucket (ex.: documento.renderizado e
+mni.documento.renderizado) e é reprocessado a cada backfill. O cache guarda:
+
+- por arquivo: o resultado completo, pelo hash do conteúdo do arquivo. Um arquivo
+  já visto não é nem aberto;
+- por página: o texto de cada página que passou pelo OCR, pelo hash do conteúdo
+  da página (fluxo de conteúdo + imagens). Páginas iguais em arquivos diferentes
+  (ex.: o mesmo anexo escaneado em outro documento) não passam de novo pelo OCR.
+
+As chaves incluem os parâmetros da extração (DPI, idioma), então mudar a
+configuração não devolve resultados antigos. O cache é um SQLite (WAL) que pode
+ser aberto por vários processos ao mesmo tempo; o tamanho total é limitado e as
+entradas acessadas há mais tempo são removidas primeiro. Erros do cache só geram
+um aviso: a extração continua sem ele. Dois processos com o mesmo arquivo ao
+mesmo tempo ainda fazem o OCR cada um (o primeiro a terminar grava).
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEXT_CACHE_MAX_BYTES = int(os.getenv('TEXT_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Mudanças na forma de extrair o texto devem incrementar a versão (invalida o cache)
+CACHE_VERSION = 1
+
+# Gravações entre duas verificações do tamanho total
+_EVICT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS arquivos (
+    chave TEXT PRIMARY KEY,
+    paginas TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    ultimo_acesso REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paginas (
+    chave TEXT PRIMARY KEY,
+    texto TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    ultimo_acesso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_arquivos_acesso ON arquivos (ultimo_acesso);
+CREATE INDEX IF NOT EXISTS ix_paginas_acesso ON paginas (ultimo_acesso);
+"""
+
+
+def file_hash(path, chunk_size=1024 * 1024) -> str:
+    """
+    SHA-256 do conteúdo do arquivo
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(chunk_size), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def page_hash(page) -> str:
+    """
+    SHA-256 do conteúdo de uma página do PyMuPDF: fluxo de conteúdo e os dados
+    (comprimidos) das imagens usadas, que é o que determina o resultado do OCR
+    """
+    sha = hashlib.sha256(page.read_contents())
+    doc = page.parent
+    for imagem in page.get_images(full=True):
+        sha.update(doc.xref_stream_raw(imagem[0]) or b'')
+    return sha.hexdigest()
+
+
+class TextCache:
+    def __init__(self, db_path, max_bytes=DEFAULT_TEXT_CACHE_MAX_BYTES):
+        """
+        Abre (ou cria) o cache de texto
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite (compartilhado entre processos)
+            max_bytes (int): Tamanho máximo dos textos guardados; as entradas
+                acessadas há mais tempo são removidas quando o limite é ultrapassado
+        """
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        pasta = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(pasta, exist_ok=True)
+        # O timeout cobre a espera enquanto outro processo grava
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def file_key(digest: str, dpi, lang, min_text_chars) -> str:
+        return f"v{CACHE_VERSION}:{digest}:{dpi}:{lang}:{min_text_chars}"
+
+    @staticmethod
+    def page_key(digest: str, dpi, lang) -> str:
+        return f"v{CACHE_VERSION}:{digest}:{dpi}:{lang}"
+
+    def get_document(self, key: str) -> Optional[List[Tuple[str, bool]]]:
+        """
+        Returns:
+            list: (texto, ocr) de cada página do arquivo, ou None se não estiver no cache
+        """
+        row = self._get('arquivos', 'paginas', key)
+        return [(texto, bool(ocr)) for texto, ocr in json.loads(row)] if row is not None else None
+
+    def put_document(self, key: str, pages: List[Tuple[str, bool]]):
+        conteudo = json.dumps([[texto, bool(ocr)] for texto, ocr in pages], ensure_ascii=False)
+        self._put('arquivos', 'paginas', key, conteudo)
+
+    def get_page(self, key: str) -> Optional[str]:
+        """
+        Returns:
+            str: Texto do OCR da página, ou None se não estiver no cache
+        """
+        return self._get('paginas', 'texto', key)
+
+    def put_page(self, key: str, text: str):
+        self._put('paginas', 'texto', key, text)
+
+    def _get(self, tabela, coluna, key):
+        try:
+            with self._lock:
+                row = self._conn.execute(f"SELECT {coluna} FROM {tabela} WHERE chave = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                with self._conn:
+                    self._conn.execute(
+                        f"UPDATE {tabela} SET ultimo_acesso = ? WHERE chave = ?", (time.time(), key)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao consultar o cache de texto: {e}")
+            return None
+        return row[0]
+
+    def _put(self, tabela, coluna, key, conteudo):
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {tabela} (chave, {coluna}, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?)",
+                    (key, conteudo, len(conteudo.encode('utf-8')), time.time())
+                )
+                self._writes += 1
+                verificar = self._writes % _EVICT_EVERY == 1
+            if verificar:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao gravar no cache de texto: {e}")
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT (SELECT COALESCE(SUM(tamanho), 0) FROM arquivos)"
+                " + (SELECT COALESCE(SUM(tamanho), 0) FROM paginas)"
+            ).fetchone()[0]
+
+    def evict(self):
+        """
+        Remove as entradas (arquivos e páginas) acessadas há mais tempo até o
+        cache caber em max_bytes
+        """
+        if not self.max_bytes:
+            return
+        excesso = self.total_bytes() - self.max_bytes
+        if excesso <= 0:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT 'arquivos', chave, tamanho, ultimo_acesso FROM arquivos"
+                " UNION ALL SELECT 'paginas', chave, tamanho, ultimo_acesso FROM paginas"
+                " ORDER BY ultimo_acesso"
+            )
+            remover = []
+            for tabela, chave, tamanho, _ in rows:
+                if excesso <= 0:
+                    break
+                remover.append((tabela, chave))
+                excesso -= tamanho
+            with self._conn:
+                for tabela, chave in remover:
+                    self._conn.execute(f"DELETE FROM {tabela} WHERE chave = ?", (chave,))
+            removidas = len(remover)
+        logger.info(f"Cache de texto: {removidas} entradas removidas para caber em {self.max_bytes} bytes")
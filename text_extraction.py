@@ -0,0 +1,403 @@
+"""
+Extração de texto dos documentos baixados do MinIO.
+
+Cada página usa primeiro a camada de texto do PDF (PyMuPDF); só as páginas sem
+texto são renderizadas e passam pelo Tesseract. Os documentos são processados em
+um pool de processos e o resultado sai por documento (DocumentText) e por página
+(PageText), pronto para os índices ES_INDEX_TEXT / ES_INDEX_PAGE.
+
+Com TEXT_CACHE_PATH definido, o resultado fica em um cache persistente por hash
+do arquivo e de cada página (ver text_cache.py): arquivos e páginas repetidos
+não passam de novo pelo OCR, entre execuções e entre os processos do pool.
+
+As páginas são lidas uma a uma (iter_page_texts), e só a página em OCR fica
+renderizada na memória; com OCR_MAX_RSS_MB, o DPI é reduzido para manter cada
+processo abaixo do teto, mesmo em PDFs com milhares de páginas escaneadas.
+"""
+import logging
+import math
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from minio_extraction import AppConfig
+from text_cache import TextCache, file_hash, page_hash
+
+logger = logging.getLogger(__name__)
+
+# Páginas com menos caracteres do que isso na camada de texto vão para o OCR
+MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '20'))
+
+
+@dataclass
+class PageText:
+    document_id: str
+    page_number: int  # começando em 1
+    text: str
+    ocr: bool = False
+    cached: bool = False  # veio do cache de texto
+
+
+@dataclass
+class DocumentText:
+    document_id: str
+    path: str
+    pages: List[PageText] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(page.text for page in self.pages)
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(1 for page in self.pages if page.ocr)
+
+
+DocumentInput = Union[str, Path, Tuple[str, Union[str, Path]]]
+
+
+def extract_document_text(path, document_id=None, dpi=None, lang=None, min_text_chars=MIN_TEXT_CHARS,
+                          cache: Optional[TextCache] = None, max_rss_mb: Optional[int] = None):
+    """
+    Extrai o texto de um documento, página a página (ver iter_page_texts)
+
+    Args:
+        path (str): Caminho local do arquivo
+        document_id (str): Id do documento (padrão: nome do arquivo sem extensão)
+        dpi (int): Resolução usada para renderizar as páginas que vão para o OCR
+        lang (str): Idioma(s) do Tesseract
+        min_text_chars (int): Mínimo de caracteres na camada de texto para dispensar o OCR
+        cache (TextCache): Cache de texto (opcional), consultado pelo hash do
+            arquivo e, nas páginas que vão para o OCR, pelo hash da página
+        max_rss_mb (int): Teto de memória do processo para o OCR (padrão:
+            AppConfig.OCR_MAX_RSS_MB; 0 desativa)
+
+    Returns:
+        DocumentText: Texto por página, ou com `error` preenchido se falhar
+    """
+    document_id = str(document_id or Path(path).stem)
+    resultado = DocumentText(document_id=document_id, path=str(path))
+
+    try:
+        for page in iter_page_texts(path, document_id, dpi, lang, min_text_chars, cache, max_rss_mb):
+            resultado.pages.append(page)
+    except Exception as e:
+        logger.error(f"Erro ao extrair texto de {path}: {e}")
+        resultado.error = str(e)
+        return resultado
+
+    reaproveitadas = sum(1 for page in resultado.pages if page.cached)
+    logger.info(
+        f"Texto extraído de {path}: {len(resultado.pages)} páginas, {resultado.ocr_pages} com OCR"
+        + (f" ({reaproveitadas} do cache)" if reaproveitadas else "")
+    )
+    return resultado
+
+
+def iter_page_texts(path, document_id=None, dpi=None, lang=None, min_text_chars=MIN_TEXT_CHARS,
+                    cache: Optional[TextCache] = None, max_rss_mb: Optional[int] = None) -> Iterator[PageText]:
+    """
+    Extrai o texto de um documento devolvendo uma página por vez
+
+    O documento é aberto uma única vez e as páginas são carregadas sob demanda.
+    Só a página em processamento é renderizada para o OCR (em tons de cinza, sem
+    cópia do pixmap para o PIL), e os buffers e o cache de imagens do MuPDF são
+    liberados logo depois, então a memória não cresce com o número de páginas.
+    Com um teto de memória (`max_rss_mb`), o DPI de cada página é reduzido
+    (até OCR_MIN_DPI) quando a renderização no DPI pedido não caberia.
+
+    Args:
+        (os mesmos de extract_document_text)
+
+    Yields:
+        PageText: Na ordem das páginas
+    """
+    import fitz  # PyMuPDF
+
+    document_id = str(document_id or Path(path).stem)
+    dpi = dpi or AppConfig.OCR_DPI
+    lang = lang or AppConfig.OCR_LANG
+    max_rss_mb = AppConfig.OCR_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+
+    chave = None
+    if cache is not None:
+        chave = cache.file_key(file_hash(path), dpi, lang, min_text_chars)
+        paginas = cache.get_document(chave)
+        if paginas is not None:
+            for numero, (text, ocr) in enumerate(paginas, start=1):
+                yield PageText(document_id, numero, text, ocr, cached=True)
+            return
+
+    textos = []
+    reduzidas = 0
+    with fitz.open(path) as doc:
+        for numero in range(doc.page_count):
+            page = doc.load_page(numero)
+            text = page.get_text().strip()
+            ocr = len(text) < min_text_chars
+            cached = False
+            if ocr:
+                dpi_pagina = _adaptive_dpi(page, dpi, max_rss_mb)
+                if dpi_pagina < dpi:
+                    reduzidas += 1
+                    logger.debug(f"{path}, página {numero + 1}: OCR com {dpi_pagina} DPI para caber em {max_rss_mb} MB")
+                text, cached = _ocr_page_cached(page, dpi_pagina, lang, cache)
+            page = None  # libera a página antes de carregar a próxima
+            textos.append((text, ocr))
+            yield PageText(document_id, numero + 1, text, ocr, cached)
+
+    if reduzidas:
+        logger.warning(f"{path}: {reduzidas} páginas com DPI reduzido para caber em {max_rss_mb} MB")
+    # Resultado com páginas em DPI reduzido não vale como o resultado do arquivo
+    # no DPI pedido (as páginas ficam no cache com o DPI em que foram lidas)
+    if chave is not None and not reduzidas:
+        cache.put_document(chave, textos)
+
+
+def _ocr_page_cached(page, dpi, lang, cache):
+    # Devolve (texto, veio_do_cache)
+    if cache is None:
+        return _ocr_page(page, dpi, lang), False
+    chave = cache.page_key(page_hash(page), dpi, lang)
+    text = cache.get_page(chave)
+    if text is not None:
+        return text, True
+    text = _ocr_page(page, dpi, lang)
+    cache.put_page(chave, text)
+    return text, False
+
+
+def _ocr_page(page, dpi, lang):
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    # Tons de cinza: 1 byte por pixel (o Tesseract binariza a imagem de qualquer
+    # forma). A imagem do PIL usa o buffer do pixmap, sem cópia
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    image = Image.frombuffer('L', (pix.width, pix.height), pix.samples_mv, 'raw', 'L', pix.stride, 1)
+    try:
+        return pytesseract.image_to_string(image, lang=lang).strip()
+    finally:
+        # A imagem precisa soltar o buffer antes de o pixmap ser destruído
+        image.close()
+        image = None
+        pix = None
+        # Imagens decodificadas da página ficam no cache do MuPDF até serem expulsas
+        fitz.TOOLS.store_shrink(100)
+
+
+# Bytes por pixel na renderização para o OCR: pixmap (1) + PNG temporário do
+# pytesseract e folga
+_OCR_BYTES_PER_PIXEL = 3
+
+
+def _adaptive_dpi(page, dpi, max_rss_mb):
+    # Maior DPI (até `dpi`, no mínimo OCR_MIN_DPI) cuja renderização cabe no que
+    # falta para o teto de memória
+    if not max_rss_mb:
+        return dpi
+    rss = _current_rss()
+    if rss is None:
+        return dpi
+    disponivel = max_rss_mb * 1024 ** 2 - rss
+    polegadas2 = (page.rect.width / 72) * (page.rect.height / 72)
+    if disponivel <= 0 or polegadas2 <= 0:
+        return min(dpi, AppConfig.OCR_MIN_DPI)
+    cabe = int(math.sqrt(disponivel / (polegadas2 * _OCR_BYTES_PER_PIXEL)))
+    return max(min(dpi, AppConfig.OCR_MIN_DPI), min(dpi, cabe))
+
+
+def _current_rss() -> Optional[int]:
+    # Memória residente do processo, em bytes (None se não for possível medir)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def extract_texts(
+    documents: Iterable[DocumentInput],
+    max_workers: Optional[int] = None,
+    dpi: Optional[int] = None,
+    lang: Optional[str] = None,
+    max_pending: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    max_rss_mb: Optional[int] = None,
+    checkpoints=None,
+    skip_stage: str = 'extracted'
+) -> Iterator[DocumentText]:
+    """
+    Extrai o texto de vários documentos em um pool de processos
+
+    Os documentos são enviados ao pool aos poucos (no máximo `max_pending` em
+    andamento), então quem consome o gerador controla o ritmo da extração. Se
+    um processo do pool morrer, o pool é recriado (ver _recover_pool) e só o
+    documento que o derrubou sai com erro.
+
+    Args:
+        documents (Iterable): Caminhos locais ou tuplas (id_documento, caminho);
+            DownloadResult com sucesso também são aceitos
+        max_workers (int): Processos no pool (padrão: número de CPUs)
+        dpi (int): Resolução do OCR (padrão: AppConfig.OCR_DPI)
+        lang (str): Idioma do Tesseract (padrão: AppConfig.OCR_LANG)
+        max_pending (int): Documentos em andamento (padrão: 2 x max_workers)
+        cache_path (str): Cache de texto compartilhado pelos processos (padrão:
+            AppConfig.TEXT_CACHE_PATH; vazio desativa)
+        max_rss_mb (int): Teto de memória de cada processo; acima dele o DPI do
+            OCR é reduzido (padrão: AppConfig.OCR_MAX_RSS_MB; 0 desativa)
+        checkpoints (CheckpointStore): Registro de etapas (opcional); cada
+            documento é registrado na etapa 'extracted', e os já concluídos em
+            `skip_stage` são pulados (não aparecem na saída)
+        skip_stage (str): Etapa consultada para pular documentos. Encadeado com
+            es_indexer.index_documents, use 'indexed': um documento extraído mas
+            não indexado é extraído de novo (com o cache de texto, sem OCR)
+
+    Yields:
+        DocumentText: Na mesma ordem de `documents`
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    dpi = dpi or AppConfig.OCR_DPI
+    lang = lang or AppConfig.OCR_LANG
+    cache_path = cache_path or AppConfig.TEXT_CACHE_PATH
+    max_rss_mb = AppConfig.OCR_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+
+    entradas = _normalize(documents)
+    pulados = []
+    if checkpoints is not None:
+        entradas = checkpoints.pending(
+            skip_stage, entradas, key=lambda entrada: _document_key(*entrada), on_skip=pulados.append
+        )
+
+    def novo_pool(processos=max_workers):
+        return ProcessPoolExecutor(max_workers=processos, initializer=_init_worker,
+                                   initargs=(cache_path, AppConfig.TEXT_CACHE_MAX_BYTES))
+
+    def argumentos(entrada):
+        document_id, path = entrada
+        return path, document_id, dpi, lang, max_rss_mb
+
+    def recriar():
+        # Um processo morreu (OOM, falha nativa no PyMuPDF/Tesseract): ver _recover_pool
+        nonlocal executor
+        executor = _recover_pool(executor, pendentes, novo_pool, argumentos)
+
+    def enviar(entrada):
+        try:
+            return executor.submit(_extract_in_worker, *argumentos(entrada))
+        except BrokenProcessPool:
+            recriar()
+            return executor.submit(_extract_in_worker, *argumentos(entrada))
+
+    def proximo():
+        try:
+            pendentes[0][1].result()
+        except BrokenProcessPool:
+            recriar()
+        return pendentes.pop(0)[1].result()
+
+    executor = novo_pool()
+    pendentes = []  # (entrada, future), na ordem de entrada
+    try:
+        for entrada in entradas:
+            pendentes.append((entrada, enviar(entrada)))
+            if len(pendentes) >= max_pending:
+                yield _checkpoint(proximo(), checkpoints)
+        while pendentes:
+            yield _checkpoint(proximo(), checkpoints)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    if pulados:
+        logger.info(f"{len(pulados)} documentos pulados (já concluídos na etapa {skip_stage})")
+
+
+def _recover_pool(executor, pendentes, novo_pool, argumentos):
+    """
+    Recria o pool depois que um processo morreu (BrokenProcessPool)
+
+    Todos os documentos em andamento falham juntos, sem indicar qual derrubou o
+    processo. Cada um é refeito sozinho em um pool de um processo: o que derrubar
+    esse pool também sai como DocumentText com erro, e os demais seguem normalmente.
+    Os documentos já concluídos antes da queda são mantidos.
+
+    Returns:
+        ProcessPoolExecutor: Pool novo para os próximos documentos
+    """
+    executor.shutdown(wait=False)
+    suspeitos = [i for i, (_, future) in enumerate(pendentes) if isinstance(future.exception(), BrokenProcessPool)]
+    logger.warning(f"Processo do pool de extração encerrado; refazendo {len(suspeitos)} documentos um a um")
+    for i in suspeitos:
+        entrada = pendentes[i][0]
+        with novo_pool(1) as isolado:
+            future = isolado.submit(_extract_in_worker, *argumentos(entrada))
+            try:
+                future.result()
+            except BrokenProcessPool as e:
+                document_id, path = entrada
+                logger.error(f"Extração de {path} encerrou o processo do pool: {e}")
+                future = Future()
+                future.set_result(DocumentText(
+                    document_id=_document_key(document_id, path), path=str(path),
+                    error=f"processo de extração encerrado: {e}"
+                ))
+        pendentes[i] = (entrada, future)
+    return novo_pool()
+
+
+def _document_key(document_id, path):
+    # Mesmo id usado em extract_document_text
+    return str(document_id or Path(path).stem)
+
+
+def _checkpoint(resultado, checkpoints):
+    if checkpoints is not None:
+        if resultado.ok:
+            checkpoints.mark_done('extracted', resultado.document_id, f"{len(resultado.pages)} páginas")
+        else:
+            checkpoints.mark_failed('extracted', resultado.document_id, resultado.error)
+    return resultado
+
+
+def _normalize(documents):
+    for doc in documents:
+        if hasattr(doc, 'local_path'):  # DownloadResult
+            if doc.ok:
+                yield str(doc.id), doc.local_path
+        elif isinstance(doc, tuple):
+            yield str(doc[0]), doc[1]
+        else:
+            yield None, doc
+
+
+# Cache de texto do processo do pool (aberto em _init_worker)
+_worker_cache: Optional[TextCache] = None
+
+
+def _init_worker(cache_path=None, cache_max_bytes=None):
+    # Cada processo já é um "núcleo": evita que o Tesseract abra várias threads
+    # OpenMP por página e dispute CPU com os outros workers
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    global _worker_cache
+    if cache_path:
+        # Uma conexão por processo com o mesmo arquivo SQLite
+        _worker_cache = TextCache(cache_path, cache_max_bytes)
+
+
+def _extract_in_worker(path, document_id, dpi, lang, max_rss_mb):
+    return extract_document_text(path, document_id, dpi, lang, cache=_worker_cache, max_rss_mb=max_rss_mb)